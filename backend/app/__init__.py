@@ -1,76 +1,158 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, get_jwt_identity, verify_jwt_in_request
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager
 from backend.app.config import Config
 from backend.app.db import db
-from dotenv import load_dotenv
-import os
-
-# Import các models
-from backend.app.models import User, UserPackage  # ✅ Gộp chung vào một dòng
-from sqlalchemy.sql import func  # ✅ Import func để tính tổng tín dụng
-
-# Load file .env
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../.env'))
-
-# Khởi tạo Flask App
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Khởi tạo CSDL và JWT
-db.init_app(app)
-jwt = JWTManager(app)
-
-# Đăng ký các routes
-from backend.app.routes.auth_routes import auth_blueprint
-from .routes.main_routes import main_blueprint
-from .routes.frontend_routes import frontend_bp
-from .routes.password_routes import password_blueprint
-from backend.app.routes.payment_routes import payment_blueprint
-from backend.app.routes.gfpgan_routes import gfpgan_blueprint
-from backend.app.routes.esrgan_routes import esrgan_blueprint
-from backend.app.routes.lama_routes import lama_blueprint
-from backend.app.routes.sd_routes import sd_blueprint
-from backend.app.routes.sdxl_routes import sdxl_blueprint
-from backend.app.routes.video_routes import video_blueprint
-from backend.app.routes.video01_routes import video01_blueprint
-from backend.app.routes.colorize_routes import colorize_blueprint
-
-app.register_blueprint(auth_blueprint, url_prefix='/auth')
-app.register_blueprint(main_blueprint)
-app.register_blueprint(frontend_bp)
-app.register_blueprint(password_blueprint, url_prefix='/password')
-app.register_blueprint(payment_blueprint, url_prefix='/payment')
-app.register_blueprint(gfpgan_blueprint, url_prefix='/gfpgan')
-app.register_blueprint(esrgan_blueprint, url_prefix='/esrgan')
-app.register_blueprint(lama_blueprint, url_prefix='/lama')
-app.register_blueprint(sd_blueprint, url_prefix='/sd')
-app.register_blueprint(sdxl_blueprint, url_prefix='/sdxl')
-app.register_blueprint(video_blueprint, url_prefix="/video")
-app.register_blueprint(video01_blueprint, url_prefix="/video01")
-app.register_blueprint(colorize_blueprint, url_prefix="/colorize")
-
-# ✅ Fix lỗi: Kiểm tra token hợp lệ trước khi gọi get_jwt_identity()
-@app.context_processor
-def inject_user():
-    user = None
-    try:
-        verify_jwt_in_request(optional=True)
-        user_id = get_jwt_identity()
-        if user_id:
-            user = User.query.get(user_id)
-            if user:
-                # Tính tổng tín dụng mới nhất
-                user.total_credits = db.session.query(
-                    func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-                ).filter(UserPackage.user_id == user.user_id).scalar()
-                db.session.commit()  # ✅ Lưu cập nhật vào database
-    except Exception:
-        pass
-    return dict(current_user=user)
-
-
-# Tạo CSDL nếu chưa tồn tại
-with app.app_context():
-    db.create_all()
-    print("✅ Database tables created successfully!")
+import importlib
+import time
+
+# 🔹 Các routes: (module, tên blueprint, url_prefix). Module chỉ được import trong create_app()
+# nên `import backend.app.<module>` (tiến trình con của pool, bench, loadtest) không kéo theo cả app.
+BLUEPRINTS = [
+    ("backend.app.routes.auth_routes", "auth_blueprint", "/auth"),
+    ("backend.app.routes.main_routes", "main_blueprint", None),
+    ("backend.app.routes.frontend_routes", "frontend_bp", None),
+    ("backend.app.routes.password_routes", "password_blueprint", "/password"),
+    ("backend.app.routes.payment_routes", "payment_blueprint", "/payment"),
+    ("backend.app.routes.gfpgan_routes", "gfpgan_blueprint", "/gfpgan"),
+    ("backend.app.routes.esrgan_routes", "esrgan_blueprint", "/esrgan"),
+    ("backend.app.routes.lama_routes", "lama_blueprint", "/lama"),
+    ("backend.app.routes.sd_routes", "sd_blueprint", "/sd"),
+    ("backend.app.routes.sdxl_routes", "sdxl_blueprint", "/sdxl"),
+    ("backend.app.routes.video_routes", "video_blueprint", "/video"),
+    ("backend.app.routes.video01_routes", "video01_blueprint", "/video01"),
+    ("backend.app.routes.colorize_routes", "colorize_blueprint", "/colorize"),
+    ("backend.app.routes.job_routes", "job_blueprint", "/jobs"),
+    ("backend.app.routes.webhook_routes", "webhook_blueprint", "/webhooks"),
+    ("backend.app.routes.upload_routes", "upload_blueprint", "/uploads"),
+    ("backend.app.routes.pipeline_routes", "pipeline_blueprint", "/pipelines"),
+    ("backend.app.routes.storage_routes", "storage_blueprint", "/storage"),
+]
+
+
+def create_app(config_object=Config):
+    """ Tạo Flask app: không chạy DDL (migration chỉ chạy bằng `flask db-upgrade`), không tạo client Azure / ONNX
+    (storage, email, onnxruntime tự khởi tạo ở lần dùng đầu). Thời gian import từng module route được ghi vào
+    app.extensions["startup_profile"] (xem ở /admin/metrics); cần chi tiết hơn thì chạy `python -X importtime`.
+    """
+    started = time.perf_counter()
+
+    # Khởi tạo Flask App
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+
+    # Khởi tạo CSDL và JWT
+    db.init_app(app)
+    JWTManager(app)
+
+    # Đăng ký các routes
+    imports = {}
+    for module_name, blueprint_name, url_prefix in BLUEPRINTS:
+        module_started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        imports[module_name.rsplit(".", 1)[-1]] = round((time.perf_counter() - module_started) * 1000, 1)
+        app.register_blueprint(getattr(module, blueprint_name), url_prefix=url_prefix)
+
+    _register_handlers(app)
+    _register_commands(app)
+
+    if app.config.get("REPLICATE_WEBHOOK_URL") and not app.config.get("REPLICATE_WEBHOOK_SECRET"):
+        print("⚠️ REPLICATE_WEBHOOK_URL được đặt nhưng thiếu REPLICATE_WEBHOOK_SECRET: tắt webhook, app tự hỏi trạng thái Replicate")
+
+    profile = {"total_ms": round((time.perf_counter() - started) * 1000, 1), "imports_ms": imports}
+    app.extensions["startup_profile"] = profile
+    _report_startup(profile, app.config["STARTUP_PROFILE_TOP"])
+
+    return app
+
+
+def _report_startup(profile, top):
+    if not top:
+        return
+    slowest = sorted(profile["imports_ms"].items(), key=lambda item: item[1], reverse=True)[:top]
+    print(f"✅ App khởi tạo trong {profile['total_ms']} ms (import chậm nhất: {', '.join(f'{name} {ms} ms' for name, ms in slowest)})")
+
+
+def _register_handlers(app):
+    from backend.app.current_user import current_user
+    from backend.app.pagination import InvalidCursor
+    from backend.app.ingest import ImageRejected
+    from backend.app.cpu_pool import CpuPoolBusy
+    from backend.app.static_assets import asset_url
+
+    # ✅ Cursor phân trang không hợp lệ -> 400 cho mọi API danh sách
+    @app.errorhandler(InvalidCursor)
+    def handle_invalid_cursor(error):
+        return jsonify({"error": "Cursor không hợp lệ!"}), 400
+
+    # ✅ Ảnh tải lên hỏng hoặc quá lớn -> 400 thay vì lỗi 500
+    @app.errorhandler(ImageRejected)
+    def handle_image_rejected(error):
+        return jsonify({"error": str(error)}), 400
+
+    # ✅ Pool xử lý ảnh đang đầy / quá thời gian -> 503 để client thử lại
+    @app.errorhandler(CpuPoolBusy)
+    def handle_cpu_pool_busy(error):
+        return jsonify({"error": str(error)}), 503
+
+    # ✅ current_user là proxy lười: JWT chỉ được giải mã (và User chỉ được tải) khi template dùng tới
+    @app.context_processor
+    def inject_user():
+        return dict(current_user=current_user)
+
+    # ✅ asset_url('js/x.js') trong template -> file có hash trong tên (cache immutable), chưa build thì dùng file gốc
+    app.add_template_global(asset_url)
+
+
+def _register_commands(app):
+    # ✅ Lệnh CLI: flask db-upgrade / flask check-query-plans / flask build-assets / flask prune-assets / flask refund-stale-reservations / flask cleanup-uploads
+    @app.cli.command("db-upgrade")
+    def db_upgrade_command():
+        """ Áp dụng các migration chưa chạy (chạy một lần khi deploy, trước khi khởi động worker) """
+        from backend.app.migrations import run_migrations
+
+        run_migrations()
+        print("✅ Database schema is up to date!")
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans_command():
+        """ Báo lỗi nếu truy vấn nóng nào bị Seq Scan (thiếu index) """
+        from backend.app.query_plans import check_query_plans
+
+        failures = check_query_plans()
+        for name, tables in failures.items():
+            print(f"❌ {name}: Seq Scan trên {', '.join(tables)}")
+        if failures:
+            raise SystemExit(1)
+        print("✅ Mọi truy vấn nóng đều dùng index")
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """ Build frontend/dist: CSS/JS gắn hash nội dung + bản nén gzip/brotli + manifest.json """
+        from backend.app.static_assets import build_assets
+
+        manifest = build_assets()
+        print(f"✅ Đã build {len(manifest)} file tĩnh vào frontend/dist")
+
+    @app.cli.command("prune-assets")
+    def prune_assets_command():
+        """ Xoá file tĩnh của các lần build cũ, giữ STATIC_KEEP_BUILDS lần gần nhất (chạy sau khi deploy xong) """
+        from backend.app.static_assets import prune_assets
+
+        removed = prune_assets(app.config["STATIC_KEEP_BUILDS"])
+        print(f"✅ Đã xoá {removed} file tĩnh của các lần build cũ")
+
+    @app.cli.command("refund-stale-reservations")
+    def refund_stale_reservations_command():
+        """ Hoàn tín dụng giữ chỗ bị treo (worker chết / deploy giữa tác vụ), chạy định kỳ bằng cron """
+        from backend.app import credits
+
+        count = credits.refund_stale(app.config["CREDIT_RESERVATION_TIMEOUT"])
+        print(f"✅ Đã hoàn {count} khoản giữ chỗ quá hạn")
+
+    @app.cli.command("cleanup-uploads")
+    def cleanup_uploads_command():
+        """ Xoá file tải qua URL SAS nhưng không bao giờ được commit, chạy định kỳ bằng cron """
+        from backend.app.uploads import cleanup_stale_uploads
+
+        removed = cleanup_stale_uploads(app.config["UPLOAD_ORPHAN_TTL"])
+        print(f"✅ Đã xoá {removed} file tải lên không được commit")
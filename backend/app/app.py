@@ -1,4 +1,7 @@
-from backend.app import app
+from backend.app import create_app
+
+# Điểm vào WSGI: gunicorn "backend.app.app:app" (flask CLI tự tìm create_app khi FLASK_APP=backend.app)
+app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -25,3 +25,98 @@ class Config:
     PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID")
     PAYPAL_SECRET = os.getenv("PAYPAL_SECRET")
     PAYPAL_MODE = os.getenv("PAYPAL_MODE", "sandbox")  # sandbox hoặc live 
+
+    # Cấu hình hàng đợi tác vụ nền (Replicate -> tải kết quả -> upload Azure)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 8))  # Số luồng xử lý song song
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 32))  # Số tác vụ tối đa được chờ trong hàng đợi
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 50))  # Số ảnh tối đa trong một lô (/gfpgan/batch)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))  # Tổng số prediction con (ảnh trong lô, nhánh pipeline) chạy song song trong một tiến trình
+    PIPELINE_MAX_STEPS = int(os.getenv("PIPELINE_MAX_STEPS", 5))  # Số bước tối đa của một pipeline (/pipelines)
+    PIPELINE_TIMEOUT = int(os.getenv("PIPELINE_TIMEOUT", 1800))  # Hạn chót cho cả pipeline, hết hạn thì huỷ prediction đang chạy (giây)
+    # Khoản giữ chỗ tín dụng còn "pending" lâu hơn mức này bị `flask refund-stale-reservations` hoàn lại (giây),
+    # phải lớn hơn tác vụ dài nhất (PIPELINE_TIMEOUT) cộng thời gian chờ trong hàng đợi
+    CREDIT_RESERVATION_TIMEOUT = int(os.getenv("CREDIT_RESERVATION_TIMEOUT", 3600))
+
+    # Cấu hình Replicate
+    REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+    REPLICATE_API_URL = os.getenv("REPLICATE_API_URL", "https://api.replicate.com/v1")
+    REPLICATE_WEBHOOK_URL = os.getenv("REPLICATE_WEBHOOK_URL")  # VD: https://<domain>/webhooks/replicate
+    REPLICATE_WEBHOOK_SECRET = os.getenv("REPLICATE_WEBHOOK_SECRET")  # whsec_... để xác thực chữ ký, bắt buộc để bật webhook
+    REPLICATE_WEBHOOK_RECHECK = int(os.getenv("REPLICATE_WEBHOOK_RECHECK", 60))  # Kiểm tra lại nếu mất webhook (giây)
+    REPLICATE_POLL_INTERVAL = int(os.getenv("REPLICATE_POLL_INTERVAL", 3))  # Lần hỏi đầu khi chưa cấu hình webhook, sau đó tăng dần
+    REPLICATE_POLL_MAX_INTERVAL = int(os.getenv("REPLICATE_POLL_MAX_INTERVAL", 30))  # Khoảng hỏi tối đa (giây)
+    REPLICATE_TIMEOUT = int(os.getenv("REPLICATE_TIMEOUT", 600))  # Hạn chót mặc định cho một prediction (giây)
+
+    # Cấu hình pool kết nối HTTP dùng chung (Replicate, PayPal, Microsoft Graph, tải kết quả)
+    HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", 20))  # Số host được giữ pool kết nối
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32))  # Số kết nối keep-alive tối đa mỗi host
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+    HTTP_CHUNK_SIZE = int(os.getenv("HTTP_CHUNK_SIZE", 64 * 1024))  # Kích thước đọc mỗi lần khi tải dạng stream
+
+    # Kích thước mỗi block khi stream kết quả lên Azure Blob (cũng là bộ đệm tối đa mỗi lần chuyển)
+    BLOB_BLOCK_SIZE = int(os.getenv("BLOB_BLOCK_SIZE", 4 * 1024 * 1024))
+
+    # Lưu trữ file (storage.py): azure | filesystem
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure")
+    AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL")  # Gốc URL công khai; trống = endpoint của Azure / http://127.0.0.1:5000/storage
+    STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "var/storage")  # filesystem: đặt trên /dev/shm để đo hiệu năng không phụ thuộc đĩa
+    STORAGE_POOL_MAXSIZE = int(os.getenv("STORAGE_POOL_MAXSIZE", 32))  # Số kết nối keep-alive tới Blob mỗi tiến trình
+    STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", 4))  # Số block tải lên / tải về song song mỗi file
+    STORAGE_MAX_SINGLE_PUT_SIZE = int(os.getenv("STORAGE_MAX_SINGLE_PUT_SIZE", 8 * 1024 * 1024))  # Nhỏ hơn -> một request PUT
+    STORAGE_MAX_SINGLE_GET_SIZE = int(os.getenv("STORAGE_MAX_SINGLE_GET_SIZE", 8 * 1024 * 1024))  # Request GET đầu tiên
+    STORAGE_DOWNLOAD_CHUNK_SIZE = int(os.getenv("STORAGE_DOWNLOAD_CHUNK_SIZE", 4 * 1024 * 1024))  # Các phần GET tiếp theo
+
+    # Tải file trực tiếp từ trình duyệt lên Azure bằng URL SAS
+    UPLOAD_SAS_TTL = int(os.getenv("UPLOAD_SAS_TTL", 600))  # Thời hạn URL SAS (giây)
+    UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+    UPLOAD_MAX_VIDEO_BYTES = int(os.getenv("UPLOAD_MAX_VIDEO_BYTES", 200 * 1024 * 1024))
+    UPLOAD_ORPHAN_TTL = int(os.getenv("UPLOAD_ORPHAN_TTL", 86400))  # File qua SAS chưa commit sau chừng này giây bị `flask cleanup-uploads` xoá
+
+    # Ghi nhớ kết quả model (GFPGAN, Real-ESRGAN, DeOldify, LaMa)
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 7 * 24 * 3600))  # Thời gian sống (giây)
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 100000))  # Vượt quá thì xoá mục ít dùng nhất
+    RESULT_CACHE_EVICT_EVERY = int(os.getenv("RESULT_CACHE_EVICT_EVERY", 100))  # Kiểm tra kích thước bảng sau mỗi N lần ghi
+
+    # Phân trang danh sách ảnh / video (cursor)
+    PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 24))
+    PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 100))
+
+    # Chuẩn hoá ảnh tải lên qua server (ingest.py)
+    INGEST_MAX_SIZE = int(os.getenv("INGEST_MAX_SIZE", 1024))  # Cạnh dài tối đa (px)
+    INGEST_JPEG_QUALITY = int(os.getenv("INGEST_JPEG_QUALITY", 85))
+    INGEST_MAX_PIXELS = int(os.getenv("INGEST_MAX_PIXELS", 50_000_000))  # Vượt quá -> từ chối (400)
+
+    # Pool tiến trình cho việc nặng CPU (giải mã / thu nhỏ / mã hoá ảnh)
+    CPU_POOL_ENABLED = os.getenv("CPU_POOL_ENABLED", "true").lower() == "true"  # false -> chạy ngay trên luồng request
+    CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", 0))  # 0 -> bằng số nhân CPU
+    CPU_POOL_QUEUE_SIZE = int(os.getenv("CPU_POOL_QUEUE_SIZE", 8))  # Số ảnh được chờ thêm khi mọi tiến trình đều bận
+    CPU_POOL_WAIT = float(os.getenv("CPU_POOL_WAIT", 5))  # Chờ slot tối đa (giây) trước khi trả 503
+    CPU_TASK_TIMEOUT = float(os.getenv("CPU_TASK_TIMEOUT", 30))  # Thời gian tối đa cho một ảnh (giây)
+    # forkserver | spawn | fork; không dùng fork mặc định vì process cha đã có luồng (job, LISTEN) có thể đang giữ lock
+    CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "forkserver")
+
+    # Ảnh thu nhỏ WebP/AVIF cho thư viện (derivatives.py)
+    DERIVATIVE_WIDTHS = [int(width) for width in os.getenv("DERIVATIVE_WIDTHS", "320,640").split(",")]
+    DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", 75))
+
+    # File tĩnh frontend (static_assets.py, build bằng `flask build-assets`)
+    STATIC_IMMUTABLE_MAX_AGE = 31536000  # File có hash trong tên: cache 1 năm, không cần kiểm tra lại
+    STATIC_FALLBACK_MAX_AGE = int(os.getenv("STATIC_FALLBACK_MAX_AGE", 300))  # File gốc (chưa build): cache ngắn + ETag
+    STATIC_KEEP_BUILDS = int(os.getenv("STATIC_KEEP_BUILDS", 3))  # `flask prune-assets` giữ file của N lần build gần nhất
+
+    # Backend suy luận (inference/): replicate | local | auto
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "replicate")
+    INFERENCE_ONNX_DIR = os.getenv("INFERENCE_ONNX_DIR", "models/onnx")  # Chứa gfpgan_v1.4.onnx, realesrgan_x2plus.onnx
+    # GFPGAN local không có bước phát hiện / căn chỉnh khuôn mặt: chỉ bật khi ảnh gửi lên luôn là mặt đã cắt sẵn
+    INFERENCE_LOCAL_GFPGAN = os.getenv("INFERENCE_LOCAL_GFPGAN", "false").lower() == "true"
+    INFERENCE_LOCAL_FACE_MAX_SIDE = int(os.getenv("INFERENCE_LOCAL_FACE_MAX_SIDE", 512))  # GFPGAN local chỉ cho ảnh mặt nhỏ
+    INFERENCE_LOCAL_MAX_PIXELS = int(os.getenv("INFERENCE_LOCAL_MAX_PIXELS", 640 * 640))  # Ảnh lớn hơn -> Replicate (chế độ auto)
+    INFERENCE_LOCAL_TIMEOUT = int(os.getenv("INFERENCE_LOCAL_TIMEOUT", 120))  # Thời gian tối đa một lần chạy local (giây)
+    INFERENCE_LOCAL_WORKERS = int(os.getenv("INFERENCE_LOCAL_WORKERS", 2))  # Số tiến trình chạy model, tách khỏi CPU_POOL_WORKERS (0 -> số nhân CPU)
+    INFERENCE_LOCAL_QUEUE_SIZE = int(os.getenv("INFERENCE_LOCAL_QUEUE_SIZE", 2))  # Số ảnh chờ thêm, đầy -> Replicate (auto) / 503 (local)
+    INFERENCE_LOCAL_JPEG_QUALITY = int(os.getenv("INFERENCE_LOCAL_JPEG_QUALITY", 92))
+
+    # Khởi động (create_app): in N module route import chậm nhất, 0 = tắt
+    STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", 5))
@@ -0,0 +1,109 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+
+# 🔹 Pool tiến trình cho việc nặng CPU, mỗi loại việc một pool riêng (tiến trình + giới hạn slot riêng):
+# suy luận ONNX chạy hàng chục giây không được chiếm hết slot của ingest (giải mã / thu nhỏ / mã hoá ảnh),
+# nếu không mọi lượt tải ảnh lên đều nhận 503 trong lúc có vài ảnh đang chạy model.
+# Tên pool -> (khoá cấu hình số tiến trình, khoá cấu hình số việc được chờ thêm)
+POOLS = {
+    "ingest": ("CPU_POOL_WORKERS", "CPU_POOL_QUEUE_SIZE"),
+    "inference": ("INFERENCE_LOCAL_WORKERS", "INFERENCE_LOCAL_QUEUE_SIZE"),
+}
+
+_executors = {}
+_slots = {}
+_init_lock = threading.Lock()
+_counters = {name: {"offloaded": 0, "inline": 0, "rejected": 0, "timeouts": 0, "broken": 0} for name in POOLS}
+_counters_lock = threading.Lock()
+
+
+class CpuPoolBusy(Exception):
+    """ Pool đang đầy hoặc tác vụ quá thời gian, request nên được trả 503 """
+
+
+def _count(pool, field):
+    with _counters_lock:
+        _counters[pool][field] += 1
+
+
+def _get_executor(app, pool):
+    if pool not in _executors:
+        with _init_lock:
+            if pool not in _executors:
+                workers_key, queue_key = POOLS[pool]
+                workers = app.config[workers_key] or multiprocessing.cpu_count()
+                # ✅ Giới hạn số việc đang xử lý + đang chờ trong pool (giữ nguyên khi pool được tạo lại)
+                if pool not in _slots:
+                    _slots[pool] = threading.BoundedSemaphore(workers + app.config[queue_key])
+                _executors[pool] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context(app.config["CPU_POOL_START_METHOD"])
+                )
+
+    return _executors[pool]
+
+
+def _reset_executor(pool):
+    """ Pool bị hỏng (tiến trình con chết) -> bỏ đi, lần sau tạo lại """
+    with _init_lock:
+        executor = _executors.pop(pool, None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run(fn, *args, timeout=None, pool="ingest"):
+    """ Chạy `fn(*args)` trong pool tiến trình `pool` (xem POOLS) và chờ kết quả.
+
+    - `fn` và tham số phải pickle được (hàm cấp module, bytes, số...).
+    - Pool đầy quá CPU_POOL_WAIT giây hoặc tác vụ vượt `timeout` (mặc định CPU_TASK_TIMEOUT) -> CpuPoolBusy.
+    - CPU_POOL_ENABLED tắt, hoặc pool hỏng -> chạy trực tiếp trên luồng hiện tại.
+    """
+    app = current_app._get_current_object()
+    if not app.config["CPU_POOL_ENABLED"]:
+        _count(pool, "inline")
+        return fn(*args)
+
+    executor = _get_executor(app, pool)
+    slots = _slots[pool]
+    if not slots.acquire(timeout=app.config["CPU_POOL_WAIT"]):
+        _count(pool, "rejected")
+        raise CpuPoolBusy("Hệ thống đang bận xử lý ảnh, vui lòng thử lại sau!")
+
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        return _run_inline_after_broken(pool, fn, args)
+    except BaseException:
+        slots.release()
+        raise
+
+    # ✅ Slot chỉ được trả khi tiến trình con thật sự xong (kể cả sau khi quá thời gian),
+    # nên số việc đang chiếm CPU không bao giờ vượt giới hạn
+    future.add_done_callback(lambda _: slots.release())
+    _count(pool, "offloaded")
+
+    try:
+        return future.result(timeout=timeout or app.config["CPU_TASK_TIMEOUT"])
+    except FutureTimeout:
+        # Chỉ huỷ được nếu còn trong hàng đợi; đang chạy thì giữ slot tới khi xong
+        future.cancel()
+        _count(pool, "timeouts")
+        raise CpuPoolBusy("Xử lý ảnh quá thời gian cho phép!")
+    except BrokenProcessPool:
+        return _run_inline_after_broken(pool, fn, args)
+
+
+def _run_inline_after_broken(pool, fn, args):
+    _count(pool, "broken")
+    _reset_executor(pool)
+    _count(pool, "inline")
+    return fn(*args)
+
+
+def stats():
+    with _counters_lock:
+        return {name: dict(counter) for name, counter in _counters.items()}
@@ -0,0 +1,142 @@
+import uuid
+from contextlib import contextmanager
+from sqlalchemy import text
+from backend.app.db import db
+
+# 🔹 Số tín dụng mỗi lần xử lý ảnh / video
+COST_PER_RUN = 2
+
+
+class InsufficientCredits(Exception):
+    """ Số dư không đủ để giữ chỗ tín dụng """
+
+
+def reserve(user_id, amount, reference):
+    """ Giữ chỗ tín dụng trước khi chạy tác vụ, trả về ledger_id.
+
+    Trừ số dư và ghi sổ trong một câu lệnh duy nhất (UPDATE ... RETURNING),
+    điều kiện `>= amount` đảm bảo các request song song không thể tiêu quá số dư.
+    """
+    ledger_id = uuid.uuid4()
+    row = db.session.execute(text("""
+        WITH debit AS (
+            UPDATE users
+            SET user_credit_balance = user_credit_balance - :amount
+            WHERE user_id = :user_id AND user_credit_balance >= :amount
+            RETURNING user_id
+        )
+        INSERT INTO credit_ledger (ledger_id, user_id, ledger_delta, ledger_kind, ledger_status, ledger_reference, ledger_created_at, ledger_updated_at)
+        SELECT :ledger_id, user_id, -:amount, 'reserve', 'pending', :reference, now(), now() FROM debit
+        RETURNING ledger_id
+    """), {"user_id": str(user_id), "amount": amount, "ledger_id": str(ledger_id), "reference": reference}).first()
+    db.session.commit()
+
+    if not row:
+        raise InsufficientCredits()
+
+    return ledger_id
+
+
+def settle(ledger_id):
+    """ Tác vụ thành công: chốt khoản đã giữ chỗ """
+    db.session.execute(text("""
+        UPDATE credit_ledger
+        SET ledger_status = 'settled', ledger_updated_at = now()
+        WHERE ledger_id = :ledger_id AND ledger_status = 'pending'
+    """), {"ledger_id": str(ledger_id)})
+    db.session.commit()
+
+
+def settle_partial(ledger_id, amount):
+    """ Tác vụ theo lô: chốt `amount` trong khoản đã giữ chỗ, hoàn phần còn lại cùng một câu lệnh """
+    db.session.execute(text("""
+        WITH reserved AS (
+            SELECT ledger_id, user_id, -ledger_delta AS amount
+            FROM credit_ledger
+            WHERE ledger_id = :ledger_id AND ledger_status = 'pending'
+            FOR UPDATE
+        ), settled AS (
+            UPDATE credit_ledger
+            SET ledger_status = 'settled', ledger_delta = -LEAST(:amount, reserved.amount), ledger_updated_at = now()
+            FROM reserved
+            WHERE credit_ledger.ledger_id = reserved.ledger_id
+            RETURNING reserved.user_id, reserved.amount - LEAST(:amount, reserved.amount) AS unused
+        )
+        UPDATE users
+        SET user_credit_balance = users.user_credit_balance + settled.unused
+        FROM settled
+        WHERE users.user_id = settled.user_id
+    """), {"ledger_id": str(ledger_id), "amount": amount})
+    db.session.commit()
+
+
+def refund(ledger_id):
+    """ Tác vụ thất bại: hoàn lại khoản đã giữ chỗ (chỉ một lần) """
+    db.session.execute(text("""
+        WITH released AS (
+            UPDATE credit_ledger
+            SET ledger_status = 'refunded', ledger_updated_at = now()
+            WHERE ledger_id = :ledger_id AND ledger_status = 'pending'
+            RETURNING user_id, -ledger_delta AS amount
+        )
+        UPDATE users
+        SET user_credit_balance = users.user_credit_balance + released.amount
+        FROM released
+        WHERE users.user_id = released.user_id
+    """), {"ledger_id": str(ledger_id)})
+    db.session.commit()
+
+
+@contextmanager
+def refund_on_error(ledger_id):
+    """ Bao phần xử lý sau `reserve`: lỗi bất kỳ -> rollback phiên DB, hoàn khoản giữ chỗ rồi ném lại.
+
+    Khoản đã settle thì refund không còn tác dụng, nên có thể bao cả đoạn có settle.
+    """
+    try:
+        yield
+    except Exception:
+        db.session.rollback()
+        refund(ledger_id)
+        raise
+
+
+def refund_stale(max_age):
+    """ Hoàn các khoản giữ chỗ còn "pending" quá `max_age` giây (worker bị ngắt giữa chừng), trả về số khoản đã hoàn """
+    count = db.session.execute(text("""
+        WITH released AS (
+            UPDATE credit_ledger
+            SET ledger_status = 'refunded', ledger_updated_at = now()
+            WHERE ledger_kind = 'reserve' AND ledger_status = 'pending'
+              AND ledger_created_at < now() - make_interval(secs => :max_age)
+            RETURNING user_id, -ledger_delta AS amount
+        ), per_user AS (
+            SELECT user_id, SUM(amount) AS amount FROM released GROUP BY user_id
+        ), credited AS (
+            UPDATE users
+            SET user_credit_balance = users.user_credit_balance + per_user.amount
+            FROM per_user
+            WHERE users.user_id = per_user.user_id
+        )
+        SELECT count(*) FROM released
+    """), {"max_age": max_age}).scalar()
+    db.session.commit()
+
+    return count
+
+
+def grant(user_id, amount, reference, commit=True):
+    """ Cộng tín dụng (mua gói) và ghi sổ trong cùng một câu lệnh """
+    db.session.execute(text("""
+        WITH credit AS (
+            UPDATE users
+            SET user_credit_balance = user_credit_balance + :amount
+            WHERE user_id = :user_id
+            RETURNING user_id
+        )
+        INSERT INTO credit_ledger (ledger_id, user_id, ledger_delta, ledger_kind, ledger_status, ledger_reference, ledger_created_at, ledger_updated_at)
+        SELECT :ledger_id, user_id, :amount, 'purchase', 'settled', :reference, now(), now() FROM credit
+    """), {"user_id": str(user_id), "amount": amount, "ledger_id": str(uuid.uuid4()), "reference": reference})
+
+    if commit:
+        db.session.commit()
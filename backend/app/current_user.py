@@ -0,0 +1,57 @@
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from werkzeug.local import LocalProxy
+from backend.app.models import User
+
+# 🔹 Đánh dấu "đã tra cứu nhưng không có user" để không tra lại trong cùng request
+_ANONYMOUS = object()
+
+
+def user_claims(user):
+    """ Thông tin hiển thị gắn vào JWT để template không cần truy vấn CSDL """
+    claims = {"role": user.user_role, "username": user.user_username}
+    # Avatar dạng data:... (Microsoft Graph) quá lớn để đưa vào cookie
+    if user.user_avatar and not user.user_avatar.startswith("data:"):
+        claims["avatar"] = user.user_avatar
+    return claims
+
+
+class ClaimsUser:
+    """ User nhẹ dựng từ JWT; thuộc tính không có trong claims sẽ tải bản ghi User (một lần) """
+
+    def __init__(self, user_id, claims):
+        self.user_id = user_id
+        self.user_role = claims.get("role", "user")
+        if "username" in claims:
+            self.user_username = claims["username"]
+        if "avatar" in claims:
+            self.user_avatar = claims["avatar"]
+        self._record = None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._record is None:
+            self._record = User.query.get(self.user_id)
+            if self._record is None:
+                raise AttributeError(name)
+        return getattr(self._record, name)
+
+
+def _resolve():
+    user = g.get("_current_user")
+    if user is None:
+        user = _ANONYMOUS
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+            if user_id:
+                user = ClaimsUser(user_id, get_jwt())
+        except Exception:
+            pass
+        g._current_user = user
+    return None if user is _ANONYMOUS else user
+
+
+# ✅ Chỉ giải mã JWT khi template thật sự dùng tới current_user, tối đa một lần mỗi request
+current_user = LocalProxy(_resolve)
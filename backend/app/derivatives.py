@@ -0,0 +1,80 @@
+from functools import lru_cache
+from io import BytesIO
+from flask import current_app
+from PIL import Image as PILImage, ImageOps, features
+from backend.app import cpu_pool
+from backend.app import storage
+
+
+@lru_cache(maxsize=None)
+def available_formats():
+    """ AVIF nếu Pillow được build kèm libavif, luôn có WebP """
+    return ("avif", "webp") if features.check("avif") else ("webp",)
+
+
+def render_renditions(image_data, widths, formats, quality):
+    """ Tạo các bản thu nhỏ [(width, format, bytes)], chạy trong pool tiến trình.
+
+    Ảnh được giải mã một lần (draft với JPEG) rồi thu nhỏ dần từ bản lớn nhất xuống,
+    không phóng to quá kích thước gốc: các width không nhỏ hơn ảnh gốc gộp thành một bản ở kích thước gốc.
+    """
+    image = PILImage.open(BytesIO(image_data))
+    if image.format == "JPEG":
+        image.draft("RGB", (max(widths), max(widths)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    results = []
+    emitted = set()
+    current = image
+    for width in sorted(set(widths), reverse=True):
+        if width < current.width:
+            current = current.resize((width, max(1, round(current.height * width / current.width))), PILImage.LANCZOS)
+        if current.width in emitted:
+            continue
+        emitted.add(current.width)
+        for fmt in formats:
+            buffer = BytesIO()
+            current.save(buffer, format=fmt.upper(), quality=quality)
+            results.append((current.width, fmt, buffer.getvalue()))
+
+    return results
+
+
+def generate_for_url(url, image_data=None):
+    """ Tạo và lưu các bản thu nhỏ cạnh ảnh gốc, trả về [{"url", "width", "format"}].
+
+    Không bao giờ làm hỏng tác vụ chính: lỗi chỉ được ghi log và trả về [].
+    """
+    try:
+        container, blob_name = storage.split_url(url)
+        if image_data is None:
+            image_data = storage.download(container, blob_name)
+
+        config = current_app.config
+        stem = blob_name.rsplit(".", 1)[0]
+        renditions = []
+        for width, fmt, data in cpu_pool.run(
+            render_renditions, image_data, config["DERIVATIVE_WIDTHS"], available_formats(), config["DERIVATIVE_QUALITY"]
+        ):
+            rendition_url = storage.upload_bytes(
+                container,
+                f"renditions/{stem}_{width}.{fmt}",
+                data,
+                content_type=f"image/{fmt}",
+                cache_control="public, max-age=31536000, immutable"
+            )
+            renditions.append({"url": rendition_url, "width": width, "format": fmt})
+        return renditions
+    except Exception as e:
+        print(f"⚠️ Không tạo được ảnh thu nhỏ cho {url}: {e}")
+        return []
+
+
+def attach(image, slot, renditions):
+    """ Ghi bản thu nhỏ vào image_renditions["original" | "restored"] (gán lại để JSON được lưu) """
+    if renditions:
+        image.image_renditions = dict(image.image_renditions or {}, **{slot: renditions})
+    elif image.image_renditions and slot in image.image_renditions:
+        image.image_renditions = {key: value for key, value in image.image_renditions.items() if key != slot}
@@ -0,0 +1,102 @@
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+# 🔹 Một Session dùng chung cho mọi lời gọi ra ngoài (Replicate, PayPal, Graph, tải kết quả)
+# để tái sử dụng kết nối keep-alive thay vì bắt tay TCP + TLS mỗi lần.
+# Session được tạo lười theo current_app.config và lưu trong app.extensions["http_client"].
+_lock = threading.Lock()
+
+# host -> số liệu kết nối
+_stats = {}
+
+
+def _get_client():
+    """ (Session, HTTPAdapter) của app hiện tại """
+    app = current_app._get_current_object()
+    client = app.extensions.get("http_client")
+
+    if client is None:
+        with _lock:
+            client = app.extensions.get("http_client")
+            if client is None:
+                adapter = HTTPAdapter(
+                    pool_connections=app.config["HTTP_POOL_HOSTS"],  # Số host được giữ pool
+                    pool_maxsize=app.config["HTTP_POOL_MAXSIZE"]  # Số kết nối tối đa mỗi host
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                # Session dùng chung cho mọi user nên không giữ cookie của bên thứ ba
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                client = (session, adapter)
+                app.extensions["http_client"] = client
+
+    return client
+
+
+def get_session():
+    return _get_client()[0]
+
+
+def _host_stats(host):
+    with _lock:
+        return _stats.setdefault(host, {
+            "requests": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "total_time": 0.0
+        })
+
+
+def request(method, url, **kwargs):
+    """ Giống `requests.request` nhưng đi qua pool kết nối dùng chung """
+    session, adapter = _get_client()
+    config = current_app.config
+    kwargs.setdefault("timeout", (config["HTTP_CONNECT_TIMEOUT"], config["HTTP_READ_TIMEOUT"]))
+
+    host = urlsplit(url).netloc
+    stats = _host_stats(host)
+    pool = adapter.poolmanager.connection_from_url(url)
+    connections_before = pool.num_connections
+
+    start = time.perf_counter()
+    try:
+        return session.request(method, url, **kwargs)
+    except requests.RequestException:
+        with _lock:
+            stats["errors"] += 1
+        raise
+    finally:
+        with _lock:
+            stats["requests"] += 1
+            stats["total_time"] += time.perf_counter() - start
+            # Gần đúng khi có nhiều luồng cùng gọi một host
+            stats["new_connections"] += max(0, pool.num_connections - connections_before)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request("POST", url, data=data, json=json, **kwargs)
+
+
+def put(url, data=None, **kwargs):
+    return request("PUT", url, data=data, **kwargs)
+
+
+def stats():
+    """ Số liệu theo host: số request, lỗi, kết nối mới và thời gian trung bình """
+    with _lock:
+        result = {}
+        for host, item in _stats.items():
+            result[host] = dict(item)
+            result[host]["avg_time_ms"] = round(item["total_time"] * 1000 / item["requests"], 1) if item["requests"] else 0
+            result[host]["reuse_ratio"] = round(1 - item["new_connections"] / item["requests"], 3) if item["requests"] else 0
+        return result
@@ -0,0 +1,118 @@
+import threading
+from flask import current_app
+from backend.app import storage
+from backend.app.cpu_pool import CpuPoolBusy
+from backend.app.inference import replicate_backend, onnx_backend
+
+# 🔹 Model theo công cụ (dùng chung cho routes và pipelines): phiên bản Replicate cố định,
+# tên tham số ảnh đầu vào và tham số mặc định
+MODELS = {
+    "gfpgan": {
+        "replicate": "tencentarc/gfpgan:0fbacf7afc6c144e5be9767cff80f25aff23e52b0708f17e20f9879b2f21516c",
+        "input_key": "img",
+        "params": {"scale": 2, "version": "v1.4"}
+    },
+    "esrgan": {
+        "replicate": "nightmareai/real-esrgan:f121d640bd286e1fdc67f9799164c1d5be36ff74576ee11c803ae5b665dd46aa",
+        "input_key": "image",
+        "params": {"scale": 2, "face_enhance": False}
+    },
+    "colorize": {
+        "replicate": "arielreplicate/deoldify_image:0da600fab0c45a66211339f1c16b71345d22f26ef5fea3dca1bb90bb5711e950",
+        "input_key": "input_image",
+        "params": {"model_name": "Artistic", "render_factor": 35}
+    },
+}
+
+# 🔹 Hệ số phóng to Real-ESRGAN được chấp nhận (model Replicate nhận 1-10)
+MAX_SCALE = 10
+
+# 🔹 Đếm số lần chạy theo backend trong process hiện tại (xem ở /admin/metrics)
+_counters = {"replicate": 0, "local": 0, "local_fallbacks": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(field):
+    with _counters_lock:
+        _counters[field] += 1
+
+
+def parse_scale(value):
+    """ Hệ số phóng to từ request: số nguyên 1..MAX_SCALE, không hợp lệ -> ValueError """
+    try:
+        scale = int(value)
+        exact = not isinstance(value, bool) and scale == float(value)
+    except (TypeError, ValueError, OverflowError):
+        exact = False
+    if not exact or not 1 <= scale <= MAX_SCALE:
+        raise ValueError(f"scale không hợp lệ: {value!r}")
+    return scale
+
+
+def _local_first(tool, params):
+    mode = current_app.config["INFERENCE_BACKEND"]
+    if not onnx_backend.enabled(tool):
+        return False
+    return mode == "local" or (mode == "auto" and onnx_backend.supports(tool, params))
+
+
+def engines(tool, params):
+    """ Các engine có thể chạy `tool` với tham số này, theo thứ tự `run` sẽ thử.
+
+    Engine là phiên bản Replicate hoặc "onnx/<file>@<hash>" và là một phần của khoá cache kết quả:
+    ảnh do model local tạo ra khác ảnh của Replicate nên không được dùng lẫn cho nhau.
+    """
+    candidates = []
+    if _local_first(tool, params):
+        candidates.append(onnx_backend.engine_id(tool))
+    if current_app.config["INFERENCE_BACKEND"] != "local" or not onnx_backend.enabled(tool):
+        candidates.append(MODELS[tool]["replicate"])
+    return candidates
+
+
+def run(tool, image_url, params, timeout=None):
+    """ Chạy model của `tool` trên backend được chọn, trả về (output, engine): output là URL kết quả (Replicate)
+    hoặc bytes JPEG (local), engine là định danh model đã thực sự chạy (dùng cho khoá cache).
+
+    INFERENCE_BACKEND:
+    - "replicate": luôn gọi Replicate.
+    - "local": luôn chạy ONNX trên CPU của server (lỗi nếu không chạy được).
+    - "auto": chạy local khi có model và ảnh đủ nhỏ (mặt nhỏ, upscale 2x), còn lại hoặc pool đang bận -> Replicate.
+    GFPGAN chỉ chạy local khi bật INFERENCE_LOCAL_GFPGAN (model local không tự căn chỉnh khuôn mặt).
+    """
+    mode = current_app.config["INFERENCE_BACKEND"]
+
+    if _local_first(tool, params):
+        try:
+            output = onnx_backend.run(tool, image_url, params, timeout)
+            _count("local")
+            return output, onnx_backend.engine_id(tool)
+        except (onnx_backend.Unsupported, CpuPoolBusy):
+            if mode == "local":
+                raise
+            _count("local_fallbacks")
+
+    model = MODELS[tool]
+    output = replicate_backend.run(model["replicate"], model["input_key"], image_url, params, timeout)
+    _count("replicate")
+    return output, model["replicate"]
+
+
+def run_replicate(tool, image_url, params, timeout=None, deadline=None):
+    """ Luôn chạy trên Replicate, trả về URL kết quả (pipeline cần URL để chuyển thẳng sang bước sau) """
+    model = MODELS[tool]
+    output = replicate_backend.run(model["replicate"], model["input_key"], image_url, params, timeout, deadline)
+    _count("replicate")
+    return output
+
+
+def store_output(output, container, blob_name, headers=None):
+    """ Lưu kết quả vào kho lưu trữ và trả về URL: bytes thì ghi thẳng, URL thì stream từ Replicate """
+    if isinstance(output, bytes):
+        return storage.upload_bytes(container, blob_name, output, content_type="image/jpeg")
+    return storage.upload_from_url(container, blob_name, output, headers=headers)
+
+
+def stats():
+    with _counters_lock:
+        return dict(_counters)
@@ -0,0 +1,186 @@
+import hashlib
+import os
+from io import BytesIO
+from flask import current_app
+from PIL import Image as PILImage, ImageOps
+from backend.app import cpu_pool
+from backend.app import http_client
+
+# 🔹 numpy / onnxruntime (tuỳ chọn, không cài thì chỉ dùng Replicate) chỉ được import ở lần dùng đầu:
+# onnxruntime nạp thư viện native khá lâu, không để làm chậm lúc khởi động worker khi INFERENCE_BACKEND=replicate
+np = ort = None
+_runtime_checked = False
+
+# 🔹 File model ONNX trong INFERENCE_ONNX_DIR
+MODEL_FILES = {
+    "gfpgan": "gfpgan_v1.4.onnx",  # Vào/ra 1x3x512x512, giá trị [-1, 1]
+    "esrgan": "realesrgan_x2plus.onnx"  # Vào 1x3xHxW [0, 1], ra 1x3x2Hx2W
+}
+GFPGAN_SIZE = 512
+UPSCALE = 2  # Cả hai model local đều phóng to 2x (GFPGAN_PARAMS scale = 2)
+TILE_SIZE = 256  # Real-ESRGAN chạy theo ô để giới hạn RAM
+TILE_PAD = 16  # Phần chồng lấn giữa các ô, tránh đường nối
+
+# 🔹 Định danh model (tên file + hash nội dung) theo (đường dẫn, mtime): chỉ hash lại khi file model đổi
+_engine_ids = {}
+
+# 🔹 Phiên ONNX đã nạp trong tiến trình hiện tại (mỗi tiến trình con của pool chỉ nạp một lần)
+_sessions = {}
+
+
+class Unsupported(Exception):
+    """ Ảnh / tham số này không chạy local được, cần dùng backend khác """
+
+
+def _load_runtime():
+    """ Import numpy + onnxruntime một lần cho mỗi tiến trình, trả về True nếu dùng được """
+    global np, ort, _runtime_checked
+
+    if not _runtime_checked:
+        try:
+            import numpy
+            import onnxruntime
+            np, ort = numpy, onnxruntime
+        except ImportError:
+            pass
+        _runtime_checked = True
+    return ort is not None
+
+
+def model_path(tool):
+    return os.path.join(current_app.config["INFERENCE_ONNX_DIR"], MODEL_FILES[tool])
+
+
+def enabled(tool):
+    """ Công cụ có model local và được phép chạy local (GFPGAN phải bật INFERENCE_LOCAL_GFPGAN) """
+    if tool not in MODEL_FILES:
+        return False
+    return tool != "gfpgan" or current_app.config["INFERENCE_LOCAL_GFPGAN"]
+
+
+def engine_id(tool):
+    """ Định danh model local dùng trong khoá cache: kết quả ONNX khác Replicate, đổi file model -> khoá mới """
+    path = model_path(tool)
+    try:
+        stamp = (path, os.path.getmtime(path))
+    except OSError:
+        return f"onnx/{MODEL_FILES[tool]}"
+
+    if stamp not in _engine_ids:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _engine_ids[stamp] = f"onnx/{MODEL_FILES[tool]}@{digest.hexdigest()[:16]}"
+    return _engine_ids[stamp]
+
+
+def supports(tool, params):
+    """ Được bật, có onnxruntime, có file model và tham số nằm trong những gì model local làm được """
+    if not enabled(tool) or not _load_runtime() or not os.path.exists(model_path(tool)):
+        return False
+    try:
+        if int(params.get("scale", UPSCALE)) != UPSCALE:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return not params.get("face_enhance")
+
+
+def run(tool, image_url, params, timeout=None):
+    """ Tải ảnh đầu vào, chạy model trong pool tiến trình, trả về bytes JPEG.
+
+    Ảnh vượt giới hạn kích thước (mặt lớn / ảnh upscale quá to) -> Unsupported.
+    """
+    if not supports(tool, params):
+        raise Unsupported(f"Không chạy {tool} local với tham số {params}")
+
+    config = current_app.config
+    response = http_client.get(image_url, timeout=timeout or (config["HTTP_CONNECT_TIMEOUT"], config["HTTP_READ_TIMEOUT"]))
+    response.raise_for_status()
+    image_data = response.content
+
+    # Chỉ đọc header để biết kích thước
+    width, height = PILImage.open(BytesIO(image_data)).size
+    if tool == "gfpgan" and max(width, height) > config["INFERENCE_LOCAL_FACE_MAX_SIDE"]:
+        raise Unsupported(f"Ảnh {width}x{height} quá lớn cho GFPGAN local")
+    if width * height > config["INFERENCE_LOCAL_MAX_PIXELS"]:
+        raise Unsupported(f"Ảnh {width}x{height} quá lớn để chạy local")
+
+    # ✅ Pool "inference" riêng: model chạy lâu không chiếm slot của pool ingest (tải ảnh lên)
+    return cpu_pool.run(
+        enhance, tool, model_path(tool), image_data, config["INFERENCE_LOCAL_JPEG_QUALITY"],
+        timeout=config["INFERENCE_LOCAL_TIMEOUT"], pool="inference"
+    )
+
+
+def _session(path):
+    session = _sessions.get(path)
+    if session is None:
+        _load_runtime()  # Tiến trình con của pool (spawn / forkserver) chưa import
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1  # Song song theo tiến trình của pool, không tranh luồng trong một tiến trình
+        session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        _sessions[path] = session
+    return session
+
+
+def enhance(tool, path, image_data, quality):
+    """ Hàm thuần chạy trong tiến trình con: giải mã -> model ONNX -> JPEG """
+    image = ImageOps.exif_transpose(PILImage.open(BytesIO(image_data)))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    session = _session(path)
+    output = _restore_face(session, image) if tool == "gfpgan" else _upscale(session, image)
+
+    buffer = BytesIO()
+    output.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _restore_face(session, image):
+    """ GFPGAN cho ảnh mặt nhỏ đã cắt sẵn (không phát hiện / căn chỉnh mặt, xem INFERENCE_LOCAL_GFPGAN).
+
+    Ảnh được đặt giữa một khung vuông (viền đen) rồi mới đưa về 512x512 để không bị méo tỉ lệ,
+    kết quả được cắt bỏ phần viền và trả về kích thước gốc x2.
+    """
+    width, height = image.size
+    side = max(width, height)
+    left, top = (side - width) // 2, (side - height) // 2
+    square = PILImage.new("RGB", (side, side))
+    square.paste(image, (left, top))
+
+    face = np.asarray(square.resize((GFPGAN_SIZE, GFPGAN_SIZE), PILImage.LANCZOS), dtype=np.float32) / 127.5 - 1.0
+    tensor = np.ascontiguousarray(face.transpose(2, 0, 1)[None])
+
+    result = session.run(None, {session.get_inputs()[0].name: tensor})[0][0]
+    result = ((result.transpose(1, 2, 0).clip(-1, 1) + 1) * 127.5).round().astype(np.uint8)
+
+    restored = PILImage.fromarray(result).resize((side * UPSCALE, side * UPSCALE), PILImage.LANCZOS)
+    return restored.crop((left * UPSCALE, top * UPSCALE, (left + width) * UPSCALE, (top + height) * UPSCALE))
+
+
+def _upscale(session, image):
+    """ Real-ESRGAN x2 theo từng ô TILE_SIZE, mỗi ô lấy thêm TILE_PAD điểm ảnh xung quanh rồi cắt bỏ ở đầu ra """
+    array = np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    _, height, width = array.shape
+    output = np.zeros((3, height * UPSCALE, width * UPSCALE), dtype=np.float32)
+    input_name = session.get_inputs()[0].name
+
+    for top in range(0, height, TILE_SIZE):
+        for left in range(0, width, TILE_SIZE):
+            bottom, right = min(top + TILE_SIZE, height), min(left + TILE_SIZE, width)
+            pad_top, pad_left = max(top - TILE_PAD, 0), max(left - TILE_PAD, 0)
+            pad_bottom, pad_right = min(bottom + TILE_PAD, height), min(right + TILE_PAD, width)
+
+            tile = np.ascontiguousarray(array[None, :, pad_top:pad_bottom, pad_left:pad_right])
+            result = session.run(None, {input_name: tile})[0][0]
+
+            output[:, top * UPSCALE:bottom * UPSCALE, left * UPSCALE:right * UPSCALE] = result[
+                :,
+                (top - pad_top) * UPSCALE:(bottom - pad_top) * UPSCALE,
+                (left - pad_left) * UPSCALE:(right - pad_left) * UPSCALE
+            ]
+
+    return PILImage.fromarray((output.clip(0, 1).transpose(1, 2, 0) * 255).round().astype(np.uint8))
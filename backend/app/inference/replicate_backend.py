@@ -0,0 +1,11 @@
+from backend.app import predictions
+
+
+def run(model, input_key, image_url, params, timeout=None, deadline=None):
+    """ Chạy model trên Replicate (chờ webhook), trả về URL ảnh kết quả """
+    return predictions.first_output(predictions.run(
+        model,
+        input=dict(params, **{input_key: image_url}),
+        timeout=timeout,
+        deadline=deadline
+    ))
@@ -0,0 +1,69 @@
+from io import BytesIO
+from flask import current_app, has_app_context
+from PIL import Image as PILImage, ImageOps
+
+# 🔹 Giá trị mặc định (ghi đè bằng INGEST_* trong Config)
+DEFAULT_MAX_SIZE = 1024  # Cạnh dài tối đa sau khi thu nhỏ (px)
+DEFAULT_JPEG_QUALITY = 85
+DEFAULT_MAX_PIXELS = 50_000_000  # Chặn ảnh "decompression bomb" trước khi giải mã
+
+
+class ImageRejected(ValueError):
+    """ Ảnh tải lên không đọc được hoặc quá lớn để xử lý """
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def ingest_image(image_data, max_size=None, quality=None):
+    """ Chuẩn hoá ảnh tải lên trong pool tiến trình (không giữ GIL của luồng request) """
+    from backend.app import cpu_pool  # Import muộn: bench nạp file này mà không khởi tạo app
+
+    return cpu_pool.run(
+        transform_image,
+        image_data,
+        max_size or _setting("INGEST_MAX_SIZE", DEFAULT_MAX_SIZE),
+        quality or _setting("INGEST_JPEG_QUALITY", DEFAULT_JPEG_QUALITY),
+        _setting("INGEST_MAX_PIXELS", DEFAULT_MAX_PIXELS)
+    )
+
+
+def transform_image(image_data, max_size=DEFAULT_MAX_SIZE, quality=DEFAULT_JPEG_QUALITY, max_pixels=DEFAULT_MAX_PIXELS):
+    """ Chuẩn hoá ảnh: xoay theo EXIF, thu nhỏ về `max_size`, xuất JPEG.
+
+    - Chỉ đọc header để kiểm tra số điểm ảnh trước khi giải mã cả ảnh.
+    - JPEG lớn được giải mã ở chế độ draft (giảm 1/2, 1/4, 1/8 ngay trong bộ giải mã DCT),
+      nên ảnh 12MP từ điện thoại không phải giải mã đủ độ phân giải rồi mới thu nhỏ.
+    - Định dạng khác dùng `reduce()` (qua reducing_gap) trước khi LANCZOS.
+    - Hàm thuần (không đọc cấu hình) để chạy được trong tiến trình con.
+    """
+    try:
+        image = PILImage.open(BytesIO(image_data))
+    except (PILImage.UnidentifiedImageError, PILImage.DecompressionBombError) as e:
+        raise ImageRejected(f"Không đọc được ảnh: {e}")
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageRejected(f"Ảnh quá lớn ({width}x{height})!")
+
+    try:
+        if image.format == "JPEG":
+            # Hộp vuông nên xoay EXIF 90° sau đó cũng không làm ảnh nhỏ hơn max_size
+            image.draft("RGB", (max_size, max_size))
+
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        image.thumbnail((max_size, max_size), PILImage.LANCZOS, reducing_gap=2.0)
+
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+    except (OSError, PILImage.DecompressionBombError) as e:
+        raise ImageRejected(f"Không đọc được ảnh: {e}")
+
+    return buffer.getvalue()
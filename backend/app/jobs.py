@@ -0,0 +1,141 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from backend.app.db import db
+from backend.app.models import Job
+
+# 🔹 Pool luồng dùng chung cho các tác vụ nền (predict -> download -> upload)
+_executor = None
+_slots = None
+_batch_executor = None
+_init_lock = threading.Lock()
+_counters = {"submitted": 0, "rejected": 0, "running": 0, "in_flight": 0}
+_counters_lock = threading.Lock()
+
+
+class JobQueueFull(Exception):
+    """ Hàng đợi đã đầy, request cần được từ chối (503) thay vì chờ """
+
+
+def _count(field, delta=1):
+    with _counters_lock:
+        _counters[field] += delta
+
+
+def _get_executor(app):
+    global _executor, _slots
+
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                workers = app.config["JOB_WORKERS"]
+                # ✅ Giới hạn tổng số tác vụ đang chạy + đang chờ để tránh dồn ứ vô hạn
+                _slots = threading.BoundedSemaphore(workers + app.config["JOB_QUEUE_SIZE"])
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    return _executor
+
+
+def batch_executor():
+    """ Pool luồng dùng chung cho các prediction con (ảnh trong /gfpgan/batch, nhánh song song của pipeline).
+
+    Một pool cho cả tiến trình nên tổng số prediction con chạy cùng lúc không vượt BATCH_CONCURRENCY,
+    thay vì JOB_WORKERS × BATCH_CONCURRENCY khi mỗi tác vụ tự tạo pool riêng. Việc gửi vào không được
+    tự gửi tiếp vào pool này (tránh chờ vòng).
+    """
+    global _batch_executor
+
+    if _batch_executor is None:
+        app = current_app._get_current_object()
+        with _init_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(max_workers=app.config["BATCH_CONCURRENCY"], thread_name_prefix="batch")
+
+    return _batch_executor
+
+
+def submit_job(user_id, kind, fn, *args, **kwargs):
+    """ Tạo bản ghi Job và đẩy `fn(job_id, *args, **kwargs)` vào pool luồng """
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+
+    if not _slots.acquire(blocking=False):
+        _count("rejected")
+        raise JobQueueFull()
+
+    try:
+        job = Job(user_id=user_id, job_kind=kind, job_status="queued", job_stage="queued")
+        db.session.add(job)
+        db.session.commit()
+        # Đếm trước khi submit: tác vụ có thể chạy xong (và trừ in_flight) trước khi submit() trả về
+        _count("submitted")
+        _count("in_flight")
+        executor.submit(_run_job, app, job.job_id, fn, args, kwargs)
+    except Exception:
+        _slots.release()
+        raise
+
+    return job
+
+
+def update_job(job_id, stage, progress, result=None):
+    """ Cập nhật bước đang chạy để `/jobs/<id>` báo tiến độ (kèm kết quả tạm nếu có, VD trạng thái từng ảnh trong lô) """
+    job = Job.query.get(job_id)
+    if job:
+        job.job_stage = stage
+        job.job_progress = progress
+        if result is not None:
+            job.job_result = result
+        db.session.commit()
+
+
+def _run_job(app, job_id, fn, args, kwargs):
+    _count("running")
+    with app.app_context():
+        try:
+            job = Job.query.get(job_id)
+            job.job_status = "running"
+            db.session.commit()
+
+            result = fn(job_id, *args, **kwargs)
+
+            job = Job.query.get(job_id)
+            job.job_status = "succeeded"
+            job.job_stage = "done"
+            job.job_progress = 100
+            job.job_result = result
+            db.session.commit()
+        except Exception as e:
+            print(f"❌ Tác vụ {job_id} thất bại:", str(e))
+            db.session.rollback()
+            job = Job.query.get(job_id)
+            if job:
+                job.job_status = "failed"
+                job.job_error = str(e)[:255]
+                db.session.commit()
+        finally:
+            db.session.remove()
+            _count("running", -1)
+            _count("in_flight", -1)
+            _slots.release()
+
+
+def stats():
+    """ Độ bão hoà của pool: running / JOB_WORKERS và in_flight (đang chạy + đang chờ) / capacity """
+    config = current_app.config
+    with _counters_lock:
+        return dict(_counters, workers=config["JOB_WORKERS"], capacity=config["JOB_WORKERS"] + config["JOB_QUEUE_SIZE"])
+
+
+def job_to_dict(job):
+    return {
+        "job_id": str(job.job_id),
+        "kind": job.job_kind,
+        "status": job.job_status,
+        "stage": job.job_stage,
+        "progress": job.job_progress,
+        "result": job.job_result,
+        "error": job.job_error,
+        "created_at": job.job_created_at.isoformat() if job.job_created_at else None,
+        "updated_at": job.job_updated_at.isoformat() if job.job_updated_at else None
+    }
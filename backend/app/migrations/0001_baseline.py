@@ -0,0 +1,125 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+# 🔹 Lược đồ trước chuỗi migration (bảng mà db.create_all() lúc khởi động từng tạo), cố định bằng DDL:
+# không đọc models.py nên CSDL mới và CSDL đã có đi cùng một đường 0002 -> 00NN để tới lược đồ hiện tại.
+# IF NOT EXISTS: CSDL tạo bằng create_all trước khi có migration vẫn chạy được.
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id UUID PRIMARY KEY,
+        user_username VARCHAR(50) NOT NULL UNIQUE,
+        user_email VARCHAR(100) NOT NULL UNIQUE,
+        user_password_hash VARCHAR(255),
+        user_role VARCHAR(20),
+        user_created_at TIMESTAMP,
+        user_updated_at TIMESTAMP,
+        user_avatar VARCHAR(255),
+        reset_otp_code VARCHAR(6),
+        reset_otp_expiry TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS packages (
+        package_id UUID PRIMARY KEY,
+        package_name VARCHAR(50) NOT NULL UNIQUE,
+        package_price NUMERIC(10, 2) NOT NULL,
+        package_credits INTEGER NOT NULL,
+        package_description VARCHAR(255),
+        package_created_at TIMESTAMP,
+        package_updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_packages (
+        user_package_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL REFERENCES users (user_id),
+        package_id UUID NOT NULL REFERENCES packages (package_id),
+        user_package_credits INTEGER NOT NULL,
+        user_package_purchased_at TIMESTAMP,
+        user_package_expired_at TIMESTAMP,
+        user_package_updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payments (
+        payment_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL REFERENCES users (user_id),
+        payment_amount NUMERIC(10, 2) NOT NULL,
+        payment_currency VARCHAR(10),
+        payment_method VARCHAR(50) NOT NULL,
+        payment_status VARCHAR(20),
+        payment_created_at TIMESTAMP,
+        payment_updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS images (
+        image_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL REFERENCES users (user_id),
+        image_original_url VARCHAR(255) NOT NULL,
+        image_restored_url VARCHAR(255),
+        image_status VARCHAR(20),
+        image_credits_used INTEGER,
+        image_created_at TIMESTAMP,
+        image_updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS videos (
+        video_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL REFERENCES users (user_id),
+        video_original_url VARCHAR(255) NOT NULL,
+        video_processed_url VARCHAR(255),
+        video_status VARCHAR(20),
+        video_credits_used INTEGER,
+        video_created_at TIMESTAMP,
+        video_updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL REFERENCES users (user_id),
+        job_kind VARCHAR(50) NOT NULL,
+        job_status VARCHAR(20),
+        job_stage VARCHAR(50),
+        job_progress INTEGER,
+        job_result JSON,
+        job_error VARCHAR(255),
+        job_created_at TIMESTAMP,
+        job_updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inference_cache (
+        cache_key VARCHAR(64) PRIMARY KEY,
+        cache_model VARCHAR(255) NOT NULL,
+        cache_output JSON NOT NULL,
+        cache_hits INTEGER,
+        cache_created_at TIMESTAMP,
+        cache_last_hit_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_inference_cache_cache_last_hit_at ON inference_cache (cache_last_hit_at)",
+    """
+    CREATE TABLE IF NOT EXISTS credit_ledger (
+        ledger_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL REFERENCES users (user_id),
+        ledger_delta INTEGER NOT NULL,
+        ledger_kind VARCHAR(20) NOT NULL,
+        ledger_status VARCHAR(20),
+        ledger_reference VARCHAR(100),
+        ledger_created_at TIMESTAMP,
+        ledger_updated_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_credit_ledger_user_id ON credit_ledger (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_credit_ledger_ledger_reference ON credit_ledger (ledger_reference)",
+]
+
+
+def upgrade():
+    """ Lược đồ gốc (cố định): mọi thay đổi sau đó nằm trong 0002 trở đi """
+    for statement in TABLES:
+        db.session.execute(text(statement))
@@ -0,0 +1,8 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Hash nội dung ảnh để khử trùng lặp khi tải lên """
+    db.session.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS image_content_hash VARCHAR(64)"))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_images_image_content_hash ON images (image_content_hash)"))
@@ -0,0 +1,17 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Số dư tín dụng: lần đầu thêm cột thì khởi tạo từ tổng user_packages """
+    has_balance = db.session.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'users' AND column_name = 'user_credit_balance'"
+    )).first()
+    if has_balance:
+        return
+
+    db.session.execute(text("ALTER TABLE users ADD COLUMN user_credit_balance INTEGER NOT NULL DEFAULT 0"))
+    db.session.execute(text(
+        "UPDATE users SET user_credit_balance = COALESCE("
+        "(SELECT SUM(user_package_credits) FROM user_packages WHERE user_packages.user_id = users.user_id), 0)"
+    ))
@@ -0,0 +1,22 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+# 🔹 Index cho các truy vấn chạy ở mọi request (tên trùng với __table_args__ trong models.py)
+INDEXES = [
+    # Thư viện ảnh / video: lọc theo user, sắp theo (created_at, id) cho phân trang keyset
+    "CREATE INDEX IF NOT EXISTS ix_images_user_created ON images (user_id, image_created_at DESC, image_id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_videos_user_created ON videos (user_id, video_created_at DESC, video_id DESC)",
+    # Lịch sử gói đã mua của user
+    "CREATE INDEX IF NOT EXISTS ix_user_packages_user_id ON user_packages (user_id)",
+    # colorize / lama tra ảnh theo URL gốc
+    "CREATE INDEX IF NOT EXISTS ix_images_original_url ON images (image_original_url)",
+    # Khử trùng lặp ảnh tải lên theo (user, hash nội dung)
+    "CREATE INDEX IF NOT EXISTS ix_images_user_content_hash ON images (user_id, image_content_hash)",
+    # Trang trạng thái job của user
+    "CREATE INDEX IF NOT EXISTS ix_jobs_user_created ON jobs (user_id, job_created_at DESC)",
+]
+
+
+def upgrade():
+    for statement in INDEXES:
+        db.session.execute(text(statement))
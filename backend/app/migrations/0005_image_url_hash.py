@@ -0,0 +1,15 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Hash URL gốc để tra ảnh theo URL (client cũ của colorize) bằng index ngắn, theo từng user """
+    db.session.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS image_original_url_hash VARCHAR(32)"))
+    db.session.execute(text(
+        "UPDATE images SET image_original_url_hash = md5(image_original_url) WHERE image_original_url_hash IS NULL"
+    ))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_images_user_url_hash ON images (user_id, image_original_url_hash)"
+    ))
+    # Index btree trên cả chuỗi URL (0004) không còn cần nữa
+    db.session.execute(text("DROP INDEX IF EXISTS ix_images_original_url"))
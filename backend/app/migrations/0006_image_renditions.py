@@ -0,0 +1,7 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Danh sách ảnh thu nhỏ WebP/AVIF của ảnh gốc và ảnh kết quả """
+    db.session.execute(text("ALTER TABLE images ADD COLUMN IF NOT EXISTS image_renditions JSON"))
@@ -0,0 +1,7 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Bỏ index đơn trên image_content_hash (0002 cũ): ix_images_user_content_hash đã phục vụ mọi truy vấn theo hash """
+    db.session.execute(text("DROP INDEX IF EXISTS ix_images_image_content_hash"))
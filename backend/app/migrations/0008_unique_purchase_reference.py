@@ -0,0 +1,14 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Mỗi đơn PayPal chỉ được ghi sổ một lần: index unique một phần trên mã đơn của các dòng mua gói.
+
+    Hai request xác nhận cùng một đơn chạy song song -> dòng thứ hai vi phạm index (IntegrityError)
+    thay vì cùng vượt qua bước kiểm tra rồi cộng tín dụng hai lần.
+    """
+    db.session.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_credit_ledger_purchase_reference
+        ON credit_ledger (ledger_reference) WHERE ledger_kind = 'purchase'
+    """))
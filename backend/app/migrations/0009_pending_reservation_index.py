@@ -0,0 +1,10 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Index một phần cho `flask refund-stale-reservations`: chỉ chứa các khoản giữ chỗ còn "pending" nên rất nhỏ """
+    db.session.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_credit_ledger_pending_created
+        ON credit_ledger (ledger_created_at) WHERE ledger_status = 'pending'
+    """))
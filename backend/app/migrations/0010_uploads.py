@@ -0,0 +1,17 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Ghi nhận URL SAS đã cấp: /uploads/commit chỉ nhận mỗi file một lần, `flask cleanup-uploads` dọn file không được commit """
+    db.session.execute(text("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            upload_id UUID PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES users (user_id),
+            upload_kind VARCHAR(10) NOT NULL,
+            upload_blob_name VARCHAR(255) NOT NULL UNIQUE,
+            upload_status VARCHAR(20) DEFAULT 'pending',
+            upload_created_at TIMESTAMP
+        )
+    """))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_uploads_created ON uploads (upload_created_at)"))
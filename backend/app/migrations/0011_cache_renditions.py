@@ -0,0 +1,7 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Ảnh thu nhỏ của kết quả được lưu cùng mục cache: cache hit gắn lại thay vì xoá image_renditions["restored"] """
+    db.session.execute(text("ALTER TABLE inference_cache ADD COLUMN IF NOT EXISTS cache_renditions JSON"))
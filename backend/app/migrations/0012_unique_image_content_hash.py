@@ -0,0 +1,27 @@
+from sqlalchemy import text
+from backend.app.db import db
+
+
+def upgrade():
+    """ Mỗi user chỉ có một bản ghi Image cho một nội dung ảnh: index unique trên (user_id, image_content_hash).
+
+    Hai lần tải cùng ảnh chạy song song -> lần thứ hai vi phạm index (IntegrityError) và dùng lại bản ghi
+    của lần đầu. Bản trùng đã có từ trước được giữ lại nhưng bỏ hash (chỉ bản cũ nhất còn là đích khử trùng lặp);
+    index thường ix_images_user_content_hash (0004) thừa vì index unique phục vụ cùng truy vấn.
+    """
+    db.session.execute(text("""
+        UPDATE images SET image_content_hash = NULL
+        WHERE image_id IN (
+            SELECT image_id FROM (
+                SELECT image_id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, image_content_hash ORDER BY image_created_at, image_id
+                ) AS position
+                FROM images WHERE image_content_hash IS NOT NULL
+            ) AS ranked
+            WHERE position > 1
+        )
+    """))
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_images_user_content_hash ON images (user_id, image_content_hash)"
+    ))
+    db.session.execute(text("DROP INDEX IF EXISTS ix_images_user_content_hash"))
@@ -0,0 +1,53 @@
+import importlib
+import pkgutil
+from sqlalchemy import text
+from backend.app.db import db
+
+# 🔹 Khoá advisory để nhiều worker khởi động cùng lúc không chạy migration song song
+MIGRATION_LOCK_ID = 7219001
+
+
+def available_migrations():
+    """ Các file NNNN_ten.py trong thư mục này, sắp theo số phiên bản """
+    names = sorted(
+        module.name for module in pkgutil.iter_modules(__path__)
+        if module.name[:4].isdigit()
+    )
+    return [(name.split("_", 1)[0], importlib.import_module(f"{__name__}.{name}")) for name in names]
+
+
+def applied_versions():
+    db.session.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """))
+    return {row[0] for row in db.session.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations():
+    """ Chạy các migration chưa áp dụng, mỗi migration trong một giao dịch riêng """
+    db.session.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    try:
+        applied = applied_versions()
+        db.session.commit()
+
+        for version, module in available_migrations():
+            if version in applied:
+                continue
+            try:
+                module.upgrade()
+                db.session.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                    {"version": version, "name": module.__name__.rsplit(".", 1)[-1]}
+                )
+                db.session.commit()
+                print(f"✅ Đã áp dụng migration {module.__name__.rsplit('.', 1)[-1]}")
+            except Exception:
+                db.session.rollback()
+                raise
+    finally:
+        db.session.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        db.session.commit()
@@ -1,5 +1,7 @@
 from backend.app.db import db
 from flask_bcrypt import Bcrypt
+from sqlalchemy.orm import validates
+import hashlib
 from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, DECIMAL, UUID
 import uuid
 from datetime import datetime
@@ -21,6 +23,12 @@ class User(db.Model):
     user_avatar = db.Column(String(255), default="https://refinaimages-ehh5dse7h5f8g5ga.z02.azurefd.net/images/cn-logo-default-1.webp")
     reset_otp_code = db.Column(String(6), nullable=True)
     reset_otp_expiry = db.Column(DateTime, nullable=True)
+    user_credit_balance = db.Column(Integer, nullable=False, default=0, server_default='0')  # Số dư, cập nhật cùng credit_ledger
+
+    @property
+    def total_credits(self):
+        """ Số tín dụng hiển thị trên giao diện (đọc từ số dư, không cần SUM) """
+        return self.user_credit_balance or 0
 
     def set_password(self, password):
         self.user_password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
@@ -56,6 +64,8 @@ class UserPackage(db.Model):
     user_package_expired_at = db.Column(DateTime, nullable=True)
     user_package_updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_user_packages_user_id', user_id),)
+
 
 # ============================
 # ✅ Bảng Payments (Thanh toán)
@@ -76,12 +86,38 @@ class Image(db.Model):
     image_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False)
     image_original_url = db.Column(String(255), nullable=False)
+    image_original_url_hash = db.Column(String(32), nullable=True)  # MD5 của URL gốc, tự cập nhật khi gán URL
+    image_content_hash = db.Column(String(64), nullable=True)  # SHA-256 của ảnh đã chuẩn hoá
     image_restored_url = db.Column(String(255), nullable=True)
+    image_renditions = db.Column(db.JSON, nullable=True)  # Ảnh thu nhỏ: {"original": [...], "restored": [...]}
     image_status = db.Column(String(20), default='pending')
     image_credits_used = db.Column(Integer, default=2)  # ✅ Mỗi lần xử lý trừ 2 tín dụng
     image_created_at = db.Column(DateTime, default=datetime.utcnow)
     image_updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # ✅ Index cho thư viện ảnh (phân trang keyset), tra theo URL gốc và khử trùng lặp tải lên
+    __table_args__ = (
+        db.Index('ix_images_user_created', user_id, image_created_at.desc(), image_id.desc()),
+        db.Index('ix_images_user_url_hash', user_id, image_original_url_hash),
+        db.Index('ux_images_user_content_hash', user_id, image_content_hash, unique=True),
+    )
+
+    @staticmethod
+    def url_hash(url):
+        return hashlib.md5(url.encode("utf-8")).hexdigest()
+
+    @validates('image_original_url')
+    def _sync_url_hash(self, key, url):
+        self.image_original_url_hash = Image.url_hash(url) if url else None
+        return url
+
+    @classmethod
+    def find_by_url(cls, user_id, url):
+        """ Tra ảnh của user theo URL gốc qua index (user_id, hash URL) thay vì so chuỗi 255 ký tự """
+        return cls.query.filter_by(
+            user_id=user_id, image_original_url_hash=cls.url_hash(url), image_original_url=url
+        ).first()
+
 class Video(db.Model):
     __tablename__ = 'videos'
     video_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -92,3 +128,69 @@ class Video(db.Model):
     video_credits_used = db.Column(Integer, default=2)  # Mỗi lần xử lý trừ 2 tín dụng
     video_created_at = db.Column(DateTime, default=datetime.utcnow)
     video_updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_videos_user_created', user_id, video_created_at.desc(), video_id.desc()),)
+
+# ============================
+# ✅ Bảng Jobs (Tác vụ xử lý nền)
+# ============================
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    job_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False)
+    job_kind = db.Column(String(50), nullable=False)  # gfpgan.restore, esrgan.enhance, colorize.colorize...
+    job_status = db.Column(String(20), default='queued')  # queued, running, succeeded, failed
+    job_stage = db.Column(String(50), nullable=True)  # Bước đang chạy: predicting, downloading, uploading...
+    job_progress = db.Column(Integer, default=0)  # 0 - 100
+    job_result = db.Column(db.JSON, nullable=True)
+    job_error = db.Column(String(255), nullable=True)
+    job_created_at = db.Column(DateTime, default=datetime.utcnow)
+    job_updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_jobs_user_created', user_id, job_created_at.desc()),)
+
+# ============================
+# ✅ Bảng InferenceCache (Ghi nhớ kết quả model)
+# ============================
+class InferenceCache(db.Model):
+    __tablename__ = 'inference_cache'
+    cache_key = db.Column(String(64), primary_key=True)  # SHA-256 của (model, hash ảnh đầu vào, tham số)
+    cache_model = db.Column(String(255), nullable=False)
+    cache_output = db.Column(db.JSON, nullable=False)  # URL (hoặc danh sách URL) trên Azure
+    cache_renditions = db.Column(db.JSON, nullable=True)  # Ảnh thu nhỏ của output, gắn lại vào Image khi cache hit
+    cache_hits = db.Column(Integer, default=0)
+    cache_created_at = db.Column(DateTime, default=datetime.utcnow)
+    cache_last_hit_at = db.Column(DateTime, default=datetime.utcnow, index=True)
+
+# ============================
+# ✅ Bảng CreditLedger (Sổ cái tín dụng)
+# ============================
+class CreditLedger(db.Model):
+    __tablename__ = 'credit_ledger'
+    ledger_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False, index=True)
+    ledger_delta = db.Column(Integer, nullable=False)  # Âm khi giữ chỗ, dương khi mua gói
+    ledger_kind = db.Column(String(20), nullable=False)  # purchase, reserve
+    ledger_status = db.Column(String(20), default='pending')  # pending, settled, refunded
+    ledger_reference = db.Column(String(100), nullable=True, index=True)  # Tên tác vụ hoặc mã đơn PayPal
+    ledger_created_at = db.Column(DateTime, default=datetime.utcnow)
+    ledger_updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ux_credit_ledger_purchase_reference', ledger_reference, unique=True, postgresql_where=(ledger_kind == 'purchase')),
+        db.Index('ix_credit_ledger_pending_created', ledger_created_at, postgresql_where=(ledger_status == 'pending')),
+    )
+
+# ============================
+# ✅ Bảng Uploads (File tải thẳng lên kho lưu trữ qua URL SAS, chờ commit)
+# ============================
+class Upload(db.Model):
+    __tablename__ = 'uploads'
+    upload_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False)
+    upload_kind = db.Column(String(10), nullable=False)  # image, video
+    upload_blob_name = db.Column(String(255), unique=True, nullable=False)  # <user_id>/<uuid>.<đuôi>
+    upload_status = db.Column(String(20), default='pending')  # pending, committed, rejected
+    upload_created_at = db.Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_uploads_created', upload_created_at),)
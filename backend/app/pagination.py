@@ -0,0 +1,58 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from flask import request, current_app
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """ Cursor gửi lên không giải mã được """
+
+
+def encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        # id phải là UUID hợp lệ, nếu không Postgres báo DataError (500) khi so sánh
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (ValueError, TypeError, AttributeError, UnicodeError):
+        raise InvalidCursor(cursor)
+
+
+def page_limit():
+    """ Số dòng mỗi trang từ ?limit=, giới hạn bởi PAGE_SIZE_MAX """
+    try:
+        limit = int(request.args.get("limit", current_app.config["PAGE_SIZE_DEFAULT"]))
+    except ValueError:
+        limit = current_app.config["PAGE_SIZE_DEFAULT"]
+    return max(1, min(limit, current_app.config["PAGE_SIZE_MAX"]))
+
+
+def paginate(query, created_column, id_column):
+    """ Phân trang keyset theo (created_at, id) giảm dần, trả về (rows, next_cursor).
+
+    Mỗi trang chỉ quét đúng `limit` dòng từ index (user_id, created_at) thay vì
+    OFFSET, nên thời gian trả về không tăng theo số ảnh của user.
+    """
+    limit = page_limit()
+    cursor = request.args.get("cursor")
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_column, id_column) < tuple_(created_at, row_id))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+    return rows, next_cursor
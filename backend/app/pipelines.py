@@ -0,0 +1,180 @@
+import time
+import uuid
+from concurrent.futures import wait
+from flask import current_app
+from backend.app.db import db
+from backend.app.models import Image
+from backend.app.jobs import batch_executor, update_job
+from backend.app import inference
+from backend.app import result_cache
+from backend.app import derivatives
+from backend.app import credits
+from backend.app import storage
+
+# 🔹 Đầu vào của bước đầu tiên: ảnh gốc của Image
+SOURCE = "source"
+
+# 🔹 Các công cụ dùng được trong pipeline (model ảnh -> ảnh, model / tham số mặc định trong inference.MODELS)
+# options: tham số người dùng được phép đổi
+TOOLS = {
+    "gfpgan": {"options": (), "container": storage.CONTAINER_RESTORED, "prefix": "restored", "timeout": None},
+    "esrgan": {"options": ("scale", "face_enhance"), "container": storage.CONTAINER_ENHANCED, "prefix": "enhanced", "timeout": None},
+    "colorize": {"options": (), "container": storage.CONTAINER_COLORIZED, "prefix": "colorized", "timeout": 600},
+}
+
+
+class InvalidPipeline(ValueError):
+    """ Định nghĩa pipeline không hợp lệ (công cụ lạ, tham chiếu bước không tồn tại, quá nhiều bước...) """
+
+
+def parse_steps(raw_steps, max_steps):
+    """ Chuẩn hoá danh sách bước thành [{"id", "tool", "input", "params"}] theo thứ tự topo.
+
+    - Dạng rút gọn: ["gfpgan", "esrgan", "colorize"] -> chuỗi nối tiếp.
+    - Dạng đầy đủ: {"id", "tool", "input", "params"}; thiếu "input" thì lấy bước liền trước.
+    - "input" chỉ được trỏ tới SOURCE hoặc một bước đứng trước nên đồ thị luôn không có chu trình.
+    """
+    if not isinstance(raw_steps, list) or not raw_steps:
+        raise InvalidPipeline("Pipeline cần ít nhất một bước!")
+    if len(raw_steps) > max_steps:
+        raise InvalidPipeline(f"Pipeline tối đa {max_steps} bước!")
+
+    steps = []
+    seen = {SOURCE}
+    previous = SOURCE
+    for index, raw in enumerate(raw_steps):
+        if isinstance(raw, str):
+            raw = {"tool": raw}
+        if not isinstance(raw, dict):
+            raise InvalidPipeline(f"Bước {index + 1} không hợp lệ!")
+
+        tool = TOOLS.get(raw.get("tool"))
+        if tool is None:
+            raise InvalidPipeline(f"Công cụ không hỗ trợ: {raw.get('tool')}")
+
+        step_id = str(raw.get("id") or f"{raw['tool']}_{index + 1}")
+        if step_id in seen:
+            raise InvalidPipeline(f"Trùng id bước: {step_id}")
+
+        source = raw.get("input", previous)
+        if source not in seen:
+            raise InvalidPipeline(f"Bước {step_id} dùng đầu vào chưa có: {source}")
+
+        options = raw.get("params") or {}
+        unknown = set(options) - set(tool["options"])
+        if unknown:
+            raise InvalidPipeline(f"Tham số không hỗ trợ cho {raw['tool']}: {', '.join(sorted(unknown))}")
+
+        params = dict(inference.MODELS[raw["tool"]]["params"], **options)
+        if "scale" in options:
+            try:
+                params["scale"] = inference.parse_scale(options["scale"])
+            except ValueError:
+                raise InvalidPipeline(f"Bước {step_id}: scale phải là số nguyên từ 1 đến {inference.MAX_SCALE}!")
+
+        steps.append({"id": step_id, "tool": raw["tool"], "input": source, "params": params})
+        seen.add(step_id)
+        previous = step_id
+
+    return steps
+
+
+def sinks(steps):
+    """ Các bước không có bước nào dùng kết quả -> sản phẩm cuối cần lưu """
+    consumed = {step["input"] for step in steps}
+    return [step["id"] for step in steps if step["id"] not in consumed]
+
+
+# ✅ Tác vụ nền: chạy DAG theo từng tầng, kết quả trung gian chuyển thẳng bằng URL giữa các prediction
+def run_pipeline_job(job_id, image_id, steps, keep_intermediates, ledger_id):
+    app = current_app._get_current_object()
+    image = Image.query.get(image_id)
+    final_steps = sinks(steps)
+    persist = {step["id"] for step in steps} if keep_intermediates else set(final_steps)
+
+    # Mỗi bước: URL kết quả + khoá cache (khoá nối chuỗi theo đầu vào nên bước sau cũng ghi nhớ được)
+    urls = {SOURCE: image.image_original_url}
+    keys = {SOURCE: result_cache.input_hash(image)}
+    # Hạn chót chung cho mọi bước: bước nào còn chạy khi hết hạn thì prediction của nó bị huỷ
+    deadline = time.monotonic() + app.config["PIPELINE_TIMEOUT"]
+
+    try:
+        remaining = list(steps)
+        # Pool dùng chung với /gfpgan/batch (jobs.batch_executor): BATCH_CONCURRENCY giới hạn cả tiến trình
+        executor = batch_executor()
+        while remaining:
+            # Tầng hiện tại: mọi bước đã có đầu vào, các nhánh độc lập chạy song song
+            ready = [step for step in remaining if step["input"] in urls]
+            remaining = [step for step in remaining if step["input"] not in urls]
+            update_job(job_id, "+".join(step["id"] for step in ready), 5 + 85 * (len(steps) - len(remaining) - len(ready)) // len(steps))
+
+            futures = [
+                executor.submit(
+                    _run_step_in_context, app, step, urls[step["input"]], keys[step["input"]], step["id"] in persist, deadline
+                )
+                for step in ready
+            ]
+            try:
+                for step, future in zip(ready, futures):
+                    urls[step["id"]], keys[step["id"]] = future.result()
+            finally:
+                wait(futures)  # Bước lỗi: chờ các nhánh còn lại xong rồi mới hoàn tín dụng
+    except Exception:
+        image.image_status = "failed"
+        db.session.commit()
+        credits.refund(ledger_id)
+        raise
+
+    # ✅ Chỉ sản phẩm cuối thay ảnh kết quả của Image (một lần, không ghi đè sau mỗi bước)
+    final_url = urls[final_steps[-1]]
+    update_job(job_id, "thumbnails", 90)
+    renditions = derivatives.generate_for_url(final_url)
+
+    image.image_restored_url = final_url
+    image.image_status = "completed"
+    derivatives.attach(image, "restored", renditions)
+    db.session.commit()
+    credits.settle(ledger_id)
+
+    return {
+        "final_url": final_url,
+        "outputs": {step_id: urls[step_id] for step_id in urls if step_id in persist}
+    }
+
+
+def _run_step_in_context(app, step, input_url, input_key, persist, deadline):
+    """ Mỗi luồng dùng app context và phiên DB riêng """
+    with app.app_context():
+        try:
+            return run_step(step, input_url, input_key, persist, deadline)
+        finally:
+            db.session.remove()
+
+
+def run_step(step, input_url, input_key, persist, deadline=None):
+    """ Chạy một bước, trả về (URL kết quả, khoá cache).
+
+    Bước cần lưu: stream vào kho lưu trữ và ghi nhớ; bước trung gian: trả thẳng URL của Replicate
+    cho bước sau, không tải về / tải lên.
+    """
+    tool = TOOLS[step["tool"]]
+    model = inference.MODELS[step["tool"]]["replicate"]
+    cache_key = result_cache.make_key(model, input_key, step["params"])
+
+    # Chỉ kết quả đã lưu vào kho lưu trữ mới được ghi nhớ nên cache hit luôn là URL bền vững
+    cached_url = result_cache.get(model, cache_key)
+    if cached_url:
+        return cached_url, cache_key
+
+    output_url = inference.run_replicate(step["tool"], input_url, step["params"], timeout=tool["timeout"], deadline=deadline)
+    if not output_url:
+        raise RuntimeError(f"Bước {step['id']} không trả về ảnh kết quả!")
+
+    if not persist:
+        return output_url, cache_key
+
+    blob_name = f"{tool['prefix']}_{uuid.uuid4()}.jpg"
+    stored_url = storage.upload_from_url(tool["container"], blob_name, output_url)
+    result_cache.put(model, cache_key, stored_url)
+
+    return stored_url, cache_key
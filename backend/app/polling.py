@@ -0,0 +1,62 @@
+import random
+import time
+
+
+class DeadlineExceeded(Exception):
+    """ Hết hạn chót mà điều kiện chờ vẫn chưa thoả """
+
+
+class Backoff:
+    """ Khoảng chờ tăng theo cấp số nhân (initial, initial * factor, ... tối đa maximum) với "full jitter":
+    mỗi lần chờ một giá trị ngẫu nhiên trong [delay / 2, delay] để các worker không hỏi cùng lúc.
+    """
+
+    def __init__(self, initial, maximum, factor=2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self._delay = initial
+
+    def next_delay(self):
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.maximum)
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self._delay = self.initial
+
+
+def deadline_after(timeout, deadline=None):
+    """ Hạn chót (time.monotonic) sau `timeout` giây, không vượt quá `deadline` được truyền từ phía gọi """
+    own = time.monotonic() + timeout
+    return own if deadline is None else min(own, deadline)
+
+
+def remaining(deadline):
+    return max(0.0, deadline - time.monotonic())
+
+
+def poll(fetch, is_done, deadline, initial, maximum, wait=time.sleep, retry_on=()):
+    """ Chờ (backoff) rồi gọi `fetch()` cho tới khi `is_done(kết quả)`, trả về kết quả đó.
+
+    - Không bao giờ chờ quá hạn chót: hết hạn -> DeadlineExceeded.
+    - `wait(giây)` mặc định là time.sleep; truyền Event.wait để được đánh thức sớm (webhook).
+    - Lỗi thuộc `retry_on` (VD lỗi mạng / 5xx) được coi như "chưa xong" và hỏi lại sau lần chờ kế tiếp.
+    """
+    backoff = Backoff(initial, maximum)
+
+    while True:
+        seconds_left = remaining(deadline)
+        if seconds_left <= 0:
+            raise DeadlineExceeded()
+
+        wait(min(backoff.next_delay(), seconds_left))
+
+        try:
+            result = fetch()
+        except retry_on as e:
+            print(f"⚠️ Lỗi tạm thời khi hỏi trạng thái, thử lại sau: {e}")
+            continue
+
+        if is_done(result):
+            return result
@@ -0,0 +1,235 @@
+import json
+import select
+import threading
+import time
+import requests
+from backend.app import http_client
+from backend.app import polling
+from flask import current_app
+from sqlalchemy import text
+from backend.app.db import db
+
+# 🔹 Kênh Postgres dùng để báo prediction đã xong cho mọi worker process
+NOTIFY_CHANNEL = "replicate_predictions"
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+
+# prediction_id -> {"event": Event, "data": dict | None}
+_waiters = {}
+# Webhook đến trước khi kịp đăng ký chờ: prediction_id -> (thời điểm, data)
+_early = {}
+_lock = threading.Lock()
+_listener = None
+
+
+class PredictionError(Exception):
+    """ Prediction thất bại, bị huỷ hoặc quá thời gian chờ """
+
+
+def _headers():
+    return {
+        "Authorization": f"Bearer {current_app.config['REPLICATE_API_TOKEN']}",
+        "Content-Type": "application/json"
+    }
+
+
+def webhooks_enabled():
+    """ Chỉ dùng webhook khi có cả URL lẫn secret: webhook không ký thì ai cũng giả được kết quả prediction """
+    return bool(current_app.config.get("REPLICATE_WEBHOOK_URL") and current_app.config.get("REPLICATE_WEBHOOK_SECRET"))
+
+
+def create_prediction(model, input):
+    """ Tạo prediction qua REST API. `model` là "owner/name:version" hoặc "owner/name" """
+    api_url = current_app.config["REPLICATE_API_URL"]
+    payload = {"input": input}
+
+    if ":" in model:
+        payload["version"] = model.split(":", 1)[1]
+        url = f"{api_url}/predictions"
+    else:
+        url = f"{api_url}/models/{model}/predictions"
+
+    # ✅ Replicate gọi lại webhook khi xong, không cần hỏi liên tục
+    if webhooks_enabled():
+        payload["webhook"] = current_app.config["REPLICATE_WEBHOOK_URL"]
+        payload["webhook_events_filter"] = ["completed"]
+
+    response = http_client.post(url, headers=_headers(), json=payload, timeout=30)
+    if response.status_code not in (200, 201):
+        raise PredictionError(f"Replicate trả về {response.status_code}: {response.text[:200]}")
+
+    return response.json()
+
+
+def get_prediction(prediction):
+    response = http_client.get(prediction["urls"]["get"], headers=_headers(), timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def cancel_prediction(prediction):
+    """ Huỷ prediction không còn ai chờ để Replicate ngừng tính tiền (lỗi chỉ ghi log) """
+    url = (prediction.get("urls") or {}).get("cancel") or f"{current_app.config['REPLICATE_API_URL']}/predictions/{prediction['id']}/cancel"
+    try:
+        http_client.post(url, headers=_headers(), timeout=10).raise_for_status()
+    except Exception as e:
+        print(f"⚠️ Không huỷ được prediction {prediction['id']}: {e}")
+
+
+def _is_terminal(data):
+    return data["status"] in TERMINAL_STATUSES
+
+
+def wait_for_prediction(prediction, timeout, deadline=None):
+    """ Chờ prediction kết thúc; ưu tiên webhook, chỉ hỏi Replicate khi cần (khoảng chờ tăng dần, có jitter).
+
+    Hạn chót là `timeout` giây nhưng không vượt `deadline` (time.monotonic) của phía gọi; hết hạn thì
+    huỷ prediction trên Replicate rồi báo PredictionError.
+    """
+    if _is_terminal(prediction):
+        return prediction
+
+    deadline = polling.deadline_after(timeout, deadline)
+    config = current_app.config
+
+    try:
+        if not webhooks_enabled():
+            # 🔹 Chưa cấu hình webhook (hoặc thiếu secret): hỏi Replicate, lỗi mạng / 5xx thì đợi lâu hơn rồi hỏi lại
+            return polling.poll(
+                lambda: get_prediction(prediction), _is_terminal, deadline,
+                config["REPLICATE_POLL_INTERVAL"], config["REPLICATE_POLL_MAX_INTERVAL"],
+                retry_on=(requests.RequestException,)
+            )
+        return _wait_for_webhook(prediction, deadline)
+    except polling.DeadlineExceeded:
+        cancel_prediction(prediction)
+        raise PredictionError("Quá thời gian chờ kết quả từ Replicate!")
+
+
+def _wait_for_webhook(prediction, deadline):
+    _ensure_listener(current_app._get_current_object())
+    prediction_id = prediction["id"]
+    waiter = _register(prediction_id)
+    recheck = current_app.config["REPLICATE_WEBHOOK_RECHECK"]
+
+    def wait(seconds):
+        # Webhook tới -> dậy ngay; xoá cờ để lần lấy lại (nếu lỗi) vẫn phải chờ backoff
+        if waiter["event"].wait(seconds):
+            waiter["event"].clear()
+
+    def fetch():
+        data = waiter["data"]
+        # Payload NOTIFY bị cắt bớt thì lấy bản đầy đủ; chưa có webhook (có thể bị mất) thì tự hỏi Replicate
+        if data is None or "output" not in data:
+            data = get_prediction(prediction)
+        return data
+
+    try:
+        return polling.poll(fetch, _is_terminal, deadline, recheck, recheck, wait=wait, retry_on=(requests.RequestException,))
+    finally:
+        with _lock:
+            _waiters.pop(prediction_id, None)
+
+
+def run(model, input, timeout=None, deadline=None):
+    """ Tạo prediction, chờ xong và trả về `output` (thay cho `replicate.run`).
+
+    `deadline` (time.monotonic): hạn chót chung của cả tác vụ, VD pipeline nhiều bước.
+    """
+    if timeout is None:
+        timeout = current_app.config["REPLICATE_TIMEOUT"]
+
+    prediction = wait_for_prediction(create_prediction(model, input), timeout, deadline)
+
+    if prediction["status"] != "succeeded":
+        raise PredictionError(prediction.get("error") or f"Prediction {prediction['status']}")
+
+    return prediction["output"]
+
+
+def first_output(output):
+    """ Một số model trả về danh sách URL, số khác trả về một URL """
+    if isinstance(output, list):
+        return output[0] if output else None
+    return output
+
+
+# ============================
+# ✅ Nhận kết quả từ webhook
+# ============================
+def _register(prediction_id):
+    with _lock:
+        waiter = {"event": threading.Event(), "data": None}
+        _waiters[prediction_id] = waiter
+
+        early = _early.pop(prediction_id, None)
+        if early:
+            waiter["data"] = early[1]
+            waiter["event"].set()
+
+    return waiter
+
+
+def deliver(data):
+    """ Đánh thức luồng đang chờ prediction trong process hiện tại """
+    prediction_id = data.get("id")
+    if not prediction_id or data.get("status") not in TERMINAL_STATUSES:
+        return
+
+    with _lock:
+        waiter = _waiters.get(prediction_id)
+        if waiter:
+            waiter["data"] = data
+            waiter["event"].set()
+        else:
+            now = time.monotonic()
+            _early[prediction_id] = (now, data)
+            # Dọn các kết quả không ai nhận sau 10 phút
+            for key, (created, _) in list(_early.items()):
+                if now - created > 600:
+                    del _early[key]
+
+
+def publish(data):
+    """ Phát kết quả tới mọi worker process qua Postgres NOTIFY """
+    message = {key: data.get(key) for key in ("id", "status", "output", "error")}
+    payload = json.dumps(message)
+    if len(payload) > 7900:  # Giới hạn payload NOTIFY là 8000 byte
+        payload = json.dumps({"id": data.get("id"), "status": data.get("status")})
+
+    db.session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+    db.session.commit()
+
+
+def _ensure_listener(app):
+    global _listener
+
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, args=(app,), name="replicate-listener", daemon=True)
+            _listener.start()
+
+
+def _listen(app):
+    backoff = polling.Backoff(1, 60)  # Postgres mất kết nối lâu thì thử lại thưa dần
+
+    while True:
+        try:
+            with app.app_context():
+                connection = db.engine.raw_connection()
+            raw = connection.driver_connection
+            raw.set_isolation_level(0)  # autocommit để nhận NOTIFY
+
+            cursor = raw.cursor()
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            backoff.reset()
+
+            while True:
+                if select.select([raw], [], [], 30) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    deliver(json.loads(notify.payload))
+        except Exception as e:
+            print("❌ Lỗi kết nối LISTEN Replicate:", str(e))
+            time.sleep(backoff.next_delay())
@@ -0,0 +1,62 @@
+import json
+import uuid
+from sqlalchemy import text
+from backend.app.db import db
+
+# 🔹 Các truy vấn chạy trên mọi request / mọi trang thư viện, không được quét toàn bảng
+_SAMPLE = {"user_id": str(uuid.uuid4()), "created_at": "2100-01-01", "row_id": str(uuid.uuid4())}
+
+HOT_QUERIES = {
+    "images.gallery_page": """
+        SELECT * FROM images
+        WHERE user_id = CAST(:user_id AS uuid)
+          AND (image_created_at, image_id) < (CAST(:created_at AS timestamp), CAST(:row_id AS uuid))
+        ORDER BY image_created_at DESC, image_id DESC LIMIT 25
+    """,
+    "videos.gallery_page": """
+        SELECT * FROM videos
+        WHERE user_id = CAST(:user_id AS uuid)
+        ORDER BY video_created_at DESC, video_id DESC LIMIT 25
+    """,
+    "user_packages.by_user": "SELECT * FROM user_packages WHERE user_id = CAST(:user_id AS uuid)",
+    "images.by_original_url": """
+        SELECT * FROM images
+        WHERE user_id = CAST(:user_id AS uuid) AND image_original_url_hash = md5('https://example/x.jpg')
+          AND image_original_url = 'https://example/x.jpg'
+    """,
+    "images.dedupe_upload": """
+        SELECT * FROM images WHERE user_id = CAST(:user_id AS uuid) AND image_content_hash = 'x' LIMIT 1
+    """,
+    "credit_ledger.purchase_replay": """
+        SELECT * FROM credit_ledger WHERE ledger_kind = 'purchase' AND ledger_reference = 'x' LIMIT 1
+    """,
+}
+
+
+def _seq_scans(plan):
+    """ Tên các bảng bị Seq Scan trong cây kế hoạch EXPLAIN (FORMAT JSON) """
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def check_query_plans():
+    """ Trả về {tên truy vấn: [bảng bị Seq Scan]} cho các truy vấn thiếu index.
+
+    Tắt enable_seqscan để planner chọn index bất kể bảng đang nhỏ; nếu vẫn ra
+    Seq Scan nghĩa là không có index nào dùng được cho truy vấn đó.
+    """
+    failures = {}
+    for name, sql in HOT_QUERIES.items():
+        db.session.execute(text("SET LOCAL enable_seqscan = off"))
+        raw = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), _SAMPLE).scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+        db.session.rollback()
+
+        tables = _seq_scans(plan)
+        if tables:
+            failures[name] = tables
+    return failures
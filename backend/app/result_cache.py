@@ -0,0 +1,170 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from backend.app.db import db
+from backend.app.models import InferenceCache
+from backend.app import derivatives
+
+# 🔹 Đếm hit/miss theo model trong process hiện tại (xem ở /admin/metrics)
+_counters = {}
+_puts = 0  # Số lần put() từ lần dọn bảng gần nhất
+_lock = threading.Lock()
+
+
+def _normalize(value):
+    """ Chuẩn hoá tham số để 2 và 2.0, "true" và True... cho cùng một khoá """
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ("true", "false"):
+            return lowered == "true"
+        try:
+            return _normalize(float(lowered))
+        except ValueError:
+            return value.strip()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def parse_flag(value):
+    """ Cờ bật/tắt từ JSON request (vd. `deterministic`): True/"true"/"1"/1 -> True, False/"false"/"0"/0/None -> False,
+    giá trị khác -> ValueError (không dùng bool(): "false" và "0" sẽ thành True)
+    """
+    if value is None or value is False or value is True:
+        return bool(value)
+    if isinstance(value, int) and value in (0, 1):
+        return value == 1
+    if isinstance(value, str) and value.strip().lower() in ("true", "1", "false", "0"):
+        return value.strip().lower() in ("true", "1")
+    raise ValueError(f"Giá trị bật/tắt không hợp lệ: {value!r}")
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def input_hash(image, url=None):
+    """ Hash nội dung ảnh nếu có, nếu không thì hash URL (URL trên Azure là bất biến) """
+    if image is not None and image.image_content_hash and not url:
+        return image.image_content_hash
+    return hash_text(url or image.image_original_url)
+
+
+def make_key(model, input_digest, params):
+    """ `model` là engine đã chạy (phiên bản Replicate hoặc model ONNX, xem inference.engines) """
+    payload = json.dumps([model, input_digest, _normalize(params or {})], sort_keys=True, separators=(",", ":"))
+    return hash_text(payload)
+
+
+def _count(model, field):
+    with _lock:
+        counter = _counters.setdefault(model.split(":")[0], {"hits": 0, "misses": 0})
+        counter[field] += 1
+
+
+def get(model, key):
+    """ Trả về output đã lưu hoặc None nếu chưa có / đã hết hạn """
+    entry = lookup(model, key)
+    return entry.cache_output if entry else None
+
+
+def lookup(model, key):
+    """ Như get() nhưng trả về cả mục cache (output + ảnh thu nhỏ), None nếu chưa có / đã hết hạn """
+    entry = InferenceCache.query.get(key)
+    now = datetime.utcnow()
+
+    if entry and entry.cache_created_at < now - timedelta(seconds=current_app.config["RESULT_CACHE_TTL"]):
+        db.session.delete(entry)
+        db.session.commit()
+        entry = None
+
+    if not entry:
+        _count(model, "misses")
+        return None
+
+    entry.cache_hits = (entry.cache_hits or 0) + 1
+    entry.cache_last_hit_at = now
+    db.session.commit()
+    _count(model, "hits")
+
+    return entry
+
+
+def find(engines, input_digest, params):
+    """ Mục cache của engine đầu tiên có kết quả (thứ tự như inference.engines), không có -> None """
+    for engine in engines:
+        entry = lookup(engine, make_key(engine, input_digest, params))
+        if entry:
+            return entry
+    return None
+
+
+def renditions(entry):
+    """ Ảnh thu nhỏ lưu cùng kết quả để gắn lại khi cache hit; mục cũ (hoặc do pipeline ghi) chưa có thì tạo một lần """
+    if entry.cache_renditions is None:
+        entry.cache_renditions = derivatives.generate_for_url(entry.cache_output)
+        db.session.commit()
+    return entry.cache_renditions
+
+
+def put(model, key, output, renditions=None):
+    """ Ghi kết quả vào cache (upsert theo cache_key, hai lần miss cùng khoá không đụng khoá chính).
+    Lỗi ghi cache chỉ được ghi log: tác vụ gọi put() đã lưu kết quả nên không được thất bại vì cache.
+    """
+    global _puts
+    now = datetime.utcnow()
+    statement = insert(InferenceCache).values(
+        cache_key=key, cache_model=model, cache_output=output, cache_renditions=renditions,
+        cache_hits=0, cache_created_at=now, cache_last_hit_at=now,
+    ).on_conflict_do_update(
+        index_elements=[InferenceCache.cache_key],
+        set_={"cache_output": output, "cache_renditions": renditions, "cache_created_at": now},
+    )
+    try:
+        db.session.execute(statement)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"⚠️ Không ghi được cache cho {model}: {e}")
+        return
+
+    # ✅ Dọn bảng mỗi RESULT_CACHE_EVICT_EVERY lần ghi thay vì COUNT(*) ở mọi lần
+    with _lock:
+        _puts += 1
+        due = _puts >= current_app.config["RESULT_CACHE_EVICT_EVERY"]
+        if due:
+            _puts = 0
+    if due:
+        try:
+            _evict()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"⚠️ Không dọn được bảng cache: {e}")
+
+
+def _evict():
+    """ Giữ bảng trong giới hạn kích thước: xoá các mục lâu không được dùng nhất """
+    overflow = InferenceCache.query.count() - current_app.config["RESULT_CACHE_MAX_ENTRIES"]
+    if overflow <= 0:
+        return
+
+    stale_keys = [
+        key for (key,) in db.session.query(InferenceCache.cache_key).order_by(
+            InferenceCache.cache_last_hit_at.asc()
+        ).limit(overflow)
+    ]
+    InferenceCache.query.filter(InferenceCache.cache_key.in_(stale_keys)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def stats():
+    with _lock:
+        return {model: dict(counter) for model, counter in _counters.items()}
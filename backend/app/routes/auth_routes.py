@@ -4,10 +4,10 @@ from backend.app.db import db
 from backend.app.models import User
 from flask_jwt_extended import create_access_token, jwt_required, unset_jwt_cookies, set_access_cookies, get_jwt_identity, get_jwt
 from datetime import timedelta
-import requests
+from backend.app import http_client
+from backend.app.current_user import user_claims
 import os
 import random
-from azure.communication.email import EmailClient
 from datetime import datetime, timedelta
 
 auth_blueprint = Blueprint('auth', __name__)
@@ -41,7 +41,7 @@ def login():
         access_token = create_access_token(
             identity=user.user_id,
             expires_delta=timedelta(hours=1),
-            additional_claims={"role": user.user_role}
+            additional_claims=user_claims(user)
         )
         response = make_response(redirect(url_for('main.home')))
         set_access_cookies(response, access_token)
@@ -98,7 +98,7 @@ def microsoft_callback():
     }
     
     # Lấy token từ Microsoft
-    response = requests.post(MICROSOFT_TOKEN_URL, data=token_data)
+    response = http_client.post(MICROSOFT_TOKEN_URL, data=token_data)
     token_json = response.json()
     print("Token JSON:", token_json)  # ✅ Debug token
 
@@ -111,14 +111,14 @@ def microsoft_callback():
     headers = {"Authorization": f"Bearer {access_token}"}
 
     # Lấy thông tin người dùng
-    user_info_response = requests.get("https://graph.microsoft.com/v1.0/me", headers=headers)
+    user_info_response = http_client.get("https://graph.microsoft.com/v1.0/me", headers=headers)
     user_info = user_info_response.json()
     print("User Info:", user_info)  # ✅ Debug thông tin user
 
     # Thử lấy avatar từ Microsoft Graph API
     avatar_url = "https://refinaimages-ehh5dse7h5f8g5ga.z02.azurefd.net/images/cn-logo-default-1.webp"
     try:
-        avatar_response = requests.get("https://graph.microsoft.com/v1.0/me/photo/$value", headers=headers)
+        avatar_response = http_client.get("https://graph.microsoft.com/v1.0/me/photo/$value", headers=headers)
         print(f"Avatar Response Status: {avatar_response.status_code}")  # ✅ Debug mã trạng thái
         if avatar_response.status_code == 200:
             from base64 import b64encode
@@ -150,11 +150,11 @@ def microsoft_callback():
 
     # Đăng nhập thành công
     if existing_user:
-        user_id = existing_user.user_id
+        user = existing_user
     else:
-        user_id = new_user.user_id  # Nếu mới tạo thì lấy user_id của new_user
+        user = new_user  # Nếu mới tạo thì lấy user_id của new_user
 
-    jwt_token = create_access_token(identity=str(user_id), additional_claims={"role": "user"})
+    jwt_token = create_access_token(identity=str(user.user_id), additional_claims=dict(user_claims(user), role="user"))
     response = make_response(redirect(url_for('main.home')))
     set_access_cookies(response, jwt_token)
     flash("Đăng nhập thành công với Microsoft!")
@@ -166,6 +166,8 @@ def microsoft_callback():
 
 # Hàm gửi OTP qua Email
 def send_otp_email(email, otp_code):
+    from azure.communication.email import EmailClient  # SDK nặng, chỉ nạp khi thật sự gửi mail
+
     connection_string = os.getenv("AZURE_EMAIL_CONNECTION_STRING")
     client = EmailClient.from_connection_string(connection_string)
 
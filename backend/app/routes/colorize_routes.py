@@ -1,21 +1,24 @@
 from flask import Blueprint, request, jsonify, render_template
 from backend.app.db import db
-from backend.app.models import User, Image, UserPackage
+from backend.app.models import User, Image
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
 import os
 import uuid
-import requests
-import replicate
-from sqlalchemy.sql import func
-import time
 from flask_cors import CORS
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME_ORIGINAL = "user-uploads"  # 📌 Ảnh gốc tải lên
-CONTAINER_NAME_PROCESSED = "color-image"  # 📌 Ảnh sau khi tô màu
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from backend.app.jobs import submit_job, update_job, JobQueueFull
+from backend.app import predictions
+from backend.app import inference
+from backend.app.uploads import store_image_upload
+from backend.app.ingest import ingest_image
+from backend.app import result_cache
+from backend.app import derivatives
+from backend.app import credits
+from backend.app import storage
+from backend.app.pagination import paginate
+
+# 🔹 Model DeOldify trên Replicate (phiên bản cố định khai báo trong inference.MODELS)
+DEOLDIFY_MODEL = inference.MODELS["colorize"]["replicate"]
+DEOLDIFY_PARAMS = inference.MODELS["colorize"]["params"]
 
 # 🔹 API Token của Replicate
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
@@ -37,19 +40,8 @@ def upload_image():
     if not file:
         return jsonify({"error": "Không có file nào được tải lên!"}), 400
 
-    # ✅ Tạo tên file ngẫu nhiên
-    blob_name = f"{uuid.uuid4()}.jpg"
-
-    # ✅ Upload ảnh lên Azure Storage
-    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_ORIGINAL, blob=blob_name)
-    blob_client.upload_blob(file.read(), overwrite=True)
-
-    image_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_ORIGINAL}/{blob_name}"
-
-    # ✅ Lưu vào database
-    new_image = Image(user_id=user_id, image_original_url=image_url)
-    db.session.add(new_image)
-    db.session.commit()
+    # ✅ Chuẩn hoá ảnh (xoay EXIF, thu nhỏ) rồi lưu theo hash nội dung
+    new_image, image_url = store_image_upload(user_id, ingest_image(file.read()))
 
     return jsonify({"message": "Ảnh đã tải lên thành công!", "image_id": str(new_image.image_id), "image_url": image_url})
 
@@ -59,72 +51,84 @@ def upload_image():
 @jwt_required()
 def colorize_image():
     data = request.json
-    image_url = data.get("image_url")
+    image_id = data.get("image_id")
+    image_url = data.get("image_url")  # Client cũ chỉ gửi URL
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
 
-    if not user or not image_url:
-        return jsonify({"error": "Thiếu thông tin người dùng hoặc URL ảnh!"}), 400
+    if not user or not (image_id or image_url):
+        return jsonify({"error": "Thiếu thông tin người dùng hoặc ảnh!"}), 400
 
-    # ✅ Kiểm tra tín dụng người dùng
-    total_credits = db.session.query(
-        func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-    ).filter(UserPackage.user_id == user.user_id).scalar()
+    # ✅ Xác định ảnh theo khoá chính (hoặc hash URL cho client cũ), chỉ trong ảnh của user này
+    if image_id:
+        image = Image.query.filter_by(image_id=image_id, user_id=user.user_id).first()
+        if not image:
+            return jsonify({"error": "Ảnh không hợp lệ!"}), 400
+        image_url = image.image_original_url
+    else:
+        image = Image.find_by_url(user.user_id, image_url)
 
-    if total_credits < 2:
+    # ✅ Giữ chỗ tín dụng (kiểm tra và trừ trong cùng một câu lệnh)
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN, "colorize.colorize")
+    except credits.InsufficientCredits:
         return jsonify({"error": "Bạn không đủ tín dụng để tô màu ảnh!"}), 403
 
-    # ✅ Gửi ảnh đến API Replicate
-    try:
-        output_image_url = replicate.run(
-            "arielreplicate/deoldify_image:0da600fab0c45a66211339f1c16b71345d22f26ef5fea3dca1bb90bb5711e950",
-            input={
-                "model_name": "Artistic",
-                "input_image": image_url,
-                "render_factor": 35
-            }
+    with credits.refund_on_error(ledger_id):
+        # ✅ Ảnh này đã được tô màu với cùng tham số -> trả kết quả đã lưu ngay
+        cache_key = result_cache.make_key(DEOLDIFY_MODEL, result_cache.input_hash(image, url=None if image else image_url), DEOLDIFY_PARAMS)
+        cached = result_cache.lookup(DEOLDIFY_MODEL, cache_key)
+        if cached:
+            save_colorized_result(image.image_id if image else None, cached.cache_output, ledger_id, result_cache.renditions(cached) if image else None)
+            return jsonify({"message": "Ảnh đã tô màu thành công!", "processed_image_url": cached.cache_output, "cached": True})
+
+        # ✅ Đưa vào hàng đợi, trả về job_id ngay thay vì giữ worker chờ Replicate
+        try:
+            job = submit_job(user.user_id, "colorize.colorize", run_colorize_job, image.image_id if image else None, image_url, ledger_id, cache_key)
+        except JobQueueFull:
+            credits.refund(ledger_id)
+            return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại sau!"}), 503
+
+        return jsonify({"message": "Ảnh đang được tô màu!", "job_id": str(job.job_id), "status_url": f"/jobs/{job.job_id}"}), 202
+
+
+# ✅ Tác vụ nền: Replicate -> chờ ảnh kết quả -> upload Azure -> chốt 2 tín dụng
+def run_colorize_job(job_id, image_id, image_url, ledger_id, cache_key):
+    with credits.refund_on_error(ledger_id):
+        update_job(job_id, "predicting", 10)
+        # ✅ Chờ webhook của Replicate (tối đa 10 phút) thay vì hỏi liên tục
+        output_image_url = predictions.run(
+            DEOLDIFY_MODEL,
+            input=dict(DEOLDIFY_PARAMS, input_image=image_url),
+            timeout=600
         )
 
         if not output_image_url:
-            return jsonify({"error": "Không thể tô màu ảnh!"}), 500
+            raise RuntimeError("Không thể tô màu ảnh!")
 
-    except Exception as e:
-        return jsonify({"error": f"Lỗi khi kết nối đến Replicate: {str(e)}"}), 500
+        # ✅ Prediction đã xong nên ảnh kết quả sẵn sàng, stream thẳng vào kho lưu trữ
+        update_job(job_id, "transferring", 60)
+        processed_url = storage.upload_from_url(storage.CONTAINER_COLORIZED, f"colorized_{uuid.uuid4()}.jpg", output_image_url)
 
-    # ✅ Tăng thời gian chờ tối đa lên 10 phút (600 giây)
-    start_time = time.time()
-    while True:
-        if time.time() - start_time > 600:  # 10 phút
-            return jsonify({"error": "Quá thời gian chờ, vui lòng thử lại sau!"}), 500
+        update_job(job_id, "thumbnails", 90)
+        renditions = derivatives.generate_for_url(processed_url)
 
-        try:
-            response = requests.get(output_image_url, timeout=30, stream=True)
-            if response.status_code == 200:
-                image_data = response.content
-                break
-        except:
-            time.sleep(10)
-
-    # ✅ Upload ảnh đã tô màu lên Azure
-    blob_name = f"colorized_{uuid.uuid4()}.jpg"
-    processed_blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_PROCESSED, blob=blob_name)
-    processed_blob_client.upload_blob(image_data, overwrite=True)
-
-    processed_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_PROCESSED}/{blob_name}"
-
-    # ✅ Lưu vào database
-    image = Image.query.filter_by(image_original_url=image_url).first()
+        save_colorized_result(image_id, processed_url, ledger_id, renditions)
+        result_cache.put(DEOLDIFY_MODEL, cache_key, processed_url, renditions)
+
+    return {"processed_image_url": processed_url}
+
+
+def save_colorized_result(image_id, processed_url, ledger_id, renditions=None):
+    # ✅ Lưu vào database (cập nhật theo khoá chính)
+    image = Image.query.get(image_id) if image_id else None
     if image:
         image.image_restored_url = processed_url
+        derivatives.attach(image, "restored", renditions or [])
         db.session.commit()
 
-    # ✅ Trừ 2 tín dụng của người dùng
-    user_package = UserPackage.query.filter(UserPackage.user_id == user.user_id).first()
-    if user_package:
-        user_package.user_package_credits -= 2
-        db.session.commit()
-
-    return jsonify({"message": "Ảnh đã tô màu thành công!", "processed_image_url": processed_url})
+    # ✅ Chốt 2 tín dụng đã giữ chỗ
+    credits.settle(ledger_id)
 
 
 # ✅ **API: Lấy danh sách ảnh đã tô màu**
@@ -132,14 +136,15 @@ def colorize_image():
 @jwt_required()
 def get_user_images():
     user_id = get_jwt_identity()
-    images = Image.query.filter_by(user_id=user_id).all()
+    images, next_cursor = paginate(Image.query.filter_by(user_id=user_id), Image.image_created_at, Image.image_id)
 
     image_list = [{
         "original_url": img.image_original_url,
-        "processed_url": img.image_restored_url or ""
+        "processed_url": img.image_restored_url or "",
+        "thumbnails": img.image_renditions or {}
     } for img in images]
 
-    return jsonify({"images": image_list})
+    return jsonify({"images": image_list, "next_cursor": next_cursor})
 
 
 # ✅ **Trang hiển thị giao diện tô màu ảnh**
@@ -1,48 +1,20 @@
 from flask import Blueprint, request, jsonify, render_template
 from backend.app.db import db
-from backend.app.models import User, Image, UserPackage
+from backend.app.models import User, Image
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
-import os
 import uuid
-import requests
-import replicate
-from PIL import Image as PILImage
-from io import BytesIO
-from sqlalchemy.sql import func  # ✅ Import func để tính tổng tín dụng
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME_ORIGINAL = "user-uploads"
-CONTAINER_NAME_ENHANCED = "enhanced-images"
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from backend.app.jobs import submit_job, update_job, JobQueueFull
+from backend.app import inference
+from backend.app.uploads import store_image_upload
+from backend.app.ingest import ingest_image
+from backend.app import result_cache
+from backend.app import derivatives
+from backend.app import credits
+from backend.app import storage
+from backend.app.pagination import paginate
 
 esrgan_blueprint = Blueprint("esrgan", __name__)
 
-# 🔹 Resize ảnh trước khi upload (max 1024x1024)
-def resize_image(image_data):
-    image = PILImage.open(BytesIO(image_data))
-    
-    if image.mode == "RGBA":
-        image = image.convert("RGB")
-
-    max_size = 1024
-    width, height = image.size
-
-    if width > max_size or height > max_size:
-        if width > height:
-            new_width = max_size
-            new_height = int((max_size / width) * height)
-        else:
-            new_height = max_size
-            new_width = int((max_size / height) * width)
-
-        image = image.resize((new_width, new_height), PILImage.LANCZOS)
-
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG")  
-    return buffer.getvalue()
-
 
 # ✅ API: Tải ảnh lên Azure Storage
 @esrgan_blueprint.route("/upload", methods=["POST"])
@@ -58,22 +30,12 @@ def upload_image():
     if not file:
         return jsonify({"error": "Không có file nào được tải lên!"}), 400
 
-    # Resize ảnh
+    # ✅ Chuẩn hoá ảnh: xoay EXIF, thu nhỏ (draft JPEG), chặn ảnh quá lớn
     image_data = file.read()
-    resized_image_data = resize_image(image_data)
-
-    # Tạo tên file ngẫu nhiên
-    blob_name = f"{uuid.uuid4()}.jpg"
+    resized_image_data = ingest_image(image_data)
 
-    # Upload lên Azure Storage
-    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_ORIGINAL, blob=blob_name)
-    blob_client.upload_blob(resized_image_data, overwrite=True)
-
-    # Lưu URL vào database
-    image_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_ORIGINAL}/{blob_name}"
-    new_image = Image(user_id=user_id, image_original_url=image_url)
-    db.session.add(new_image)
-    db.session.commit()
+    # ✅ Lưu theo hash nội dung: ảnh đã tải trước đó sẽ dùng lại blob và bản ghi cũ
+    new_image, image_url = store_image_upload(user_id, resized_image_data)
 
     return jsonify({"message": "Ảnh đã tải lên thành công!", "image_id": str(new_image.image_id), "image_url": image_url})
 
@@ -84,8 +46,12 @@ def upload_image():
 def enhance_image():
     data = request.json
     image_id = data.get("image_id")
-    scale = data.get("scale", 2)  # Mặc định scale = 2
-    face_enhance = data.get("face_enhance", False)  
+    face_enhance = data.get("face_enhance", False)
+
+    try:
+        scale = inference.parse_scale(data.get("scale", 2))  # Mặc định scale = 2
+    except ValueError:
+        return jsonify({"error": f"scale phải là số nguyên từ 1 đến {inference.MAX_SCALE}!"}), 400
 
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -94,63 +60,78 @@ def enhance_image():
     if not user or not image:
         return jsonify({"error": "User hoặc ảnh không hợp lệ!"}), 400
 
-    # ✅ Kiểm tra tín dụng
-    total_credits = db.session.query(
-        func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-    ).filter(UserPackage.user_id == user.user_id).scalar()
-
-    if total_credits < 2:
+    # ✅ Giữ chỗ tín dụng (kiểm tra và trừ trong cùng một câu lệnh)
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN, "esrgan.enhance")
+    except credits.InsufficientCredits:
         return jsonify({"error": "Bạn không đủ tín dụng để nâng cấp ảnh!"}), 403
 
-    # ✅ Gửi ảnh đến API Replicate
-    try:
-        output_url = replicate.run(
-            "nightmareai/real-esrgan:f121d640bd286e1fdc67f9799164c1d5be36ff74576ee11c803ae5b665dd46aa",
-            input={
-                "image": image.image_original_url,
-                "scale": scale,
-                "face_enhance": face_enhance
-            }
-        )
+    with credits.refund_on_error(ledger_id):
+        # ✅ Cùng ảnh + cùng engine + cùng scale/face_enhance đã nâng cấp trước đó -> trả kết quả đã lưu ngay
+        params = {"scale": scale, "face_enhance": face_enhance}
+        input_digest = result_cache.input_hash(image)
+        cached = result_cache.find(inference.engines("esrgan", params), input_digest, params)
+        if cached:
+            image.image_restored_url = cached.cache_output
+            image.image_status = "completed"
+            derivatives.attach(image, "restored", result_cache.renditions(cached))
+            db.session.commit()
+            credits.settle(ledger_id)
+
+            return jsonify({"message": "Ảnh đã nâng cấp thành công!", "enhanced_url": cached.cache_output, "cached": True})
+
+        # ✅ Ghi "pending" trước khi đưa vào hàng đợi: tác vụ có thể xong (completed / failed) trước khi request này trả về
+        previous_status = image.image_status
+        image.image_status = "pending"
+        db.session.commit()
 
-        print(f"✅ Replicate Output URL: {output_url}")
+        # ✅ Đưa vào hàng đợi, trả về job_id ngay thay vì giữ worker chờ Replicate
+        try:
+            job = submit_job(user.user_id, "esrgan.enhance", run_enhance_job, image.image_id, ledger_id, scale, face_enhance, input_digest)
+        except JobQueueFull:
+            image.image_status = previous_status
+            db.session.commit()
+            credits.refund(ledger_id)
+            return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại sau!"}), 503
 
-        if not output_url:
-            return jsonify({"error": "Không thể lấy ảnh kết quả từ Replicate!"}), 500
+        return jsonify({"message": "Ảnh đang được nâng cấp!", "job_id": str(job.job_id), "status_url": f"/jobs/{job.job_id}"}), 202
 
-    except Exception as e:
-        print("❌ Lỗi khi gọi Replicate:", str(e))
-        return jsonify({"error": "Lỗi khi kết nối đến Replicate!"}), 500
 
-    # ✅ Tải ảnh từ URL trả về (output_url)
-    try:
-        response = requests.get(output_url, timeout=15, stream=True)
-        response.raise_for_status()
-        image_data = response.content
-    except Exception as e:
-        print("❌ Lỗi khi tải ảnh từ Replicate:", str(e))
-        return jsonify({"error": "Không thể tải ảnh từ Replicate!"}), 500
-
-    # ✅ Upload ảnh lên Azure Storage
-    blob_name = f"enhanced_{uuid.uuid4()}.jpg"
-    enhanced_blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_ENHANCED, blob=blob_name)
-    enhanced_blob_client.upload_blob(image_data, overwrite=True)
-
-    enhanced_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_ENHANCED}/{blob_name}"
-
-    # ✅ Lưu vào database
-    image.image_restored_url = enhanced_url
-    db.session.commit()
-
-    # ✅ Trừ tín dụng sau khi nâng cấp thành công
-    user_package = UserPackage.query.filter(
-        UserPackage.user_id == user.user_id
-    ).first()
-    if user_package:
-        user_package.user_package_credits -= 2
+# ✅ Tác vụ nền: Replicate -> tải ảnh kết quả -> upload Azure -> chốt 2 tín dụng
+def run_enhance_job(job_id, image_id, ledger_id, scale, face_enhance, input_digest):
+    image = Image.query.get(image_id)
+    params = {"scale": scale, "face_enhance": face_enhance}
+
+    with credits.refund_on_error(ledger_id):
+        try:
+            update_job(job_id, "predicting", 10)
+            # ✅ Replicate hoặc ONNX trên CPU của server (ảnh nhỏ, 2x) tuỳ INFERENCE_BACKEND
+            output, engine = inference.run("esrgan", image.image_original_url, params)
+
+            if not output:
+                raise RuntimeError("Không thể lấy ảnh kết quả từ Replicate!")
+
+            # ✅ Stream ảnh upscale từ URL trả về thẳng vào kho lưu trữ (không giữ cả file trong RAM), hoặc upload bytes từ model local
+            update_job(job_id, "transferring", 60)
+            enhanced_url = inference.store_output(output, storage.CONTAINER_ENHANCED, f"enhanced_{uuid.uuid4()}.jpg")
+        except Exception:
+            image.image_status = "failed"
+            db.session.commit()
+            raise
+
+        # ✅ Ảnh thu nhỏ cho thư viện (ảnh 2x/4x quá nặng để làm thumbnail)
+        update_job(job_id, "thumbnails", 90)
+        renditions = derivatives.generate_for_url(enhanced_url)
+
+        # ✅ Lưu vào database
+        image.image_restored_url = enhanced_url
+        image.image_status = "completed"
+        derivatives.attach(image, "restored", renditions)
         db.session.commit()
+        credits.settle(ledger_id)
+        result_cache.put(engine, result_cache.make_key(engine, input_digest, params), enhanced_url, renditions)
 
-    return jsonify({"message": "Ảnh đã nâng cấp thành công!", "enhanced_url": enhanced_url})
+    return {"enhanced_url": enhanced_url}
 
 
 # ✅ API: Lấy danh sách ảnh đã tải lên và đã nâng cấp
@@ -158,18 +139,19 @@ def enhance_image():
 @jwt_required()
 def list_images():
     user_id = get_jwt_identity()
-    images = Image.query.filter_by(user_id=user_id).all()
+    images, next_cursor = paginate(Image.query.filter_by(user_id=user_id), Image.image_created_at, Image.image_id)
 
     image_list = [
         {
             "image_id": str(img.image_id),
             "original_url": img.image_original_url,
-            "enhanced_url": img.image_restored_url
+            "enhanced_url": img.image_restored_url,
+            "thumbnails": img.image_renditions or {}
         }
         for img in images
     ]
 
-    return jsonify({"images": image_list})
+    return jsonify({"images": image_list, "next_cursor": next_cursor})
 
 
 # ✅ Trang hiển thị giao diện nâng cấp ảnh
@@ -183,11 +165,12 @@ def esrgan_page():
 @jwt_required()
 def get_user_images():
     user_id = get_jwt_identity()
-    images = Image.query.filter_by(user_id=user_id).all()
+    images, next_cursor = paginate(Image.query.filter_by(user_id=user_id), Image.image_created_at, Image.image_id)
 
     image_list = [{
         "original_url": img.image_original_url,
-        "enhanced_url": img.image_restored_url
+        "enhanced_url": img.image_restored_url,
+        "thumbnails": img.image_renditions or {}
     } for img in images]
 
-    return jsonify({"images": image_list})
+    return jsonify({"images": image_list, "next_cursor": next_cursor})
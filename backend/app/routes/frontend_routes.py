@@ -1,18 +1,48 @@
 # app/routes_frontend.py
-from flask import Blueprint, send_from_directory
-from pathlib import Path
+from flask import Blueprint, Response, abort, current_app, request, send_from_directory
+from backend.app.static_assets import FRONTEND_DIR, DIST_DIR, dist_entry
 
 # [1] Khởi tạo fronend_bp theo cấu trúc Blueprint
 frontend_bp = Blueprint('frontend_bp', __name__)
 
+# Phần mở rộng của bản nén đã build sẵn theo Content-Encoding
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
 # [1] Khởi tạo routes để lấy đường dẫn fronend, vì muốn hoạt động được thì các file ngoài backend phải đky thông qua routes
 @frontend_bp.route('/frontend/<path:filename>')
 def frontend_static(filename):
-    # Tính toán đường dẫn tuyệt đối đến thư mục frontend
-    frontend_path = Path(__file__).resolve().parents[3] / 'frontend'
-    file_path = frontend_path / filename
-    print(f"Serving {filename} from {frontend_path}")
-    if not file_path.exists():
-        print(f"File {filename} not found in {frontend_path}")
-        return "File not found", 404
-    return send_from_directory(frontend_path, filename)
+    if filename.startswith("dist/"):
+        return _serve_fingerprinted(filename[len("dist/"):])
+
+    # File gốc (chưa build): cache ngắn, trình duyệt kiểm tra lại bằng ETag / Last-Modified (304)
+    return send_from_directory(FRONTEND_DIR, filename, max_age=current_app.config["STATIC_FALLBACK_MAX_AGE"])
+
+
+def _serve_fingerprinted(hashed_name):
+    """ File có hash trong tên: không bao giờ đổi nội dung -> cache immutable, gửi bản nén sẵn nếu client nhận """
+    entry = dist_entry(hashed_name)
+    if entry is None:
+        abort(404)
+
+    encoding = request.accept_encodings.best_match(entry["encodings"])
+    etag = f"{entry['etag']}-{encoding}" if encoding else entry["etag"]
+    cache_control = f"public, max-age={current_app.config['STATIC_IMMUTABLE_MAX_AGE']}, immutable"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = send_from_directory(
+            DIST_DIR,
+            hashed_name + ENCODING_SUFFIXES.get(encoding, ""),
+            mimetype=entry["mimetype"],
+            conditional=False,
+            etag=False
+        )
+        if encoding:
+            response.content_encoding = encoding
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Accept-Encoding")
+    return response
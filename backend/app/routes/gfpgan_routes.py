@@ -1,50 +1,25 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, current_app
 from backend.app.db import db
-from backend.app.models import User, Image, UserPackage
+from backend.app.models import User, Image
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
-import os
 import uuid
-import requests
-import replicate
-from PIL import Image as PILImage
-from io import BytesIO
 import time
-from sqlalchemy.sql import func  # ✅ Import func để tính tổng tín dụng
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME_ORIGINAL = "user-uploads"
-CONTAINER_NAME_RESTORED = "restored-images"
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from concurrent.futures import as_completed, wait
+from backend.app.jobs import batch_executor, submit_job, update_job, JobQueueFull
+from backend.app import inference
+from backend.app.uploads import store_image_upload
+from backend.app.ingest import ingest_image
+from backend.app import result_cache
+from backend.app import derivatives
+from backend.app import credits
+from backend.app import storage
+from backend.app.pagination import paginate
+
+# 🔹 Tham số GFPGAN (phiên bản model khai báo trong inference.MODELS; khoá cache gồm cả engine đã chạy)
+GFPGAN_PARAMS = inference.MODELS["gfpgan"]["params"]
 
 gfpgan_blueprint = Blueprint("gfpgan", __name__)
 
-# 🔹 Resize ảnh trước khi upload (max 1024x1024)
-def resize_image(image_data):
-    image = PILImage.open(BytesIO(image_data))
-    
-    # Chuyển đổi ảnh có kênh Alpha (RGBA) sang RGB
-    if image.mode == "RGBA":
-        image = image.convert("RGB")
-
-    max_size = 1024
-    width, height = image.size
-
-    if width > max_size or height > max_size:
-        if width > height:
-            new_width = max_size
-            new_height = int((max_size / width) * height)
-        else:
-            new_height = max_size
-            new_width = int((max_size / height) * width)
-
-        image = image.resize((new_width, new_height), PILImage.LANCZOS)
-
-    buffer = BytesIO()
-    image.save(buffer, format="JPEG")  # ✅ Lưu lại đúng định dạng JPEG
-    return buffer.getvalue()
-
 
 @gfpgan_blueprint.route("/upload", methods=["POST"])
 @jwt_required()
@@ -59,25 +34,12 @@ def upload_image():
     if not file:
         return jsonify({"error": "Không có file nào được tải lên!"}), 400
 
-    # Resize ảnh
+    # ✅ Chuẩn hoá ảnh: xoay EXIF, thu nhỏ (draft JPEG), chặn ảnh quá lớn
     image_data = file.read()
-    resized_image_data = resize_image(image_data)
-
-    # Tạo tên file ngẫu nhiên
-    blob_name = f"{uuid.uuid4()}.jpg"
-
-    # Upload lên Azure Storage
-    blob_client = blob_service_client.get_blob_client(
-        container=CONTAINER_NAME_ORIGINAL,
-        blob=blob_name
-    )
-    blob_client.upload_blob(resized_image_data, overwrite=True)
-
-    # Lưu URL vào database
-    image_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_ORIGINAL}/{blob_name}"
-    new_image = Image(user_id=user_id, image_original_url=image_url)
-    db.session.add(new_image)
-    db.session.commit()
+    resized_image_data = ingest_image(image_data)
+
+    # ✅ Lưu theo hash nội dung: ảnh đã tải trước đó sẽ dùng lại blob và bản ghi cũ
+    new_image, image_url = store_image_upload(user_id, resized_image_data)
 
     return jsonify({
         "message": "Ảnh đã tải lên thành công!",
@@ -105,76 +67,236 @@ def restore_image():
     if not user or not image:
         return jsonify({"error": "User hoặc ảnh không hợp lệ!"}), 400
 
-    # ✅ Kiểm tra tín dụng
-    total_credits = db.session.query(
-        func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-    ).filter(UserPackage.user_id == user.user_id).scalar()
-
-    if total_credits < 2:
+    # ✅ Giữ chỗ tín dụng (kiểm tra và trừ trong cùng một câu lệnh)
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN, "gfpgan.restore")
+    except credits.InsufficientCredits:
         return jsonify({"error": "Bạn không đủ tín dụng để khôi phục ảnh!"}), 403
 
-    # ✅ Gửi ảnh đến API Replicate
+    with credits.refund_on_error(ledger_id):
+        # ✅ Ảnh này đã được khôi phục với cùng engine + tham số -> trả kết quả đã lưu ngay
+        input_digest = result_cache.input_hash(image)
+        cached = result_cache.find(inference.engines("gfpgan", GFPGAN_PARAMS), input_digest, GFPGAN_PARAMS)
+        if cached:
+            image.image_restored_url = cached.cache_output
+            image.image_status = "completed"
+            derivatives.attach(image, "restored", result_cache.renditions(cached))
+            db.session.commit()
+            credits.settle(ledger_id)
+
+            return jsonify({"message": "Ảnh đã phục hồi thành công!", "restored_url": cached.cache_output, "cached": True})
+
+        # ✅ Ghi "pending" trước khi đưa vào hàng đợi: tác vụ có thể xong (completed / failed) trước khi request này trả về
+        previous_status = image.image_status
+        image.image_status = "pending"
+        db.session.commit()
+
+        # ✅ Đưa vào hàng đợi, trả về job_id ngay thay vì giữ worker chờ Replicate
+        try:
+            job = submit_job(user.user_id, "gfpgan.restore", run_restore_job, image.image_id, ledger_id, input_digest)
+        except JobQueueFull:
+            image.image_status = previous_status
+            db.session.commit()
+            credits.refund(ledger_id)
+            return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại sau!"}), 503
+
+        return jsonify({
+            "message": "Ảnh đang được khôi phục!",
+            "job_id": str(job.job_id),
+            "status_url": f"/jobs/{job.job_id}"
+        }), 202
+
+
+# ✅ Tác vụ nền: Replicate -> tải ảnh kết quả -> upload Azure -> chốt tín dụng
+def run_restore_job(job_id, image_id, ledger_id, input_digest):
     try:
-        # replicate.run(...) tự block đến khi có URL đầu ra
-        output_url = replicate.run(
-            "tencentarc/gfpgan:0fbacf7afc6c144e5be9767cff80f25aff23e52b0708f17e20f9879b2f21516c",
-            input={
-                "img": image.image_original_url,
-                "scale": 2,
-                "version": "v1.4"
-            }
-        )
+        restored_url = restore_one(image_id, input_digest, on_stage=lambda stage, progress: update_job(job_id, stage, progress))
+    except Exception:
+        credits.refund(ledger_id)
+        raise
 
-        print(f"✅ Replicate Output URL: {output_url}")
+    credits.settle(ledger_id)
 
-        if not output_url:
-            return jsonify({"error": "Không thể lấy ảnh kết quả từ Replicate!"}), 500
+    return {"restored_url": restored_url}
 
-    except Exception as e:
-        print("❌ Lỗi khi gọi Replicate:", str(e))
-        return jsonify({"error": "Lỗi khi kết nối đến Replicate!"}), 500
 
-    # ✅ Tải ảnh từ URL trả về (output_url)
+def restore_one(image_id, input_digest, on_stage=None):
+    """ Khôi phục một ảnh và lưu kết quả, trả về restored_url (lỗi -> ảnh "failed" và ném lại) """
+    image = Image.query.get(image_id)
+
     try:
+        if on_stage:
+            on_stage("predicting", 10)
+        # ✅ Replicate (chờ webhook) hoặc ONNX trên CPU của server (ảnh mặt nhỏ) tuỳ INFERENCE_BACKEND
+        output, engine = inference.run("gfpgan", image.image_original_url, GFPGAN_PARAMS)
+
+        if not output:
+            raise RuntimeError("Không thể lấy ảnh kết quả từ Replicate!")
+
+        # ✅ Stream ảnh từ URL trả về thẳng vào kho lưu trữ, hoặc upload bytes từ model local
+        if on_stage:
+            on_stage("transferring", 60)
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
         }
-        response = requests.get(output_url, headers=headers, timeout=15, stream=True)
-        response.raise_for_status()
-        image_data = response.content
-    except Exception as e:
-        print("❌ Lỗi khi tải ảnh từ Replicate:", str(e))
-        return jsonify({"error": "Không thể tải ảnh từ Replicate!"}), 500
-
-    # ✅ Upload ảnh lên Azure
-    blob_name = f"restored_{uuid.uuid4()}.jpg"
-    restored_blob_client = blob_service_client.get_blob_client(
-        container=CONTAINER_NAME_RESTORED,
-        blob=blob_name
-    )
-    restored_blob_client.upload_blob(image_data, overwrite=True)
-
-    restored_url = (
-        f"https://{blob_service_client.account_name}.blob.core.windows.net/"
-        f"{CONTAINER_NAME_RESTORED}/{blob_name}"
-    )
+        restored_url = inference.store_output(
+            output,
+            storage.CONTAINER_RESTORED,
+            f"restored_{uuid.uuid4()}.jpg",
+            headers=headers
+        )
+    except Exception:
+        image.image_status = "failed"
+        db.session.commit()
+        raise
+
+    # ✅ Ảnh thu nhỏ cho thư viện
+    if on_stage:
+        on_stage("thumbnails", 90)
+    renditions = derivatives.generate_for_url(restored_url)
 
     # Lưu vào database
     image.image_restored_url = restored_url
+    image.image_status = "completed"
+    derivatives.attach(image, "restored", renditions)
     db.session.commit()
+    result_cache.put(engine, result_cache.make_key(engine, input_digest, GFPGAN_PARAMS), restored_url, renditions)
+
+    return restored_url
+
+
+@gfpgan_blueprint.route("/batch", methods=["POST"])
+@jwt_required()
+def restore_batch():
+    """ Khôi phục nhiều ảnh trong một request: JSON {"image_ids": [...]} hoặc multipart nhiều file "images".
+
+    Giữ chỗ tín dụng một lần cho cả lô, chạy các prediction song song (tối đa BATCH_CONCURRENCY)
+    trong một tác vụ nền; `/jobs/<id>` trả về trạng thái từng ảnh trong `result.items`.
+    """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user:
+        return jsonify({"error": "User không tồn tại!"}), 400
 
-    # ✅ Trừ tín dụng
-    user_package = UserPackage.query.filter(
-        UserPackage.user_id == user.user_id
-    ).first()
-    if user_package:
-        user_package.user_package_credits -= 2
+    files = request.files.getlist("images")
+    image_ids = [] if files else (request.get_json(silent=True) or {}).get("image_ids") or []
+    count = len(files) or len(image_ids)
+
+    if count == 0:
+        return jsonify({"error": "Không có ảnh nào để khôi phục!"}), 400
+    if count > current_app.config["BATCH_MAX_ITEMS"]:
+        return jsonify({"error": f"Mỗi lô tối đa {current_app.config['BATCH_MAX_ITEMS']} ảnh!"}), 400
+
+    if files:
+        # ✅ Chuẩn hoá + lưu theo hash nội dung như /upload (ảnh trùng dùng lại bản ghi cũ)
+        images = [store_image_upload(user_id, ingest_image(file.read()))[0] for file in files]
+    else:
+        try:
+            wanted = {uuid.UUID(str(image_id)) for image_id in image_ids}
+        except ValueError:
+            return jsonify({"error": "image_id không hợp lệ!"}), 400
+        images = Image.query.filter(Image.user_id == user.user_id, Image.image_id.in_(wanted)).all()
+        if len(images) != len(wanted):
+            return jsonify({"error": "User hoặc ảnh không hợp lệ!"}), 400
+
+    # Bỏ ảnh trùng (cùng nội dung tải lên hai lần) để không tính tiền hai lần
+    images = list({image.image_id: image for image in images}.values())
+
+    # ✅ Giữ chỗ tín dụng một lần cho cả lô
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN * len(images), "gfpgan.batch")
+    except credits.InsufficientCredits:
+        return jsonify({"error": "Bạn không đủ tín dụng để khôi phục các ảnh này!"}), 403
+
+    with credits.refund_on_error(ledger_id):
+        # ✅ Ảnh đã có kết quả với cùng engine + tham số -> trả ngay, không gọi Replicate
+        items, work, previous_status = [], [], {}
+        engines = inference.engines("gfpgan", GFPGAN_PARAMS)
+        for image in images:
+            input_digest = result_cache.input_hash(image)
+            cached = result_cache.find(engines, input_digest, GFPGAN_PARAMS)
+            item = {"image_id": str(image.image_id), "status": "pending", "restored_url": None, "error": None}
+
+            if cached:
+                image.image_restored_url = cached.cache_output
+                image.image_status = "completed"
+                derivatives.attach(image, "restored", result_cache.renditions(cached))
+                item.update(status="cached", restored_url=cached.cache_output)
+            else:
+                previous_status[image] = image.image_status
+                image.image_status = "pending"
+                work.append((image.image_id, input_digest, item))
+            items.append(item)
+
+        if not work:
+            db.session.commit()
+            credits.settle(ledger_id)
+            return jsonify({"message": "Ảnh đã phục hồi thành công!", "items": items})
+
+        # ✅ Ghi "pending" trước khi đưa vào hàng đợi: ảnh đầu tiên có thể xong trước khi request này trả về
         db.session.commit()
 
-    return jsonify({
-        "message": "Ảnh đã phục hồi thành công!",
-        "restored_url": restored_url
-    })
+        submitted_items = [dict(item) for item in items]  # Tác vụ nền sẽ cập nhật `items` song song với response
+        try:
+            job = submit_job(user.user_id, "gfpgan.batch", run_batch_job, items, work, ledger_id)
+        except JobQueueFull:
+            for image, status in previous_status.items():
+                image.image_status = status
+            db.session.commit()
+            credits.refund(ledger_id)
+            return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại sau!"}), 503
+
+        return jsonify({
+            "message": f"{len(work)} ảnh đang được khôi phục!",
+            "job_id": str(job.job_id),
+            "status_url": f"/jobs/{job.job_id}",
+            "items": submitted_items
+        }), 202
+
+
+# ✅ Tác vụ nền theo lô: các ảnh chạy song song (giới hạn BATCH_CONCURRENCY), chốt tín dụng theo số ảnh thành công
+def run_batch_job(job_id, items, work, ledger_id):
+    app = current_app._get_current_object()
+
+    def snapshot():
+        return {"items": [dict(item) for item in items]}
+
+    try:
+        update_job(job_id, "predicting", 5, snapshot())
+        done = 0
+        # ✅ Pool dùng chung của mọi lô (jobs.batch_executor): BATCH_CONCURRENCY là giới hạn của cả tiến trình
+        executor = batch_executor()
+        futures = {
+            executor.submit(_restore_in_context, app, image_id, input_digest): item
+            for image_id, input_digest, item in work
+        }
+        try:
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    item.update(status="completed", restored_url=future.result())
+                except Exception as e:
+                    item.update(status="failed", error=str(e)[:255])
+                done += 1
+                update_job(job_id, "predicting", 5 + 90 * done // len(work), snapshot())
+        finally:
+            wait(futures)  # Chỉ chốt tín dụng khi không còn ảnh nào đang chạy
+    finally:
+        # Ảnh lỗi (hoặc chưa chạy vì tác vụ bị ngắt) được hoàn tín dụng
+        used = sum(1 for item in items if item["status"] in ("completed", "cached"))
+        credits.settle_partial(ledger_id, credits.COST_PER_RUN * used)
+
+    return snapshot()
+
+
+def _restore_in_context(app, image_id, input_digest):
+    """ Mỗi luồng trong lô dùng app context và phiên DB riêng """
+    with app.app_context():
+        try:
+            return restore_one(image_id, input_digest)
+        finally:
+            db.session.remove()
 
 
 @gfpgan_blueprint.route("/", methods=["GET"])
@@ -187,15 +309,16 @@ def gfpgan_page():
 def list_images():
     """ API lấy danh sách ảnh của user """
     user_id = get_jwt_identity()
-    images = Image.query.filter_by(user_id=user_id).all()
+    images, next_cursor = paginate(Image.query.filter_by(user_id=user_id), Image.image_created_at, Image.image_id)
 
     image_list = [
         {
             "image_id": str(img.image_id),
             "original_url": img.image_original_url,
-            "restored_url": img.image_restored_url
+            "restored_url": img.image_restored_url,
+            "thumbnails": img.image_renditions or {}  # {"original": [{"url", "width", "format"}], "restored": [...]}
         }
         for img in images
     ]
 
-    return jsonify({"images": image_list})
+    return jsonify({"images": image_list, "next_cursor": next_cursor})
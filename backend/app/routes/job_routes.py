@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.app.models import Job
+from backend.app.jobs import job_to_dict
+import uuid
+
+job_blueprint = Blueprint("jobs", __name__)
+
+# ✅ **API: Trạng thái của một tác vụ nền**
+@job_blueprint.route("/<job_id>", methods=["GET"])
+@jwt_required()
+def get_job_status(job_id):
+    try:
+        job = Job.query.get(uuid.UUID(job_id))
+    except ValueError:
+        job = None
+
+    # 🔹 Chỉ chủ sở hữu mới xem được tác vụ của mình
+    if not job or str(job.user_id) != str(get_jwt_identity()):
+        return jsonify({"error": "Không tìm thấy tác vụ!"}), 404
+
+    return jsonify(job_to_dict(job))
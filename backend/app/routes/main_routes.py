@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt
+from backend.app import http_client, result_cache, cpu_pool, inference, jobs
 
 main_blueprint = Blueprint('main', __name__)
 
@@ -20,3 +21,12 @@ def admin_dashboard():
         flash("Bạn không có quyền truy cập!")
         return redirect(url_for('main.home'))
     return render_template('admin.html')
+
+# Số liệu vận hành (chỉ dành cho admin)
+@main_blueprint.route('/admin/metrics')
+@jwt_required()
+def admin_metrics():
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({"error": "Bạn không có quyền truy cập!"}), 403
+    return jsonify({"http": http_client.stats(), "result_cache": result_cache.stats(), "cpu_pool": cpu_pool.stats(), "inference": inference.stats(), "jobs": jobs.stats(), "startup": current_app.extensions.get("startup_profile")})
@@ -2,7 +2,6 @@ from flask import Blueprint, request, render_template, redirect, url_for, flash,
 from backend.app.db import db
 from backend.app.models import User
 import random
-from azure.communication.email import EmailClient
 from datetime import datetime, timedelta
 import os
 
@@ -10,6 +9,8 @@ password_blueprint = Blueprint('password', __name__)
 
 # ✅ Hàm gửi OTP qua email
 def send_reset_otp(email, otp_code):
+    from azure.communication.email import EmailClient  # SDK nặng, chỉ nạp khi thật sự gửi mail
+
     connection_string = os.getenv("AZURE_EMAIL_CONNECTION_STRING")
     client = EmailClient.from_connection_string(connection_string)
 
@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for
-import requests
+from backend.app import http_client
 import os
 from backend.app.db import db
 from backend.app.models import User, Payment, Package, UserPackage
+from backend.app import credits
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
 
 payment_blueprint = Blueprint("payment", __name__)
 
@@ -45,13 +47,15 @@ def process_payment():
 
     if not user or not package:
         return jsonify({"error": "User hoặc Package không hợp lệ!"}), 400
+    if not paypal_order_id:
+        return jsonify({"error": "Thiếu mã đơn PayPal!"}), 400
 
     # Gọi API PayPal để xác nhận thanh toán
     access_token = get_paypal_access_token()
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {access_token}"}
     verify_url = f"{PAYPAL_API_URL}/v2/checkout/orders/{paypal_order_id}"
     
-    response = requests.get(verify_url, headers=headers)
+    response = http_client.get(verify_url, headers=headers)
     response_json = response.json()
 
     if response.status_code != 200 or response_json.get("status") != "COMPLETED":
@@ -67,7 +71,7 @@ def process_payment():
     )
     db.session.add(new_payment)
 
-    # Cập nhật tín dụng cho người dùng
+    # Lưu lịch sử gói đã mua (số dư thực tế nằm ở users.user_credit_balance)
     user_package = UserPackage.query.filter_by(user_id=user_id, package_id=package_id).first()
     if user_package:
         user_package.user_package_credits += package.package_credits
@@ -79,7 +83,14 @@ def process_payment():
         )
         db.session.add(new_user_package)
 
-    db.session.commit()
+    # ✅ Cộng tín dụng + ghi sổ, commit cùng giao dịch với Payment. Mỗi đơn PayPal chỉ được cộng một lần:
+    # index unique trên mã đơn (migration 0008) chặn cả hai request xác nhận cùng đơn chạy song song
+    try:
+        credits.grant(user_id, package.package_credits, paypal_order_id, commit=False)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Đơn thanh toán này đã được xử lý!"}), 409
 
     return jsonify({"message": "Thanh toán thành công!", "credits": package.package_credits})
 
@@ -112,7 +123,7 @@ def get_paypal_access_token():
     auth_data = {"grant_type": "client_credentials"}
     auth_headers = {"Accept": "application/json", "Accept-Language": "en_US"}
 
-    response = requests.post(auth_url, auth_data, headers=auth_headers, auth=(PAYPAL_CLIENT_ID, PAYPAL_SECRET))
+    response = http_client.post(auth_url, auth_data, headers=auth_headers, auth=(PAYPAL_CLIENT_ID, PAYPAL_SECRET))
     response_json = response.json()
 
     return response_json.get("access_token")
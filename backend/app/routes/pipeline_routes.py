@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify, current_app
+from backend.app.db import db
+from backend.app.models import User, Image
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.app.jobs import submit_job, JobQueueFull
+from backend.app import credits
+from backend.app import pipelines
+
+pipeline_blueprint = Blueprint("pipelines", __name__)
+
+
+# ✅ **API: Chạy nhiều bước xử lý ảnh liên tiếp (VD khôi phục -> nâng cấp -> tô màu) trên server**
+# Body: {"image_id", "steps": ["gfpgan", "esrgan", "colorize"] hoặc [{"id", "tool", "input", "params"}], "keep_intermediates": false}
+@pipeline_blueprint.route("/", methods=["POST"])
+@jwt_required()
+def run_pipeline():
+    data = request.get_json(silent=True) or {}
+    image_id = data.get("image_id")
+
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    image = Image.query.get(image_id) if image_id else None
+
+    if not user or not image or str(image.user_id) != str(user.user_id):
+        return jsonify({"error": "User hoặc ảnh không hợp lệ!"}), 400
+
+    try:
+        steps = pipelines.parse_steps(data.get("steps"), current_app.config["PIPELINE_MAX_STEPS"])
+    except pipelines.InvalidPipeline as e:
+        return jsonify({"error": str(e)}), 400
+
+    # ✅ Giữ chỗ tín dụng cho toàn bộ pipeline (mỗi bước như một lần xử lý)
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN * len(steps), "pipeline")
+    except credits.InsufficientCredits:
+        return jsonify({"error": "Bạn không đủ tín dụng để chạy pipeline này!"}), 403
+
+    # ✅ Ghi "pending" trước khi đưa vào hàng đợi: pipeline có thể xong (completed / failed) trước khi request này trả về
+    previous_status = image.image_status
+    image.image_status = "pending"
+    db.session.commit()
+
+    try:
+        job = submit_job(
+            user.user_id, "pipeline", pipelines.run_pipeline_job,
+            image.image_id, steps, bool(data.get("keep_intermediates")), ledger_id
+        )
+    except JobQueueFull:
+        image.image_status = previous_status
+        db.session.commit()
+        credits.refund(ledger_id)
+        return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại sau!"}), 503
+
+    return jsonify({
+        "message": "Pipeline đang chạy!",
+        "job_id": str(job.job_id),
+        "status_url": f"/jobs/{job.job_id}",
+        "steps": steps
+    }), 202
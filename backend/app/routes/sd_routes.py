@@ -2,21 +2,19 @@ from flask import Blueprint, request, jsonify, render_template
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.app.db import db
 from backend.app.models import User
-from azure.storage.blob import BlobServiceClient
 import os
 import uuid
-import requests
-import replicate
 from flask_cors import CORS
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME = "stable-diffusion-3-5-large"
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from backend.app import predictions
+from backend.app import result_cache
+from backend.app import storage
 
 # 🔹 API Token của Replicate
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
 
+# 🔹 Model Stable Diffusion 3.5 trên Replicate
+SD_MODEL = "stability-ai/stable-diffusion-3.5-large"
+
 sd_blueprint = Blueprint("sd", __name__)
 CORS(sd_blueprint)  # Cho phép API gọi từ frontend
 
@@ -32,6 +30,11 @@ def generate_image():
     output_format = data.get("output_format", "webp")
     output_quality = data.get("output_quality", 90)
     prompt_strength = data.get("prompt_strength", 0.85)
+    seed = data.get("seed")
+    try:
+        deterministic = result_cache.parse_flag(data.get("deterministic"))  # ✅ Bật để dùng lại ảnh đã tạo với cùng seed
+    except ValueError:
+        return jsonify({"error": "`deterministic` phải là true hoặc false!"}), 400
 
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -53,30 +56,40 @@ def generate_image():
         "prompt_strength": prompt_strength,
     }
 
+    if deterministic or seed is not None:
+        try:
+            payload["seed"] = int(seed)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Chế độ tất định cần `seed` là số nguyên!"}), 400
+
+    # ✅ Cùng prompt + cùng bộ tham số + cùng seed -> trả ảnh đã lưu trong kho lưu trữ
+    cache_key = None
+    if deterministic:
+        cache_key = result_cache.make_key(SD_MODEL, result_cache.hash_text(prompt), payload)
+        cached_url = result_cache.get(SD_MODEL, cache_key)
+        if cached_url:
+            return jsonify({"message": "Ảnh đã tạo thành công!", "image_url": cached_url, "cached": True})
+
     try:
-        response = replicate.run("stability-ai/stable-diffusion-3.5-large", input=payload)
+        response = predictions.run(SD_MODEL, input=payload)
 
         if not response:
             return jsonify({"error": "Không thể tạo ảnh từ Replicate!"}), 500
 
-        image_url = response[0]  # ✅ URL ảnh trả về từ Replicate
+        image_url = predictions.first_output(response)  # ✅ URL ảnh trả về từ Replicate
         print(f"✅ Ảnh tạo thành công: {image_url}")
 
     except Exception as e:
         return jsonify({"error": f"Lỗi kết nối đến Replicate: {str(e)}"}), 500
 
-    # ✅ Tải ảnh từ URL trả về
+    # ✅ Stream ảnh từ URL trả về thẳng vào kho lưu trữ
     try:
-        image_data = requests.get(image_url, timeout=15).content
+        stored_image_url = storage.upload_from_url(storage.CONTAINER_SD, f"generated_{uuid.uuid4()}.webp", image_url)
     except Exception as e:
         return jsonify({"error": "Không thể tải ảnh từ Replicate!"}), 500
 
-    # ✅ Upload ảnh lên Azure Storage
-    blob_name = f"generated_{uuid.uuid4()}.webp"
-    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=blob_name)
-    blob_client.upload_blob(image_data, overwrite=True)
-
-    stored_image_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}"
+    if cache_key:
+        result_cache.put(SD_MODEL, cache_key, stored_image_url)
 
     return jsonify({"message": "Ảnh đã tạo thành công!", "image_url": stored_image_url})
 
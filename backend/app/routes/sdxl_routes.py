@@ -1,22 +1,20 @@
 from flask import Blueprint, request, jsonify, render_template
 from backend.app.db import db
-from backend.app.models import User, Image, UserPackage
+from backend.app.models import User, Image
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
 import os
 import uuid
-import requests
-import replicate
-from sqlalchemy.sql import func
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME = "sdxl-lightning-4step"
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from backend.app import predictions
+from backend.app import result_cache
+from backend.app import credits
+from backend.app import storage
 
 # 🔹 API Token của Replicate
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
 
+# 🔹 Model SDXL Lightning 4-step trên Replicate (phiên bản cố định)
+SDXL_MODEL = "bytedance/sdxl-lightning-4step:5599ed30703defd1d160a25a63321b4dec97101d98b4674bcc56e41f62f35637"
+
 sdxl_blueprint = Blueprint("sdxl", __name__)
 
 # ✅ **API: Tạo ảnh bằng SDXL Lightning 4-step**
@@ -38,67 +36,85 @@ def generate_image():
     scheduler = data.get("scheduler", "K_EULER")
     num_inference_steps = data.get("num_inference_steps", 4)
     guidance_scale = data.get("guidance_scale", 0)
+    seed = data.get("seed")
+    try:
+        deterministic = result_cache.parse_flag(data.get("deterministic"))  # ✅ Bật để dùng lại ảnh đã tạo với cùng seed
+    except ValueError:
+        return jsonify({"error": "`deterministic` phải là true hoặc false!"}), 400
 
     if not prompt:
         return jsonify({"error": "Vui lòng nhập prompt để tạo ảnh!"}), 400
 
-    # ✅ Kiểm tra tín dụng
-    total_credits = db.session.query(
-        func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-    ).filter(UserPackage.user_id == user.user_id).scalar()
-
-    if total_credits < 2:
+    model_input = {
+        "width": width,
+        "height": height,
+        "prompt": prompt,
+        "scheduler": scheduler,
+        "num_outputs": num_outputs,
+        "guidance_scale": guidance_scale,
+        "negative_prompt": negative_prompt,
+        "num_inference_steps": num_inference_steps
+    }
+
+    if deterministic or seed is not None:
+        try:
+            model_input["seed"] = int(seed)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Chế độ tất định cần `seed` là số nguyên!"}), 400
+
+    # ✅ Giữ chỗ tín dụng (kiểm tra và trừ trong cùng một câu lệnh)
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN, "sdxl.generate")
+    except credits.InsufficientCredits:
         return jsonify({"error": "Bạn không đủ tín dụng để tạo ảnh!"}), 403
 
-    # ✅ Gửi prompt đến API Replicate
-    try:
-        output_urls = replicate.run(
-            "bytedance/sdxl-lightning-4step:5599ed30703defd1d160a25a63321b4dec97101d98b4674bcc56e41f62f35637",
-            input={
-                "width": width,
-                "height": height,
-                "prompt": prompt,
-                "scheduler": scheduler,
-                "num_outputs": num_outputs,
-                "guidance_scale": guidance_scale,
-                "negative_prompt": negative_prompt,
-                "num_inference_steps": num_inference_steps
-            }
-        )
-
-        if not output_urls:
-            return jsonify({"error": "Không thể tạo ảnh từ Replicate!"}), 500
-
-        generated_images = []
-
-        for img_url in output_urls:
-            response = requests.get(img_url, timeout=15, stream=True)
-            response.raise_for_status()
-            image_data = response.content
-
-            # ✅ Upload ảnh lên Azure Storage
-            blob_name = f"sdxl_{uuid.uuid4()}.jpg"
-            blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=blob_name)
-            blob_client.upload_blob(image_data, overwrite=True)
-
-            # ✅ URL ảnh trên Azure
-            azure_image_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}"
-            generated_images.append(azure_image_url)
-
-            # ✅ Lưu ảnh vào database
-            new_image = Image(user_id=user_id, image_original_url=azure_image_url)
-            db.session.add(new_image)
-
-        # ✅ Trừ tín dụng
-        user_package = UserPackage.query.filter(UserPackage.user_id == user.user_id).first()
-        if user_package:
-            user_package.user_package_credits -= 2
+    with credits.refund_on_error(ledger_id):
+        # ✅ Cùng prompt + cùng bộ tham số + cùng seed -> trả ảnh đã lưu trong kho lưu trữ
+        cache_key = None
+        if deterministic:
+            cache_key = result_cache.make_key(SDXL_MODEL, result_cache.hash_text(prompt.strip()), model_input)
+            cached_images = result_cache.get(SDXL_MODEL, cache_key)
+            if cached_images:
+                # Chỉ thêm vào thư viện những ảnh user này chưa có
+                for azure_image_url in cached_images:
+                    if not Image.find_by_url(user_id, azure_image_url):
+                        db.session.add(Image(user_id=user_id, image_original_url=azure_image_url))
+                db.session.commit()
+                credits.settle(ledger_id)
+
+                return jsonify({"message": "Tạo ảnh thành công!", "images": cached_images, "cached": True})
+
+        # ✅ Gửi prompt đến API Replicate
+        try:
+            output_urls = predictions.run(SDXL_MODEL, input=model_input)
+
+            if not output_urls:
+                credits.refund(ledger_id)
+                return jsonify({"error": "Không thể tạo ảnh từ Replicate!"}), 500
+
+            generated_images = []
+
+            for img_url in output_urls:
+                # ✅ Stream ảnh vào kho lưu trữ
+                azure_image_url = storage.upload_from_url(storage.CONTAINER_SDXL, f"sdxl_{uuid.uuid4()}.jpg", img_url)
+                generated_images.append(azure_image_url)
+
+                # ✅ Lưu ảnh vào database
+                new_image = Image(user_id=user_id, image_original_url=azure_image_url)
+                db.session.add(new_image)
+
             db.session.commit()
+            credits.settle(ledger_id)
+
+            if cache_key:
+                result_cache.put(SDXL_MODEL, cache_key, generated_images)
 
-        return jsonify({"message": "Tạo ảnh thành công!", "images": generated_images})
+            return jsonify({"message": "Tạo ảnh thành công!", "images": generated_images})
 
-    except Exception as e:
-        return jsonify({"error": f"Lỗi kết nối đến Replicate: {str(e)}"}), 500
+        except Exception as e:
+            db.session.rollback()
+            credits.refund(ledger_id)
+            return jsonify({"error": f"Lỗi kết nối đến Replicate: {str(e)}"}), 500
 
 
 # ✅ **API: Lấy danh sách ảnh đã tạo**
@@ -0,0 +1,21 @@
+from flask import Blueprint, abort, current_app, send_from_directory
+from backend.app import storage
+
+storage_blueprint = Blueprint("storage", __name__)
+
+
+# ✅ **Phục vụ file khi STORAGE_BACKEND=filesystem (dev / đo hiệu năng); với Azure file được tải thẳng từ Blob**
+@storage_blueprint.route("/<container>/<path:blob_name>")
+def serve_file(container, blob_name):
+    backend = storage.backend()
+    if not isinstance(backend, storage.FilesystemBackend):
+        abort(404)
+
+    # Chuẩn hoá và kiểm tra đường dẫn (container "..", blob "../..") trước khi đọc file
+    try:
+        path = backend.path(container, blob_name)
+    except storage.BlobNotFound:
+        abort(404)
+
+    # Tên blob là UUID / SHA-256 nên nội dung không bao giờ đổi
+    return send_from_directory(path.parent, path.name, max_age=current_app.config["STATIC_IMMUTABLE_MAX_AGE"])
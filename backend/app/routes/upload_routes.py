@@ -0,0 +1,149 @@
+from flask import Blueprint, request, jsonify, current_app
+from backend.app.db import db
+from backend.app.models import User, Video, Upload
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timedelta
+from backend.app.ingest import ingest_image, ImageRejected
+from backend.app.uploads import UPLOAD_KINDS, store_image_upload
+from backend.app import storage
+import uuid
+
+upload_blueprint = Blueprint("uploads", __name__)
+
+
+# ✅ **API: Cấp URL SAS ngắn hạn để trình duyệt tải file thẳng lên Azure**
+@upload_blueprint.route("/sas", methods=["POST"])
+@jwt_required()
+def issue_upload_sas():
+    data = request.json or {}
+    kind = data.get("kind", "image")
+    user_id = get_jwt_identity()
+
+    if kind not in UPLOAD_KINDS:
+        return jsonify({"error": "Loại file không hợp lệ!"}), 400
+
+    container, extension, _ = UPLOAD_KINDS[kind]
+    # ✅ Gắn user_id vào tên blob để bước commit kiểm tra được chủ sở hữu
+    blob_name = f"{user_id}/{uuid.uuid4()}.{extension}"
+    expires_at = datetime.utcnow() + timedelta(seconds=current_app.config["UPLOAD_SAS_TTL"])
+
+    upload_url = storage.sas_upload_url(container, blob_name, expires_at)
+    if not upload_url:
+        # Chuỗi kết nối không có khoá tài khoản / lưu trên đĩa -> client dùng lại /upload cũ
+        return jsonify({"error": "Chưa hỗ trợ tải trực tiếp!"}), 501
+
+    # ✅ Ghi nhận blob đã cấp: commit chỉ nhận blob có trong bảng này, blob không được commit sẽ bị dọn
+    db.session.add(Upload(user_id=user_id, upload_kind=kind, upload_blob_name=blob_name))
+    db.session.commit()
+
+    return jsonify({
+        "blob_name": blob_name,
+        "upload_url": upload_url,
+        "headers": {"x-ms-blob-type": "BlockBlob"},
+        "expires_at": expires_at.isoformat() + "Z"
+    })
+
+
+# ✅ **API: Ghi nhận file đã tải lên xong vào bảng Image / Video**
+@upload_blueprint.route("/commit", methods=["POST"])
+@jwt_required()
+def commit_upload():
+    data = request.json or {}
+    kind = data.get("kind", "image")
+    blob_name = data.get("blob_name", "")
+    register = data.get("register", True)  # video01 chỉ cần URL ảnh, không tạo bản ghi
+
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if not user or kind not in UPLOAD_KINDS:
+        return jsonify({"error": "User hoặc loại file không hợp lệ!"}), 400
+
+    if not blob_name.startswith(f"{user_id}/") or ".." in blob_name:
+        return jsonify({"error": "File không thuộc về bạn!"}), 403
+
+    # ✅ Mỗi blob chỉ được commit một lần: nhận quyền xử lý bằng một câu UPDATE có điều kiện
+    claimed = Upload.query.filter_by(
+        user_id=user_id, upload_kind=kind, upload_blob_name=blob_name, upload_status="pending"
+    ).update({"upload_status": "committed"}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return jsonify({"error": "File không tồn tại hoặc đã được ghi nhận!"}), 409
+
+    container, _, max_size_key = UPLOAD_KINDS[kind]
+    max_size = current_app.config[max_size_key]
+
+    try:
+        size = storage.size(container, blob_name)
+    except storage.BlobNotFound:
+        _set_upload_status(blob_name, "pending")  # Trình duyệt chưa tải xong, có thể commit lại
+        return jsonify({"error": "File chưa được tải lên!"}), 404
+
+    if size > max_size:
+        _reject_upload(container, blob_name)
+        return jsonify({"error": "File quá lớn!"}), 413
+
+    # ⚠️ URL SAS vẫn ghi được tới khi hết hạn: dung lượng ở trên chỉ để từ chối sớm,
+    # hai hàm dưới kiểm tra lại trên đúng dữ liệu được giữ lại (bytes đã tải về / bản chép)
+    try:
+        if kind == "video":
+            return _commit_video(user_id, container, blob_name, max_size)
+        return _commit_image(user_id, container, blob_name, register, max_size)
+    except storage.BlobNotFound:
+        _set_upload_status(blob_name, "pending")
+        return jsonify({"error": "File chưa được tải lên!"}), 404
+    except ImageRejected:
+        _reject_upload(container, blob_name)
+        raise  # -> 400 (errorhandler trong create_app)
+    except Exception:
+        db.session.rollback()
+        _set_upload_status(blob_name, "pending")  # Cho phép thử lại, không thì `flask cleanup-uploads` sẽ dọn
+        raise
+
+
+def _commit_video(user_id, container, blob_name, max_size):
+    # ✅ Chép sang tên mà URL SAS không cấp quyền ghi rồi mới kiểm tra, client không thể ghi đè video
+    # đã được chấp nhận bằng file khác / lớn hơn. Blob tạm bị xoá, Video trỏ tới bản chép
+    video_blob = f"{uuid.uuid4()}.mp4"
+    url = storage.copy(container, blob_name, container, video_blob)
+    storage.delete(container, blob_name)
+
+    if storage.size(container, video_blob) > max_size:
+        storage.delete(container, video_blob)
+        _set_upload_status(blob_name, "rejected")
+        return jsonify({"error": "File quá lớn!"}), 413
+
+    new_video = Video(user_id=user_id, video_original_url=url)
+    db.session.add(new_video)
+    db.session.commit()
+    return jsonify({"message": "Video đã tải lên thành công!", "video_id": str(new_video.video_id), "video_url": url})
+
+
+def _commit_image(user_id, container, blob_name, register, max_size):
+    # ✅ Chuẩn hoá như /upload (xoay EXIF, thu nhỏ, JPEG; không đọc được / quá lớn -> ImageRejected),
+    # lưu bản đã chuẩn hoá theo hash nội dung rồi xoá blob trình duyệt vừa tải lên.
+    # Bản ghi Image có image_content_hash: ảnh trùng dùng lại bản ghi cũ và kết quả model đã ghi nhớ
+    raw_data = storage.download(container, blob_name)
+    if len(raw_data) > max_size:
+        _reject_upload(container, blob_name)
+        return jsonify({"error": "File quá lớn!"}), 413
+
+    image_data = ingest_image(raw_data)
+    image, url = store_image_upload(user_id, image_data, create_row=register)
+    storage.delete(container, blob_name)
+
+    if image is None:
+        return jsonify({"message": "Ảnh đã tải lên thành công!", "image_url": url})
+
+    return jsonify({"message": "Ảnh đã tải lên thành công!", "image_id": str(image.image_id), "image_url": url})
+
+
+def _set_upload_status(blob_name, status):
+    Upload.query.filter_by(upload_blob_name=blob_name).update({"upload_status": status}, synchronize_session=False)
+    db.session.commit()
+
+
+def _reject_upload(container, blob_name):
+    """ File không hợp lệ: xoá khỏi kho lưu trữ và không cho commit lại """
+    storage.delete(container, blob_name)
+    _set_upload_status(blob_name, "rejected")
@@ -1,21 +1,16 @@
 from flask import Blueprint, request, jsonify, render_template
 from backend.app.db import db
-from backend.app.models import User, Video, UserPackage
+from backend.app.models import User, Video
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
 import os
 import uuid
-import requests
-import replicate
-from sqlalchemy.sql import func
-import time
 from flask_cors import CORS
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME_ORIGINAL = "user-uploads"  # 📌 Ảnh gốc để tạo video
-CONTAINER_NAME_PROCESSED = "video-no-sound"  # 📌 Video sau khi tạo
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from backend.app import predictions
+from backend.app import credits
+from backend.app import storage
+from backend.app.pagination import paginate
+from backend.app.uploads import store_image_upload
+from backend.app.ingest import ingest_image
 
 # 🔹 API Token của Replicate
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
@@ -37,14 +32,8 @@ def upload_image():
     if not file:
         return jsonify({"error": "Không có ảnh nào được tải lên!"}), 400
 
-    # ✅ Tạo tên file ngẫu nhiên
-    blob_name = f"{uuid.uuid4()}.jpg"
-
-    # ✅ Upload ảnh lên Azure Storage
-    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_ORIGINAL, blob=blob_name)
-    blob_client.upload_blob(file.read(), overwrite=True)
-
-    image_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_ORIGINAL}/{blob_name}"
+    # ✅ Lưu theo hash nội dung (chỉ cần URL, không tạo bản ghi Image)
+    _, image_url = store_image_upload(user_id, ingest_image(file.read()), create_row=False)
 
     return jsonify({"message": "Ảnh đã tải lên thành công!", "image_url": image_url})
 
@@ -62,88 +51,71 @@ def generate_video():
     if not user or not prompt:
         return jsonify({"error": "Thiếu thông tin user hoặc prompt!"}), 400
 
-    # ✅ Kiểm tra tín dụng người dùng
-    total_credits = db.session.query(
-        func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-    ).filter(UserPackage.user_id == user.user_id).scalar()
-
-    if total_credits < 2:
-        return jsonify({"error": "Bạn không đủ tín dụng để tạo video!"}), 403
-
-    # ✅ Gửi yêu cầu đến Replicate (truyền thêm `first_frame_image` nếu có)
+    # ✅ Giữ chỗ tín dụng (kiểm tra và trừ trong cùng một câu lệnh)
     try:
-        input_data = {
-            "prompt": prompt,
-            "prompt_optimizer": prompt_optimizer
-        }
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN, "video01.generate_video")
+    except credits.InsufficientCredits:
+        return jsonify({"error": "Bạn không đủ tín dụng để tạo video!"}), 403
 
-        if image_url:
-            input_data["first_frame_image"] = image_url  # ✅ Truyền ảnh vào request nếu có
+    with credits.refund_on_error(ledger_id):
+        # ✅ Gửi yêu cầu đến Replicate (truyền thêm `first_frame_image` nếu có)
+        try:
+            input_data = {
+                "prompt": prompt,
+                "prompt_optimizer": prompt_optimizer
+            }
 
-        output_url = replicate.run("minimax/video-01", input=input_data)
+            if image_url:
+                input_data["first_frame_image"] = image_url  # ✅ Truyền ảnh vào request nếu có
 
-        if not output_url:
-            return jsonify({"error": "Không thể tạo video từ Replicate!"}), 500
+            # ✅ Chờ webhook của Replicate, tối đa 8 phút (480 giây)
+            output_url = predictions.first_output(predictions.run("minimax/video-01", input=input_data, timeout=480))
 
-    except Exception as e:
-        return jsonify({"error": f"Lỗi khi kết nối đến Replicate: {str(e)}"}), 500
+            if not output_url:
+                credits.refund(ledger_id)
+                return jsonify({"error": "Không thể tạo video từ Replicate!"}), 500
 
-    # ✅ Chờ tối đa 8 phút (480 giây) để lấy kết quả video
-    start_time = time.time()
-    while True:
-        if time.time() - start_time > 480:
-            return jsonify({"error": "Quá thời gian chờ, vui lòng thử lại sau!"}), 500
+        except predictions.PredictionError as e:
+            credits.refund(ledger_id)
+            return jsonify({"error": f"Quá thời gian chờ, vui lòng thử lại sau! ({str(e)})"}), 500
+        except Exception as e:
+            credits.refund(ledger_id)
+            return jsonify({"error": f"Lỗi khi kết nối đến Replicate: {str(e)}"}), 500
 
+        # ✅ Prediction đã xong nên video sẵn sàng, stream thẳng vào kho lưu trữ theo từng block
         try:
-            response = requests.get(output_url, timeout=30, stream=True)
-            if response.status_code == 200:
-                video_data = response.content
-                break
-        except:
-            time.sleep(10)
-
-    # ✅ Upload video đã tạo lên Azure Storage
-    blob_name = f"generated_{uuid.uuid4()}.mp4"
-    processed_blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_PROCESSED, blob=blob_name)
-    processed_blob_client.upload_blob(video_data, overwrite=True)
-
-    processed_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_PROCESSED}/{blob_name}"
-
-    # ✅ Lưu video vào database
-    new_video = Video(
-        user_id=user_id,
-        video_original_url=image_url if image_url else None,
-        video_processed_url=processed_url
-    )
-    db.session.add(new_video)
-    db.session.commit()
-
-    # ✅ Trừ tín dụng người dùng
-    user_package = UserPackage.query.filter(UserPackage.user_id == user.user_id).first()
-    if user_package:
-        user_package.user_package_credits -= 2
+            processed_url = storage.upload_from_url(
+                storage.CONTAINER_VIDEO_NO_SOUND, f"generated_{uuid.uuid4()}.mp4", output_url, content_type="video/mp4"
+            )
+        except Exception as e:
+            credits.refund(ledger_id)
+            return jsonify({"error": "Không thể tải video từ Replicate!"}), 500
+
+        # ✅ Lưu video vào database
+        new_video = Video(
+            user_id=user_id,
+            video_original_url=image_url if image_url else None,
+            video_processed_url=processed_url
+        )
+        db.session.add(new_video)
         db.session.commit()
+        credits.settle(ledger_id)
 
-    return jsonify({"message": "Video đã tạo thành công!", "processed_video_url": processed_url})
+        return jsonify({"message": "Video đã tạo thành công!", "processed_video_url": processed_url})
 
 # ✅ **API: Lấy danh sách video đã tạo**
 @video01_blueprint.route("/videos", methods=["GET"])
 @jwt_required()
 def get_user_videos():
     user_id = get_jwt_identity()
-    videos = Video.query.filter_by(user_id=user_id).all()
-
-    if not videos:
-        print("❌ Không tìm thấy video nào trong CSDL!")  # Debug xem API có chạy không
-        return jsonify({"videos": []})
+    videos, next_cursor = paginate(Video.query.filter_by(user_id=user_id), Video.video_created_at, Video.video_id)
 
     video_list = [{
         "original_url": vid.video_original_url if vid.video_original_url else "",
         "processed_url": vid.video_processed_url if vid.video_processed_url else ""
     } for vid in videos]
 
-    print(f"✅ Video tải lên: {video_list}")  # Debug danh sách video trả về
-    return jsonify({"videos": video_list})
+    return jsonify({"videos": video_list, "next_cursor": next_cursor})
 
 
 # ✅ **Trang hiển thị giao diện tạo video**
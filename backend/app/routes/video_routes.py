@@ -1,20 +1,13 @@
 from flask import Blueprint, request, jsonify, render_template
 from backend.app.db import db
-from backend.app.models import User, Video, UserPackage
+from backend.app.models import User, Video
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
 import os
 import uuid
-import requests
-import replicate
-from sqlalchemy.sql import func
 from io import BytesIO
-
-# 🔹 Cấu hình Azure Storage
-AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-CONTAINER_NAME_UPLOADS = "user-uploads-video"  # 🔹 Video do người dùng tải lên
-CONTAINER_NAME_PROCESSED = "video-sound"  # 🔹 Video đã xử lý có âm thanh
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+from backend.app import predictions
+from backend.app import credits
+from backend.app import storage
 
 # 🔹 API Token của Replicate
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
@@ -38,11 +31,8 @@ def upload_video():
     # Tạo tên file ngẫu nhiên
     blob_name = f"{uuid.uuid4()}.mp4"
 
-    # ✅ Upload video lên Azure Storage (user-uploads-video)
-    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_UPLOADS, blob=blob_name)
-    blob_client.upload_blob(file.read(), overwrite=True)
-
-    video_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_UPLOADS}/{blob_name}"
+    # ✅ Ghi video vào kho lưu trữ (user-uploads-video) theo từng block, không đọc cả file vào RAM
+    video_url = storage.upload_bytes(storage.CONTAINER_VIDEO_UPLOADS, blob_name, file.stream, content_type="video/mp4")
 
     print(f"✅ Video đã tải lên: {video_url}")  # ✅ Debug URL video
 
@@ -61,6 +51,7 @@ def generate_audio():
         return jsonify({"error": "User không tồn tại!"}), 400
 
     video_url = data.get("video_url")  # URL video từ Azure Storage
+    video_id = data.get("video_id")  # Có khi video được tải trực tiếp qua /uploads/commit
     prompt = data.get("prompt", "")
     duration = data.get("duration", 8)
     num_steps = data.get("num_steps", 25)
@@ -70,17 +61,15 @@ def generate_audio():
     if not video_url:
         return jsonify({"error": "Vui lòng tải video lên trước!"}), 400
 
-    # ✅ Kiểm tra tín dụng
-    total_credits = db.session.query(
-        func.coalesce(func.sum(UserPackage.user_package_credits), 0)
-    ).filter(UserPackage.user_id == user.user_id).scalar()
-
-    if total_credits < 2:
+    # ✅ Giữ chỗ tín dụng (kiểm tra và trừ trong cùng một câu lệnh)
+    try:
+        ledger_id = credits.reserve(user.user_id, credits.COST_PER_RUN, "video.generate_audio")
+    except credits.InsufficientCredits:
         return jsonify({"error": "Bạn không đủ tín dụng để tạo âm thanh!"}), 403
 
     # ✅ Gửi video đến API Replicate
     try:
-        output_audio_url = replicate.run(
+        output_audio_url = predictions.first_output(predictions.run(
             "zsxkib/mmaudio:4b9f801a167b1f6cc2db6ba7ffdeb307630bf411841d4e8300e63ca992de0be9",
             input={
                 "seed": -1,
@@ -91,36 +80,33 @@ def generate_audio():
                 "cfg_strength": cfg_strength,
                 "negative_prompt": negative_prompt
             }
-        )
+        ))
 
         if not output_audio_url:
+            credits.refund(ledger_id)
             return jsonify({"error": "Không thể tạo âm thanh từ Replicate!"}), 500
 
-        # ✅ Tải video đã xử lý từ URL kết quả
-        response = requests.get(output_audio_url, timeout=15, stream=True)
-        response.raise_for_status()
-        processed_video_data = response.content
-
-        # ✅ Lưu video đã xử lý vào Azure Storage (video-sound)
-        processed_blob_name = f"processed_{uuid.uuid4()}.mp4"
-        processed_blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME_PROCESSED, blob=processed_blob_name)
-        processed_blob_client.upload_blob(processed_video_data, overwrite=True)
-
-        processed_video_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{CONTAINER_NAME_PROCESSED}/{processed_blob_name}"
-
-        # ✅ Lưu vào database
-        new_video = Video(user_id=user_id, video_original_url=video_url, video_processed_url=processed_video_url)
-        db.session.add(new_video)
+        # ✅ Stream video đã xử lý từ URL kết quả vào kho lưu trữ (video-sound), không đọc cả file vào RAM
+        processed_video_url = storage.upload_from_url(
+            storage.CONTAINER_VIDEO_SOUND, f"processed_{uuid.uuid4()}.mp4", output_audio_url, content_type="video/mp4"
+        )
 
-        # ✅ Trừ tín dụng
-        user_package = UserPackage.query.filter(UserPackage.user_id == user.user_id).first()
-        if user_package:
-            user_package.user_package_credits -= 2
-            db.session.commit()
+        # ✅ Lưu vào database (cập nhật bản ghi đã tạo lúc commit nếu có)
+        video = Video.query.filter_by(video_id=video_id, user_id=user.user_id).first() if video_id else None
+        if video:
+            video.video_processed_url = processed_video_url
+            video.video_status = "completed"
+        else:
+            new_video = Video(user_id=user_id, video_original_url=video_url, video_processed_url=processed_video_url)
+            db.session.add(new_video)
+        db.session.commit()
+        credits.settle(ledger_id)
 
         return jsonify({"message": "Tạo âm thanh thành công!", "processed_video_url": processed_video_url})
 
     except Exception as e:
+        db.session.rollback()
+        credits.refund(ledger_id)
         return jsonify({"error": f"Lỗi kết nối đến Replicate: {str(e)}"}), 500
 
 
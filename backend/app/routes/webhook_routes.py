@@ -0,0 +1,53 @@
+from flask import Blueprint, request, jsonify, current_app
+from backend.app import predictions
+import base64
+import hashlib
+import hmac
+import time
+
+webhook_blueprint = Blueprint("webhooks", __name__)
+
+
+# 🔹 Xác thực chữ ký webhook của Replicate (chuẩn Standard Webhooks)
+def verify_replicate_signature(secret, headers, body):
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+
+    if not webhook_id or not timestamp or not signatures:
+        return False
+
+    # Chống gửi lại webhook cũ (quá 5 phút)
+    try:
+        if abs(time.time() - int(timestamp)) > 300:
+            return False
+    except ValueError:
+        return False
+
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    signed_content = f"{webhook_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed_content, hashlib.sha256).digest()).decode()
+
+    return any(
+        hmac.compare_digest(expected, signature.split(",", 1)[-1])
+        for signature in signatures.split()
+    )
+
+
+# ✅ **Webhook: Replicate gọi khi prediction hoàn tất**
+@webhook_blueprint.route("/replicate", methods=["POST"])
+def replicate_webhook():
+    # ✅ Không có secret thì webhook bị tắt (app tự hỏi Replicate), không nhận payload không ký
+    secret = current_app.config.get("REPLICATE_WEBHOOK_SECRET")
+    if not secret:
+        return jsonify({"error": "Webhook chưa được bật!"}), 404
+    if not verify_replicate_signature(secret, request.headers, request.get_data()):
+        return jsonify({"error": "Chữ ký webhook không hợp lệ!"}), 401
+
+    data = request.get_json(silent=True) or {}
+    if not data.get("id"):
+        return jsonify({"error": "Thiếu id của prediction!"}), 400
+
+    predictions.publish(data)
+
+    return jsonify({"message": "OK"})
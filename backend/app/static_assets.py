@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import time
+from pathlib import Path
+
+try:
+    import brotli  # Tuỳ chọn: có thì tạo thêm bản .br
+except ImportError:
+    brotli = None
+
+# 🔹 Thư mục frontend (tính một lần khi import, không tính lại mỗi request)
+FRONTEND_DIR = Path(__file__).resolve().parents[2] / "frontend"
+DIST_DIR = FRONTEND_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+HISTORY_DIR = DIST_DIR / "manifests"  # Bản sao manifest của từng lần build, `flask prune-assets` dựa vào đây
+ASSET_DIRS = ("css", "js")
+
+# 🔹 Manifest đã build, nạp lười vào bộ nhớ
+_manifest = None
+_dist_index = None
+
+
+def _write_file(path, data):
+    """ Ghi ra file tạm rồi đổi tên: worker đang phục vụ không bao giờ đọc phải file ghi dở """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def build_assets():
+    """ Build thư mục dist: tên file gắn hash nội dung + bản nén gzip/brotli + manifest.json.
+
+    Không xoá bản build cũ: trong lúc deploy cuốn chiếu, trang do worker cũ render vẫn trỏ tới file hash cũ.
+    File mới được ghi cạnh file cũ, manifest.json được thay nguyên khối; dọn file cũ bằng `flask prune-assets`.
+    """
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        for source in sorted((FRONTEND_DIR / asset_dir).rglob("*")):
+            if not source.is_file():
+                continue
+
+            content = source.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            logical_name = source.relative_to(FRONTEND_DIR).as_posix()
+            hashed_name = f"{source.with_suffix('').relative_to(FRONTEND_DIR).as_posix()}.{digest}{source.suffix}"
+
+            # ✅ Cùng tên = cùng nội dung: file đã có từ lần build trước được giữ nguyên
+            target = DIST_DIR / hashed_name
+            if not target.exists():
+                _write_file(target, content)
+
+            brotli_target = target.with_name(target.name + ".br")
+            if brotli is not None and not brotli_target.exists():
+                _write_file(brotli_target, brotli.compress(content, quality=11))
+            gzip_target = target.with_name(target.name + ".gz")
+            if not gzip_target.exists():
+                _write_file(gzip_target, gzip.compress(content, compresslevel=9, mtime=0))
+            encodings = (["br"] if brotli_target.exists() else []) + ["gzip"]
+
+            manifest[logical_name] = {"file": hashed_name, "etag": digest, "encodings": encodings}
+
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    build_id = f"{time.strftime('%Y%m%d%H%M%S')}-{hashlib.sha256(data).hexdigest()[:12]}"
+    _write_file(HISTORY_DIR / f"{build_id}.json", data)
+    _write_file(MANIFEST_PATH, data)
+    return manifest
+
+
+def prune_assets(keep):
+    """ Xoá file của các lần build cũ, chỉ giữ file mà `keep` lần build gần nhất (và manifest hiện tại) dùng.
+    Trả về số file đã xoá.
+    """
+    history = sorted(HISTORY_DIR.glob("*.json"))
+    kept, dropped = history[-max(keep, 1):], history[:-max(keep, 1)]
+
+    referenced = set()
+    for path in kept + ([MANIFEST_PATH] if MANIFEST_PATH.exists() else []):
+        for entry in json.loads(path.read_text()).values():
+            referenced.update((entry["file"], entry["file"] + ".br", entry["file"] + ".gz"))
+
+    removed = 0
+    for asset_dir in ASSET_DIRS:
+        for path in (DIST_DIR / asset_dir).rglob("*"):
+            # Bỏ qua file tạm của một lần build đang chạy song song
+            if path.is_file() and not path.name.startswith(".") and path.relative_to(DIST_DIR).as_posix() not in referenced:
+                path.unlink()
+                removed += 1
+
+    for path in dropped:
+        path.unlink()
+
+    return removed
+
+
+def _load():
+    global _manifest, _dist_index
+
+    if _manifest is None:
+        manifest = json.loads(MANIFEST_PATH.read_text()) if MANIFEST_PATH.exists() else {}
+        # ✅ File của các lần build còn giữ lại (chưa prune) vẫn được phục vụ: trang do worker cũ render không bị 404
+        dist_index = {}
+        for path in sorted(HISTORY_DIR.glob("*.json")):
+            for logical_name, entry in json.loads(path.read_text()).items():
+                dist_index[entry["file"]] = dict(entry, mimetype=mimetypes.guess_type(logical_name)[0] or "application/octet-stream")
+        for logical_name, entry in manifest.items():
+            dist_index[entry["file"]] = dict(entry, mimetype=mimetypes.guess_type(logical_name)[0] or "application/octet-stream")
+        _dist_index = dist_index
+        _manifest = manifest
+
+    return _manifest
+
+
+def asset_url(path):
+    """ URL có hash cho template; chưa build thì trả về file gốc """
+    entry = _load().get(path)
+    if entry:
+        return f"/frontend/dist/{entry['file']}"
+    return f"/frontend/{path}"
+
+
+def dist_entry(hashed_name):
+    """ Thông tin (etag, encodings, mimetype) của file đã build, None nếu không có """
+    _load()
+    return _dist_index.get(hashed_name)
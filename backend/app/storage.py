@@ -0,0 +1,306 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import quote, unquote, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from backend.app import http_client
+from flask import current_app
+from backend.app.transfer import stream_url_to_blob
+
+# 🔹 Container (thư mục) theo loại file, khai báo một chỗ thay vì rải rác trong từng route
+CONTAINER_ORIGINALS = "user-uploads"  # Ảnh gốc người dùng tải lên
+CONTAINER_RESTORED = "restored-images"  # GFPGAN
+CONTAINER_ENHANCED = "enhanced-images"  # Real-ESRGAN
+CONTAINER_COLORIZED = "color-image"  # DeOldify
+CONTAINER_OBJECT_REMOVED = "object-removed-images"  # LaMa
+CONTAINER_SD = "stable-diffusion-3-5-large"
+CONTAINER_SDXL = "sdxl-lightning-4step"
+CONTAINER_VIDEO_UPLOADS = "user-uploads-video"  # Video người dùng tải lên
+CONTAINER_VIDEO_SOUND = "video-sound"  # Video đã thêm âm thanh
+CONTAINER_VIDEO_NO_SOUND = "video-no-sound"  # Video tạo từ prompt / ảnh
+
+_lock = threading.Lock()
+
+
+class BlobExists(Exception):
+    """ Ghi với overwrite=False nhưng file đã tồn tại """
+
+
+class BlobNotFound(Exception):
+    """ File không tồn tại """
+
+
+# ============================
+# ✅ Azure Blob Storage
+# ============================
+class AzureBackend:
+    """ Một BlobServiceClient cho cả tiến trình, pool kết nối và kích thước block / chunk chỉnh ở config của app.
+    SDK Azure chỉ được import khi backend được tạo (lần dùng đầu), không làm chậm lúc khởi động worker.
+    """
+
+    def __init__(self, config):
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.storage.blob import BlobServiceClient
+
+        self.config = config
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config["STORAGE_POOL_MAXSIZE"])
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        self.client = BlobServiceClient.from_connection_string(
+            config["AZURE_STORAGE_CONNECTION_STRING"],
+            transport=RequestsTransport(session=session, session_owner=False),
+            max_single_put_size=config["STORAGE_MAX_SINGLE_PUT_SIZE"],
+            max_block_size=config["BLOB_BLOCK_SIZE"],
+            max_single_get_size=config["STORAGE_MAX_SINGLE_GET_SIZE"],
+            max_chunk_get_size=config["STORAGE_DOWNLOAD_CHUNK_SIZE"]
+        )
+        # URL gốc lấy từ client nên cả Azure thật lẫn Azurite / fake_blob (dạng đường dẫn) đều đúng
+        self.base_url = (config["STORAGE_PUBLIC_URL"] or self.client.url).rstrip("/")
+
+    def _blob(self, container, blob_name):
+        return self.client.get_blob_client(container=container, blob=blob_name)
+
+    def upload_bytes(self, container, blob_name, data, content_type, cache_control, overwrite):
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+
+        try:
+            self._blob(container, blob_name).upload_blob(
+                data,
+                overwrite=overwrite,
+                max_concurrency=self.config["STORAGE_UPLOAD_CONCURRENCY"],
+                content_settings=ContentSettings(content_type=content_type, cache_control=cache_control)
+            )
+        except ResourceExistsError:
+            raise BlobExists(blob_name)
+
+    def upload_from_url(self, container, blob_name, source_url, headers, content_type):
+        stream_url_to_blob(source_url, self._blob(container, blob_name), headers=headers, content_type=content_type)
+
+    def download(self, container, blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self._blob(container, blob_name).download_blob(max_concurrency=self.config["STORAGE_UPLOAD_CONCURRENCY"]).readall()
+        except ResourceNotFoundError:
+            raise BlobNotFound(blob_name)
+
+    def size(self, container, blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self._blob(container, blob_name).get_blob_properties().size
+        except ResourceNotFoundError:
+            raise BlobNotFound(blob_name)
+
+    def delete(self, container, blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            self._blob(container, blob_name).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    def copy(self, container, blob_name, target_container, target_blob_name):
+        from azure.core.exceptions import ResourceNotFoundError
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        account_key = getattr(self.client.credential, "account_key", None)
+        if not account_key:
+            self.upload_bytes(target_container, target_blob_name, self.download(container, blob_name), None, None, True)
+            return
+
+        # Put Blob From URL chép đồng bộ trong Azure; nguồn được đọc qua SAS chỉ-đọc vài phút
+        source = self._blob(container, blob_name)
+        sas_token = generate_blob_sas(
+            account_name=self.client.account_name,
+            container_name=container,
+            blob_name=blob_name,
+            account_key=account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.utcnow() + timedelta(minutes=5)
+        )
+        try:
+            self._blob(target_container, target_blob_name).upload_blob_from_url(f"{source.url}?{sas_token}", overwrite=True)
+        except ResourceNotFoundError:
+            raise BlobNotFound(blob_name)
+
+    def sas_upload_url(self, container, blob_name, expires_at):
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        account_key = getattr(self.client.credential, "account_key", None)
+        if not account_key:
+            return None
+
+        sas_token = generate_blob_sas(
+            account_name=self.client.account_name,
+            container_name=container,
+            blob_name=blob_name,
+            account_key=account_key,
+            permission=BlobSasPermissions(create=True, write=True),
+            expiry=expires_at
+        )
+        # Endpoint của tài khoản, không phải url(): STORAGE_PUBLIC_URL (CDN) không nhận ghi
+        return f"{self._blob(container, blob_name).url}?{sas_token}"
+
+
+# ============================
+# ✅ Thư mục trên đĩa (dev / đo hiệu năng, đặt STORAGE_LOCAL_ROOT trên /dev/shm để chạy hoàn toàn trong RAM)
+# ============================
+class FilesystemBackend:
+    def __init__(self, config):
+        self.config = config
+        self.root = Path(config["STORAGE_LOCAL_ROOT"]).resolve()
+        self.base_url = (config["STORAGE_PUBLIC_URL"] or "http://127.0.0.1:5000/storage").rstrip("/")
+
+    def path(self, container, blob_name):
+        """ Đường dẫn tuyệt đối của file, không cho container / tên blob thoát ra ngoài STORAGE_LOCAL_ROOT (..) """
+        container_dir = (self.root / container).resolve()
+        path = (container_dir / blob_name).resolve()
+        if container_dir.parent != self.root or container_dir not in path.parents:
+            raise BlobNotFound(blob_name)
+        return path
+
+    def _write(self, path, write):
+        """ Ghi ra file tạm rồi đổi tên, người đọc không bao giờ thấy file ghi dở """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as output:
+                write(output)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def upload_bytes(self, container, blob_name, data, content_type, cache_control, overwrite):
+        path = self.path(container, blob_name)
+        if not overwrite and path.exists():
+            raise BlobExists(blob_name)
+        if hasattr(data, "read"):
+            self._write(path, lambda output: shutil.copyfileobj(data, output, self.config["BLOB_BLOCK_SIZE"]))
+        else:
+            self._write(path, lambda output: output.write(data))
+
+    def upload_from_url(self, container, blob_name, source_url, headers, content_type):
+        def write(output):
+            with http_client.get(source_url, headers=headers, stream=True, timeout=(self.config["HTTP_CONNECT_TIMEOUT"], self.config["HTTP_READ_TIMEOUT"])) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=self.config["HTTP_CHUNK_SIZE"]):
+                    output.write(chunk)
+
+        self._write(self.path(container, blob_name), write)
+
+    def download(self, container, blob_name):
+        try:
+            return self.path(container, blob_name).read_bytes()
+        except FileNotFoundError:
+            raise BlobNotFound(blob_name)
+
+    def size(self, container, blob_name):
+        try:
+            return self.path(container, blob_name).stat().st_size
+        except FileNotFoundError:
+            raise BlobNotFound(blob_name)
+
+    def delete(self, container, blob_name):
+        self.path(container, blob_name).unlink(missing_ok=True)
+
+    def copy(self, container, blob_name, target_container, target_blob_name):
+        def write(output):
+            with self.path(container, blob_name).open("rb") as source:
+                shutil.copyfileobj(source, output, self.config["BLOB_BLOCK_SIZE"])
+
+        try:
+            self._write(self.path(target_container, target_blob_name), write)
+        except FileNotFoundError:
+            raise BlobNotFound(blob_name)
+
+    def sas_upload_url(self, container, blob_name, expires_at):
+        return None  # Không có URL ký sẵn -> client quay về upload qua server
+
+
+BACKENDS = {"azure": AzureBackend, "filesystem": FilesystemBackend}
+
+
+def backend():
+    """ Backend của app hiện tại, tạo lười từ current_app.config (config truyền vào create_app được tôn trọng)
+    và lưu trong app.extensions; tạo lại sau fork để không dùng chung socket giữa các worker
+    """
+    app = current_app._get_current_object()
+    entry = app.extensions.get("storage")
+
+    if entry is None or entry[1] != os.getpid():
+        with _lock:
+            entry = app.extensions.get("storage")
+            if entry is None or entry[1] != os.getpid():
+                entry = (BACKENDS[app.config["STORAGE_BACKEND"]](app.config), os.getpid())
+                app.extensions["storage"] = entry
+
+    return entry[0]
+
+
+# ============================
+# ✅ API dùng chung cho routes / tác vụ nền
+# ============================
+def url(container, blob_name):
+    """ URL công khai của file (nơi duy nhất tạo URL lưu trữ) """
+    return f"{backend().base_url}/{container}/{quote(blob_name, safe='/~')}"
+
+
+def split_url(file_url):
+    """ URL do url() tạo ra -> (container, blob_name) """
+    base_url = backend().base_url
+    if file_url.startswith(base_url + "/"):
+        path = file_url[len(base_url) + 1:]
+    else:
+        # URL cũ dạng https://<account>.blob.core.windows.net/<container>/<blob>
+        path = urlparse(file_url).path.lstrip("/")
+    container, _, blob_name = unquote(path.split("?", 1)[0]).partition("/")
+    return container, blob_name
+
+
+def upload_bytes(container, blob_name, data, content_type=None, cache_control=None, overwrite=True):
+    """ Ghi bytes (hoặc file-like) và trả về URL; overwrite=False + đã tồn tại -> BlobExists """
+    backend().upload_bytes(container, blob_name, data, content_type, cache_control, overwrite)
+    return url(container, blob_name)
+
+
+def upload_from_url(container, blob_name, source_url, headers=None, content_type=None):
+    """ Chuyển kết quả từ URL (Replicate) vào kho lưu trữ theo từng block, trả về URL """
+    backend().upload_from_url(container, blob_name, source_url, headers, content_type)
+    return url(container, blob_name)
+
+
+def download(container, blob_name):
+    return backend().download(container, blob_name)
+
+
+def download_url(file_url):
+    return download(*split_url(file_url))
+
+
+def size(container, blob_name):
+    """ Dung lượng file (byte), không có -> BlobNotFound """
+    return backend().size(container, blob_name)
+
+
+def delete(container, blob_name):
+    backend().delete(container, blob_name)
+
+
+def copy(container, blob_name, target_container, target_blob_name):
+    """ Chép file sang tên khác (ghi đè nếu có), trả về URL bản chép; nguồn không có -> BlobNotFound """
+    backend().copy(container, blob_name, target_container, target_blob_name)
+    return url(target_container, target_blob_name)
+
+
+def sas_upload_url(container, blob_name, expires_at):
+    """ URL cho trình duyệt tải thẳng lên, None nếu backend không hỗ trợ """
+    return backend().sas_upload_url(container, blob_name, expires_at)
@@ -0,0 +1,48 @@
+from backend.app import http_client
+from flask import current_app
+
+
+def stream_url_to_blob(url, blob_client, headers=None, content_type=None, timeout=None):
+    """ Chuyển kết quả từ URL (Replicate) sang Azure Blob theo từng block.
+
+    Chỉ giữ tối đa một block (`BLOB_BLOCK_SIZE`) trong bộ nhớ nên RAM của worker
+    không phụ thuộc vào kích thước file (video, ảnh upscale 4x...).
+    Trả về tổng số byte đã chuyển.
+    """
+    from azure.storage.blob import BlobBlock, ContentSettings
+
+    config = current_app.config
+    block_size = config["BLOB_BLOCK_SIZE"]
+    block_ids = []
+    buffer = bytearray()
+    total = 0
+
+    with http_client.get(url, headers=headers, stream=True, timeout=timeout or (config["HTTP_CONNECT_TIMEOUT"], config["HTTP_READ_TIMEOUT"])) as response:
+        response.raise_for_status()
+        content_type = content_type or response.headers.get("Content-Type")
+
+        for chunk in response.iter_content(chunk_size=config["HTTP_CHUNK_SIZE"]):
+            buffer += chunk
+            total += len(chunk)
+
+            while len(buffer) >= block_size:
+                _stage_block(blob_client, block_ids, bytes(buffer[:block_size]))
+                del buffer[:block_size]
+
+    # Block cuối (hoặc file rỗng)
+    if buffer or not block_ids:
+        _stage_block(blob_client, block_ids, bytes(buffer))
+
+    blob_client.commit_block_list(
+        [BlobBlock(block_id=block_id) for block_id in block_ids],
+        content_settings=ContentSettings(content_type=content_type) if content_type else None
+    )
+
+    return total
+
+
+def _stage_block(blob_client, block_ids, data):
+    # Azure yêu cầu mọi block id của một blob có cùng độ dài
+    block_id = f"{len(block_ids):06d}"
+    blob_client.stage_block(block_id=block_id, data=data)
+    block_ids.append(block_id)
@@ -0,0 +1,77 @@
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from backend.app.db import db
+from backend.app.models import Image, Upload
+from backend.app import derivatives
+from backend.app import storage
+
+# 🔹 Loại file tải qua URL SAS -> (container, đuôi file, khoá cấu hình dung lượng tối đa)
+UPLOAD_KINDS = {
+    "image": (storage.CONTAINER_ORIGINALS, "jpg", "UPLOAD_MAX_IMAGE_BYTES"),
+    "video": (storage.CONTAINER_VIDEO_UPLOADS, "mp4", "UPLOAD_MAX_VIDEO_BYTES")
+}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_image_upload(user_id, image_data, create_row=True):
+    """ Lưu ảnh (đã chuẩn hoá) theo địa chỉ nội dung và trả về (Image | None, URL).
+
+    - Cùng user tải lại cùng ảnh -> dùng lại bản ghi Image cũ, không ghi gì thêm. Hai lần tải song song
+      cùng vượt qua bước tìm thì index unique (migration 0012) chặn bản ghi thứ hai và trả về bản ghi đầu.
+    - Blob được đặt tên theo SHA-256 nên cùng nội dung chỉ lưu một lần trong kho lưu trữ.
+    """
+    digest = content_hash(image_data)
+
+    if create_row:
+        existing = Image.query.filter_by(user_id=user_id, image_content_hash=digest).first()
+        if existing:
+            return existing, existing.image_original_url
+
+    blob_name = f"sha256/{digest}.jpg"
+    try:
+        storage.upload_bytes(storage.CONTAINER_ORIGINALS, blob_name, image_data, content_type="image/jpeg", overwrite=False)
+    except storage.BlobExists:
+        pass  # ✅ Blob đã tồn tại với đúng nội dung này, dùng lại
+
+    image_url = storage.url(storage.CONTAINER_ORIGINALS, blob_name)
+
+    if not create_row:
+        return None, image_url
+
+    new_image = Image(user_id=user_id, image_original_url=image_url, image_content_hash=digest)
+    derivatives.attach(new_image, "original", derivatives.generate_for_url(image_url, image_data))
+    db.session.add(new_image)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        existing = Image.query.filter_by(user_id=user_id, image_content_hash=digest).first()
+        if not existing:
+            raise
+        return existing, existing.image_original_url
+
+    return new_image, image_url
+
+
+def cleanup_stale_uploads(max_age):
+    """ Dọn bảng uploads: sau `max_age` giây (lớn hơn UPLOAD_SAS_TTL) blob tạm của mọi bản ghi bị xoá khỏi kho lưu trữ.
+
+    Blob của bản ghi đã commit / bị từ chối đã được xoá lúc commit, nhưng URL SAS còn hạn có thể tạo lại nó nên
+    vẫn xoá thêm lần nữa; bản ghi chỉ còn để chặn commit lần hai nên cũng được xoá. Trả về số file chưa commit đã xoá.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    stale = Upload.query.filter(Upload.upload_created_at < cutoff).all()
+
+    removed = 0
+    for upload in stale:
+        storage.delete(UPLOAD_KINDS[upload.upload_kind][0], upload.upload_blob_name)
+        if upload.upload_status == "pending":
+            removed += 1
+        db.session.delete(upload)
+    db.session.commit()
+
+    return removed
@@ -0,0 +1,82 @@
+""" Đo thời gian chuẩn hoá ảnh tải lên: ingest.transform_image so với resize_image cũ.
+
+Chạy: python -m backend.bench.bench_ingest [--repeat 10]
+Bộ ảnh mẫu được sinh ngẫu nhiên khi chạy (không lưu trong repo).
+"""
+import argparse
+import statistics
+import time
+from io import BytesIO
+from PIL import Image as PILImage
+from backend.app import ingest  # Import package không còn tạo Flask app / kết nối CSDL (xem create_app)
+
+
+def legacy_resize_image(image_data):
+    """ Bản resize_image từng được chép trong gfpgan/esrgan/lama_routes.py """
+    image = PILImage.open(BytesIO(image_data))
+    if image.mode == "RGBA":
+        image = image.convert("RGB")
+
+    max_size = 1024
+    width, height = image.size
+    if width > max_size or height > max_size:
+        if width > height:
+            new_width, new_height = max_size, int((max_size / width) * height)
+        else:
+            new_height, new_width = max_size, int((max_size / height) * width)
+        image = image.resize((new_width, new_height), PILImage.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _photo(width, height):
+    """ Ảnh giả lập ảnh chụp: gradient + nhiễu để JPEG nén giống ảnh thật """
+    gradient = PILImage.linear_gradient("L").resize((width, height))
+    noise = PILImage.effect_noise((width, height), 40)
+    return PILImage.merge("RGB", (gradient, noise, gradient.transpose(PILImage.FLIP_LEFT_RIGHT)))
+
+
+def _encode(image, fmt, **params):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def build_corpus():
+    rotated = _photo(4032, 3024)
+    exif = rotated.getexif()
+    exif[0x0112] = 6  # Orientation: xoay 90° như ảnh chụp dọc trên điện thoại
+
+    return {
+        "jpeg_12mp_phone": _encode(_photo(4032, 3024), "JPEG", quality=92),
+        "jpeg_12mp_exif_rotated": _encode(rotated, "JPEG", quality=92, exif=exif),
+        "jpeg_800px_small": _encode(_photo(800, 600), "JPEG", quality=90),
+        "png_2048_rgba": _encode(_photo(2048, 2048).convert("RGBA"), "PNG"),
+    }
+
+
+def _time(fn, data, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'ảnh':<26}{'cũ (ms)':>10}{'ingest (ms)':>14}{'nhanh hơn':>12}")
+    for name, data in build_corpus().items():
+        legacy_ms = _time(legacy_resize_image, data, args.repeat)
+        ingest_ms = _time(ingest.transform_image, data, args.repeat)
+        print(f"{name:<26}{legacy_ms:>10.1f}{ingest_ms:>14.1f}{legacy_ms / ingest_ms:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+""" Server giả lập Azure Blob Storage (một phần REST API mà app dùng) để chạy tải offline.
+
+Chạy: python -m backend.loadtest.fake_blob --port 10000 --latency-median 0.02
+Trỏ app vào (giống Azurite, tài khoản nằm trong đường dẫn):
+    AZURE_STORAGE_CONNECTION_STRING="DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey=ZmFrZQ==;BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+
+Hỗ trợ: tạo container, Put Blob (kể cả If-None-Match: *), Put Block / Put Block List, Get Blob (có Range),
+Get Blob Properties (HEAD), Delete Blob. Không kiểm tra chữ ký; container được tạo tự động khi ghi blob.
+Lỗi giả lập trả về 503 ServerBusy để SDK tự thử lại như với Azure thật.
+"""
+import argparse
+import hashlib
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from backend.loadtest.profiles import Profile, add_arguments
+
+API_VERSION = "2021-08-06"
+RANGE_HEADER = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+
+class FakeBlobStore:
+    def __init__(self, profile):
+        self.profile = profile
+        self.containers = set()
+        self.blobs = {}  # (container, blob) -> {"data", "content_type", "cache_control", "etag", "modified"}
+        self.blocks = {}  # (container, blob) -> {block_id: bytes} chưa commit
+        self.lock = threading.Lock()
+
+    def put(self, key, data, content_type, cache_control):
+        blob = {
+            "data": data,
+            "content_type": content_type or "application/octet-stream",
+            "cache_control": cache_control,
+            "etag": f"\"0x{hashlib.md5(data + uuid.uuid4().bytes).hexdigest()[:16].upper()}\"",
+            "modified": formatdate(usegmt=True)
+        }
+        with self.lock:
+            self.containers.add(key[0])
+            self.blobs[key] = blob
+            self.blocks.pop(key, None)
+        return blob
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---------- Tiện ích ----------
+    def _parse(self):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        # /<account>/<container>/<blob...>
+        segments = unquote(parts.path).lstrip("/").split("/", 2)
+        container = segments[1] if len(segments) > 1 else None
+        blob = segments[2] if len(segments) > 2 else None
+        return container, blob, query
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _respond(self, status, headers=None, body=b""):
+        self.send_response(status)
+        self.send_header("x-ms-request-id", str(uuid.uuid4()))
+        self.send_header("x-ms-version", API_VERSION)
+        self.send_header("Date", formatdate(usegmt=True))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if "Content-Length" not in (headers or {}):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status, code, message=""):
+        body = f"<?xml version=\"1.0\" encoding=\"utf-8\"?><Error><Code>{code}</Code><Message>{message or code}</Message></Error>".encode()
+        self._respond(status, {"x-ms-error-code": code, "Content-Type": "application/xml"}, body if self.command != "HEAD" else b"")
+
+    def _simulate(self):
+        """ Trễ + lỗi theo profile; True nếu request đã bị trả lỗi """
+        delay, _ = self.server.store.profile.latency()
+        if delay:
+            time.sleep(delay)
+        if self.server.store.profile.fails():
+            self._body()
+            self._error(503, "ServerBusy", "Fake blob failure")
+            return True
+        return False
+
+    def _blob_headers(self, blob):
+        headers = {
+            "ETag": blob["etag"],
+            "Last-Modified": blob["modified"],
+            "x-ms-creation-time": blob["modified"],
+            "x-ms-blob-type": "BlockBlob",
+            "x-ms-server-encrypted": "true",
+            "Accept-Ranges": "bytes",
+            "Content-Type": blob["content_type"]
+        }
+        if blob["cache_control"]:
+            headers["Cache-Control"] = blob["cache_control"]
+        return headers
+
+    # ---------- REST ----------
+    def do_PUT(self):
+        if self._simulate():
+            return
+
+        container, blob_name, query = self._parse()
+        store = self.server.store
+        data = self._body()
+
+        if query.get("restype") == "container" and blob_name is None:
+            with store.lock:
+                if container in store.containers:
+                    return self._error(409, "ContainerAlreadyExists")
+                store.containers.add(container)
+            return self._respond(201, {"ETag": "\"0x1\"", "Last-Modified": formatdate(usegmt=True)})
+
+        key = (container, blob_name)
+        comp = query.get("comp")
+
+        if comp == "block":
+            with store.lock:
+                store.blocks.setdefault(key, {})[query.get("blockid")] = data
+            return self._respond(201, {"x-ms-request-server-encrypted": "true"})
+
+        if comp == "blocklist":
+            ids = [element.text for element in ElementTree.fromstring(data)]
+            with store.lock:
+                staged = store.blocks.get(key, {})
+            # App chỉ commit các block vừa stage (không tham chiếu block đã commit trước đó)
+            if any(block_id not in staged for block_id in ids):
+                return self._error(400, "InvalidBlockList")
+            blob = store.put(
+                key,
+                b"".join(staged[block_id] for block_id in ids),
+                self.headers.get("x-ms-blob-content-type"),
+                self.headers.get("x-ms-blob-cache-control")
+            )
+            return self._respond(201, {"ETag": blob["etag"], "Last-Modified": blob["modified"], "x-ms-request-server-encrypted": "true"})
+
+        if comp is None:
+            if self.headers.get("If-None-Match") == "*" and key in store.blobs:
+                return self._error(409, "BlobAlreadyExists", "The specified blob already exists.")
+            blob = store.put(
+                key,
+                data,
+                self.headers.get("x-ms-blob-content-type") or self.headers.get("Content-Type"),
+                self.headers.get("x-ms-blob-cache-control")
+            )
+            return self._respond(201, {"ETag": blob["etag"], "Last-Modified": blob["modified"], "x-ms-request-server-encrypted": "true"})
+
+        self._error(400, "UnsupportedQueryParameter")
+
+    def do_GET(self):
+        if self._simulate():
+            return
+
+        container, blob_name, _ = self._parse()
+        blob = self.server.store.blobs.get((container, blob_name))
+        if blob is None:
+            return self._error(404, "BlobNotFound", "The specified blob does not exist.")
+
+        data = blob["data"]
+        headers = self._blob_headers(blob)
+        match = RANGE_HEADER.match(self.headers.get("x-ms-range") or self.headers.get("Range") or "")
+
+        if not match:
+            return self._respond(200, headers, data)
+
+        start = int(match.group(1))
+        if start >= len(data):
+            return self._error(416, "InvalidRange", "The range specified is invalid for the current size of the resource.")
+        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        self._respond(206, headers, data[start:end + 1])
+
+    def do_HEAD(self):
+        if self._simulate():
+            return
+
+        container, blob_name, _ = self._parse()
+        blob = self.server.store.blobs.get((container, blob_name))
+        if blob is None:
+            return self._error(404, "BlobNotFound")
+
+        headers = self._blob_headers(blob)
+        headers["Content-Length"] = str(len(blob["data"]))
+        self._respond(200, headers)
+
+    def do_DELETE(self):
+        if self._simulate():
+            return
+
+        container, blob_name, _ = self._parse()
+        with self.server.store.lock:
+            blob = self.server.store.blobs.pop((container, blob_name), None)
+        if blob is None:
+            return self._error(404, "BlobNotFound")
+        self._respond(202, {"x-ms-delete-type-permanent": "true"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server giả lập Azure Blob Storage")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10000)
+    add_arguments(parser, latency_median=0.02)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.store = FakeBlobStore(Profile.from_args(args))
+
+    print(f"✅ Fake Blob Storage đang chạy tại http://{args.host}:{args.port}/devstoreaccount1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+""" Server giả lập Replicate API để chạy tải offline.
+
+Chạy: python -m backend.loadtest.fake_replicate --port 8001 --latency-median 4 --cold-start-rate 0.1 --cold-start-seconds 20
+Trỏ app vào: REPLICATE_API_URL=http://127.0.0.1:8001/v1
+             REPLICATE_WEBHOOK_URL=http://127.0.0.1:5000/webhooks/replicate (bỏ trống để app tự hỏi trạng thái)
+             REPLICATE_WEBHOOK_SECRET trùng --webhook-secret (app bỏ qua webhook nếu thiếu secret)
+
+- POST /v1/predictions, POST /v1/models/<owner>/<name>/predictions: tạo prediction, kết thúc sau thời gian lấy mẫu.
+- GET /v1/predictions/<id>: trạng thái hiện tại.
+- POST /v1/predictions/<id>/cancel: huỷ prediction chưa xong (không gọi webhook, giống Replicate khi lọc "completed").
+- Khi kết thúc: gọi webhook của prediction (ký theo Standard Webhooks nếu có --webhook-secret).
+- GET /outputs/<id>.<ext>: file kết quả (JPEG thật để app tạo được ảnh thu nhỏ; video là bytes giả).
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit
+from backend.loadtest.profiles import Profile, add_arguments
+
+MODEL_PREDICTIONS_PATH = re.compile(r"^/v1/models/[^/]+/[^/]+/predictions$")
+PREDICTION_PATH = re.compile(r"^/v1/predictions/([0-9a-f]+)$")
+CANCEL_PATH = re.compile(r"^/v1/predictions/([0-9a-f]+)/cancel$")
+OUTPUT_PATH = re.compile(r"^/outputs/([0-9a-f]+)\.(jpg|mp4)$")
+
+
+def sample_image(size):
+    """ Ảnh JPEG mẫu (Pillow có sẵn trong môi trường của app); không có Pillow thì trả bytes giả """
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        return b"\xff\xd8\xff\xd9"
+
+    image = PILImage.new("RGB", (size, size))
+    image.putdata([(x * 255 // size, y * 255 // size, 128) for y in range(size) for x in range(size)])
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class FakeReplicate:
+    def __init__(self, profile, webhook_secret=None, image_size=512, video_bytes=1024 * 1024):
+        self.profile = profile
+        self.webhook_secret = webhook_secret
+        self.outputs = {"jpg": sample_image(image_size), "mp4": b"\x00" * video_bytes}
+        self.predictions = {}
+        self.lock = threading.Lock()
+
+    def create(self, body, base_url):
+        prediction_id = uuid.uuid4().hex
+        model_input = body.get("input") or {}
+        delay, cold = self.profile.latency()
+        prediction = {
+            "id": prediction_id,
+            "version": body.get("version"),
+            "input": model_input,
+            "status": "starting",
+            "output": None,
+            "error": None,
+            "logs": "cold start\n" if cold else "",
+            "urls": {
+                "get": f"{base_url}/v1/predictions/{prediction_id}",
+                "cancel": f"{base_url}/v1/predictions/{prediction_id}/cancel"
+            },
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        }
+
+        with self.lock:
+            self.predictions[prediction_id] = prediction
+
+        timer = threading.Timer(delay, self.complete, args=(prediction_id, base_url, body.get("webhook")))
+        timer.daemon = True
+        timer.start()
+
+        return dict(prediction)
+
+    def complete(self, prediction_id, base_url, webhook_url):
+        with self.lock:
+            prediction = self.predictions[prediction_id]
+            if prediction["status"] == "canceled":
+                return
+            if self.profile.fails():
+                prediction.update(status="failed", error="Fake prediction failure")
+            else:
+                model_input = prediction["input"]
+                ext = "mp4" if "video" in model_input or "prompt_optimizer" in model_input else "jpg"
+                url = f"{base_url}/outputs/{prediction_id}.{ext}"
+                # Model sinh nhiều ảnh (SDXL) trả về danh sách URL
+                count = model_input.get("num_outputs")
+                prediction["output"] = [url] * int(count) if count else url
+                prediction["status"] = "succeeded"
+            payload = dict(prediction)
+
+        if webhook_url:
+            self.send_webhook(webhook_url, payload)
+
+    def send_webhook(self, url, payload):
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+
+        if self.webhook_secret:
+            webhook_id = f"msg_{uuid.uuid4().hex}"
+            timestamp = str(int(time.time()))
+            secret = self.webhook_secret
+            key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+            signature = base64.b64encode(hmac.new(key, f"{webhook_id}.{timestamp}.".encode() + body, hashlib.sha256).digest()).decode()
+            headers.update({"webhook-id": webhook_id, "webhook-timestamp": timestamp, "webhook-signature": f"v1,{signature}"})
+
+        try:
+            urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers, method="POST"), timeout=10).close()
+        except Exception as e:
+            print(f"⚠️ Gửi webhook {payload['id']} thất bại: {e}")
+
+    def cancel(self, prediction_id):
+        with self.lock:
+            prediction = self.predictions.get(prediction_id)
+            if prediction is None:
+                return None
+            if prediction["status"] in ("starting", "processing"):
+                prediction["status"] = "canceled"
+            return dict(prediction)
+
+    def get(self, prediction_id):
+        with self.lock:
+            prediction = self.predictions.get(prediction_id)
+            return dict(prediction) if prediction else None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Giữ kết nối keep-alive như Replicate thật
+
+    def log_message(self, format, *args):
+        pass
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, status, data):
+        self._send(status, json.dumps(data).encode())
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        if path == "/v1/predictions" or MODEL_PREDICTIONS_PATH.match(path):
+            return self._json(201, self.server.fake.create(json.loads(body or b"{}"), self._base_url()))
+
+        match = CANCEL_PATH.match(path)
+        if match:
+            prediction = self.server.fake.cancel(match.group(1))
+            return self._json(200, prediction) if prediction else self._json(404, {"detail": "Not found"})
+
+        self._json(404, {"detail": "Not found"})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+
+        match = PREDICTION_PATH.match(path)
+        if match:
+            prediction = self.server.fake.get(match.group(1))
+            return self._json(200, prediction) if prediction else self._json(404, {"detail": "Not found"})
+
+        match = OUTPUT_PATH.match(path)
+        if match:
+            content_type = "video/mp4" if match.group(2) == "mp4" else "image/jpeg"
+            return self._send(200, self.server.fake.outputs[match.group(2)], content_type)
+
+        self._json(404, {"detail": "Not found"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server giả lập Replicate")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--webhook-secret", default=None, help="Trùng REPLICATE_WEBHOOK_SECRET của app")
+    parser.add_argument("--image-size", type=int, default=512, help="Cạnh của ảnh kết quả mẫu (px)")
+    parser.add_argument("--video-bytes", type=int, default=1024 * 1024, help="Dung lượng video kết quả mẫu")
+    add_arguments(parser, latency_median=4.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.fake = FakeReplicate(Profile.from_args(args), args.webhook_secret, args.image_size, args.video_bytes)
+
+    print(f"✅ Fake Replicate đang chạy tại http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+""" Chạy tải các API xử lý ảnh / video, báo cáo p50/p95/p99, thông lượng và độ bão hoà worker.
+
+Chạy (app trỏ vào fake_replicate + fake_blob, xem docstring của hai module đó; hoặc bỏ fake_blob và đặt
+STORAGE_BACKEND=filesystem STORAGE_LOCAL_ROOT=/dev/shm/storage để lưu file hoàn toàn trong RAM):
+    python -m backend.loadtest.harness --base-url http://127.0.0.1:5000 --username load --password secret \\
+        --scenarios gfpgan,esrgan,colorize,lama,sd,sdxl,video,video01 --concurrency 16 --duration 60
+
+- Mỗi người dùng ảo lần lượt chạy trọn từng kịch bản (upload -> xử lý -> chờ /jobs/<id> nếu là tác vụ nền).
+- Ảnh, mask và prompt được sinh mới mỗi vòng để không trúng bộ nhớ kết quả (result_cache).
+- Tài khoản admin: lấy mẫu /admin/metrics mỗi giây để đo độ bão hoà pool tác vụ (jobs) và pool CPU.
+- Tài khoản cần đủ tín dụng; 403 / 503 được tính là lỗi và đếm riêng theo mã.
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from io import BytesIO
+import requests
+from PIL import Image as PILImage, ImageDraw
+
+
+class ScenarioError(Exception):
+    """ Một bước của kịch bản trả về lỗi """
+
+
+class Recorder:
+    """ Gom thời gian theo tên (kịch bản hoặc endpoint), an toàn giữa các luồng """
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # tên -> [giây] của lần thành công
+        self.errors = defaultdict(lambda: defaultdict(int))  # tên -> {mã lỗi: số lần}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, error=None):
+        with self.lock:
+            if error is None:
+                self.samples[name].append(seconds)
+            else:
+                self.errors[name][error] += 1
+
+    def names(self):
+        with self.lock:
+            return sorted(set(self.samples) | set(self.errors))
+
+
+def percentile(sorted_values, fraction):
+    """ Phân vị theo thứ hạng gần nhất """
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+# ============================
+# ✅ Dữ liệu đầu vào (mới mỗi vòng)
+# ============================
+def random_jpeg(width=320, height=240):
+    image = PILImage.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def random_mask(width=320, height=240):
+    mask = PILImage.new("RGBA", (width, height), (0, 0, 0, 0))
+    x, y = int.from_bytes(os.urandom(2), "big") % (width - 40), int.from_bytes(os.urandom(2), "big") % (height - 40)
+    ImageDraw.Draw(mask).rectangle((x, y, x + 40, y + 40), fill=(255, 255, 255, 255))
+    buffer = BytesIO()
+    mask.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def unique_prompt():
+    return f"a quiet harbour at dawn, load test {uuid.uuid4().hex[:8]}"
+
+
+# ============================
+# ✅ Kịch bản
+# ============================
+class Client:
+    def __init__(self, base_url, cookies, recorder, poll_interval, job_timeout):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()  # Mỗi người dùng ảo một pool kết nối như trình duyệt
+        self.session.cookies.update(cookies)
+        self.recorder = recorder
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+
+    def call(self, method, path, name=None, **kwargs):
+        name = name or f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=600, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(name, time.perf_counter() - started, type(e).__name__)
+            raise ScenarioError(f"{name}: {e}")
+
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            self.recorder.record(name, elapsed, str(response.status_code))
+            raise ScenarioError(f"{name}: {response.status_code} {response.text[:200]}")
+
+        self.recorder.record(name, elapsed)
+        return response.json()
+
+    def upload_image(self, tool):
+        return self.call("POST", f"/{tool}/upload", files={"image": ("load.jpg", random_jpeg(), "image/jpeg")})
+
+    def finish(self, data):
+        """ Tác vụ nền (202 + job_id) -> hỏi /jobs/<id> tới khi xong """
+        job_id = data.get("job_id")
+        if not job_id:
+            return data
+
+        deadline = time.monotonic() + self.job_timeout
+        while time.monotonic() < deadline:
+            job = self.call("GET", f"/jobs/{job_id}", name="GET /jobs/<id>")
+            if job["status"] == "succeeded":
+                return job["result"]
+            if job["status"] == "failed":
+                raise ScenarioError(f"Tác vụ {job_id} thất bại: {job.get('error')}")
+            time.sleep(self.poll_interval)
+
+        raise ScenarioError(f"Tác vụ {job_id} quá {self.job_timeout}s")
+
+
+def scenario_gfpgan(client):
+    image = client.upload_image("gfpgan")
+    client.finish(client.call("POST", "/gfpgan/restore", json={"image_id": image["image_id"]}))
+
+
+def scenario_esrgan(client):
+    image = client.upload_image("esrgan")
+    client.finish(client.call("POST", "/esrgan/enhance", json={"image_id": image["image_id"], "scale": 2}))
+
+
+def scenario_colorize(client):
+    image = client.upload_image("colorize")
+    client.finish(client.call("POST", "/colorize/colorize", json={"image_id": image["image_id"]}))
+
+
+def scenario_lama(client):
+    image = client.upload_image("lama")
+    client.call("POST", "/lama/remove-object", json={"image_id": image["image_id"], "mask_data": random_mask()})
+
+
+def scenario_sd(client):
+    client.call("POST", "/sd/generate", json={"prompt": unique_prompt()})
+
+
+def scenario_sdxl(client):
+    client.call("POST", "/sdxl/generate", json={"prompt": unique_prompt(), "num_outputs": 1, "width": 768, "height": 768})
+
+
+def scenario_video(client):
+    video = client.call("POST", "/video/upload", files={"video": ("load.mp4", os.urandom(256 * 1024), "video/mp4")})
+    client.call("POST", "/video/generate-audio", json={"video_url": video["video_url"], "prompt": unique_prompt()})
+
+
+def scenario_video01(client):
+    client.call("POST", "/video01/generate-video", json={"prompt": unique_prompt()})
+
+
+SCENARIOS = {
+    "gfpgan": scenario_gfpgan,
+    "esrgan": scenario_esrgan,
+    "colorize": scenario_colorize,
+    "lama": scenario_lama,
+    "sd": scenario_sd,
+    "sdxl": scenario_sdxl,
+    "video": scenario_video,
+    "video01": scenario_video01,
+}
+
+
+# ============================
+# ✅ Chạy tải
+# ============================
+def login(base_url, username, password, token):
+    if token:
+        return {"access_token_cookie": token}
+
+    response = requests.post(
+        f"{base_url.rstrip('/')}/auth/login",
+        data={"username": username, "password": password},
+        allow_redirects=False,
+        timeout=30
+    )
+    if "access_token_cookie" not in response.cookies:
+        raise SystemExit("❌ Đăng nhập thất bại, kiểm tra --username / --password")
+    return {"access_token_cookie": response.cookies["access_token_cookie"]}
+
+
+def virtual_user(index, args, cookies, recorder, stop):
+    client = Client(args.base_url, cookies, recorder, args.poll_interval, args.job_timeout)
+    names = args.scenarios
+    turn = index  # Lệch điểm bắt đầu để các kịch bản chạy xen kẽ
+
+    while not stop.is_set():
+        name = names[turn % len(names)]
+        turn += 1
+        started = time.perf_counter()
+        try:
+            SCENARIOS[name](client)
+            recorder.record(f"scenario {name}", time.perf_counter() - started)
+        except ScenarioError:
+            recorder.record(f"scenario {name}", time.perf_counter() - started, "failed")
+
+
+def sample_metrics(args, cookies, samples, stop):
+    """ Lấy mẫu /admin/metrics mỗi giây (chỉ tài khoản admin) """
+    session = requests.Session()
+    session.cookies.update(cookies)
+
+    while not stop.wait(1.0):
+        try:
+            response = session.get(f"{args.base_url.rstrip('/')}/admin/metrics", timeout=5)
+        except requests.RequestException:
+            continue
+        if response.status_code == 403:
+            return
+        if response.ok:
+            samples.append(response.json())
+
+
+def saturation(samples):
+    if not samples:
+        return None
+
+    jobs = [sample["jobs"] for sample in samples if "jobs" in sample]
+    first, last = samples[0], samples[-1]
+    report = {}
+    if jobs:
+        report["jobs_running_mean"] = sum(job["running"] for job in jobs) / len(jobs) / jobs[0]["workers"]
+        report["jobs_running_peak"] = max(job["running"] for job in jobs) / jobs[0]["workers"]
+        report["jobs_in_flight_peak"] = max(job["in_flight"] for job in jobs) / jobs[0]["capacity"]
+        report["jobs_rejected"] = jobs[-1]["rejected"] - jobs[0]["rejected"]
+    for pool in first.get("cpu_pool", {}):
+        report[f"cpu_pool_{pool}_rejected"] = last["cpu_pool"][pool]["rejected"] - first["cpu_pool"][pool]["rejected"]
+        report[f"cpu_pool_{pool}_timeouts"] = last["cpu_pool"][pool]["timeouts"] - first["cpu_pool"][pool]["timeouts"]
+    return report
+
+
+def summarize(recorder, elapsed, saturation_report):
+    rows = []
+    for name in recorder.names():
+        values = sorted(recorder.samples.get(name, []))
+        errors = dict(recorder.errors.get(name, {}))
+        rows.append({
+            "name": name,
+            "ok": len(values),
+            "errors": errors,
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "max": values[-1] if values else None,
+            "throughput": len(values) / elapsed
+        })
+    return {"elapsed": elapsed, "rows": rows, "saturation": saturation_report}
+
+
+def print_report(summary):
+    def fmt(value):
+        return "-" if value is None else f"{value:.3f}"
+
+    print(f"\n{'Tên':<32} {'OK':>6} {'Lỗi':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'/giây':>8}  Mã lỗi")
+    for row in summary["rows"]:
+        errors = ", ".join(f"{code}×{count}" for code, count in sorted(row["errors"].items()))
+        print(
+            f"{row['name']:<32} {row['ok']:>6} {sum(row['errors'].values()):>6} {fmt(row['p50']):>8} {fmt(row['p95']):>8} "
+            f"{fmt(row['p99']):>8} {fmt(row['max']):>8} {row['throughput']:>8.2f}  {errors}"
+        )
+
+    print(f"\n⏱️ Thời gian chạy: {summary['elapsed']:.1f}s")
+    if summary["saturation"]:
+        print("📈 Độ bão hoà:", json.dumps(summary["saturation"], indent=2))
+    else:
+        print("📈 Không có số liệu bão hoà (cần tài khoản admin để đọc /admin/metrics)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy tải các API xử lý ảnh / video")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--token", help="JWT access token (thay cho --username/--password)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Danh sách kịch bản, cách nhau bằng dấu phẩy")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số người dùng ảo chạy song song")
+    parser.add_argument("--duration", type=float, default=60, help="Thời gian chạy (giây)")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Chu kỳ hỏi /jobs/<id> (giây)")
+    parser.add_argument("--job-timeout", type=float, default=900, help="Thời gian chờ tối đa một tác vụ nền (giây)")
+    parser.add_argument("--json", dest="json_path", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Kịch bản không tồn tại: {', '.join(sorted(unknown))}")
+
+    cookies = login(args.base_url, args.username, args.password, args.token)
+    recorder = Recorder()
+    metrics_samples = []
+    stop = threading.Event()
+
+    threads = [threading.Thread(target=sample_metrics, args=(args, cookies, metrics_samples, stop), daemon=True)]
+    threads += [
+        threading.Thread(target=virtual_user, args=(index, args, cookies, recorder, stop), daemon=True)
+        for index in range(args.concurrency)
+    ]
+
+    print(f"🚀 {args.concurrency} người dùng ảo, {args.duration:.0f}s, kịch bản: {', '.join(args.scenarios)}")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    # Chờ các kịch bản đang dở chạy xong để không cắt cụt phân vị cao
+    for thread in threads[1:]:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(recorder, elapsed, saturation(metrics_samples))
+    print_report(summary)
+
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(summary, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+""" Phân phối độ trễ / lỗi / khởi động nguội dùng chung cho các server giả (fake_replicate, fake_blob). """
+import math
+import random
+import threading
+
+
+class Profile:
+    """ Độ trễ log-normal quanh `latency_median` (giây), thêm `cold_start_seconds` với xác suất `cold_start_rate`,
+    lỗi với xác suất `failure_rate`. `seed` cố định để hai lần chạy tải có cùng chuỗi mẫu.
+    """
+
+    def __init__(self, latency_median, latency_sigma=0.5, failure_rate=0.0, cold_start_rate=0.0, cold_start_seconds=0.0, seed=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.cold_start_rate = cold_start_rate
+        self.cold_start_seconds = cold_start_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            args.latency_median,
+            latency_sigma=args.latency_sigma,
+            failure_rate=args.failure_rate,
+            cold_start_rate=args.cold_start_rate,
+            cold_start_seconds=args.cold_start_seconds,
+            seed=args.seed
+        )
+
+    def latency(self):
+        """ Trả về (số giây, có khởi động nguội không) """
+        with self._lock:
+            seconds = 0.0
+            if self.latency_median > 0:
+                seconds = self._random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+            cold = self._random.random() < self.cold_start_rate
+        return seconds + (self.cold_start_seconds if cold else 0.0), cold
+
+    def fails(self):
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+
+def add_arguments(parser, latency_median):
+    parser.add_argument("--latency-median", type=float, default=latency_median, help="Độ trễ trung vị (giây)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Độ lệch của log-normal (0 = cố định)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Tỉ lệ lỗi (0..1)")
+    parser.add_argument("--cold-start-rate", type=float, default=0.0, help="Tỉ lệ gặp khởi động nguội (0..1)")
+    parser.add_argument("--cold-start-seconds", type=float, default=0.0, help="Thời gian khởi động nguội (giây)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed để lặp lại đúng chuỗi mẫu")
@@ -1,20 +1,16 @@
-// 🖼 Lưu URL ảnh đã tải lên
+// 🖼 Lưu URL và id ảnh đã tải lên
 let uploadedImageUrl = "";
+let uploadedImageId = "";
 
 // ✅ **Hàm tải ảnh lên**
 function uploadImage() {
     let fileInput = document.getElementById("imageUpload");
-    let formData = new FormData();
-    formData.append("image", fileInput.files[0]);
-
-    fetch("/colorize/upload", {
-        method: "POST",
-        body: formData
-    })
-    .then(response => response.json())
+    // ✅ Tải thẳng lên Azure qua URL SAS (quay về /colorize/upload nếu không được)
+    uploadWithFallback(fileInput.files[0], "image", "/colorize/upload", { maxSize: 1024 })
     .then(data => {
         if (data.image_url) {
             uploadedImageUrl = data.image_url;
+            uploadedImageId = data.image_id || "";
             let imgElement = document.getElementById("uploadedImage");
             imgElement.src = uploadedImageUrl;
             imgElement.style.display = "block";
@@ -30,30 +26,35 @@ function colorizeImage() {
     fetch("/colorize/colorize", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ image_url: uploadedImageUrl })
+        body: JSON.stringify(uploadedImageId ? { image_id: uploadedImageId } : { image_url: uploadedImageUrl })
     })
     .then(response => response.json())
     .then(data => {
         if (data.processed_image_url) {
-            let processedImg = document.getElementById("processedImage");
-            processedImg.src = data.processed_image_url;
-            processedImg.style.display = "block";
-        } else {
-            alert("❌ Lỗi khi tô màu ảnh!");
+            return data; // ✅ Kết quả đã có sẵn trong cache
         }
+        if (!data.job_id) {
+            throw data.error;
+        }
+        return waitForJob(data.job_id);
+    })
+    .then(result => {
+        let processedImg = document.getElementById("processedImage");
+        processedImg.src = result.processed_image_url;
+        processedImg.style.display = "block";
     })
-    .catch(error => console.error("❌ Lỗi tô màu ảnh:", error));
+    .catch(error => {
+        console.error("❌ Lỗi tô màu ảnh:", error);
+        alert("❌ Lỗi khi tô màu ảnh!");
+    });
 }
 
 // ✅ **Hàm lấy danh sách ảnh đã tô màu**
-async function loadUserImages() {
-    const response = await fetch("/colorize/images", { method: "GET" });
-    const data = await response.json();
-
+function loadUserImages() {
     const imageList = document.getElementById("imageList");
     imageList.innerHTML = "";
 
-    data.images.forEach(imgData => {
+    pagedGallery("/colorize/images", "images", imageList, imgData => {
         const container = document.createElement("div");
         container.className = "image-container";
 
@@ -67,8 +68,9 @@ async function loadUserImages() {
         processedImg.alt = "Ảnh đã tô màu";
         processedImg.style.maxWidth = "100%";
 
-        container.appendChild(originalImg);
-        container.appendChild(processedImg);
+        const thumbnails = imgData.thumbnails || {};
+        container.appendChild(withThumbnails(originalImg, thumbnails.original, "(max-width: 640px) 100vw, 320px"));
+        container.appendChild(withThumbnails(processedImg, thumbnails.restored, "(max-width: 640px) 100vw, 320px"));
         imageList.appendChild(container);
     });
 }
@@ -0,0 +1,62 @@
+// ✅ **Tải file thẳng lên Azure bằng URL SAS, server chỉ cấp quyền và ghi nhận**
+// kind: "image" | "video"
+// options.maxSize: thu nhỏ ảnh về cạnh tối đa (px) trước khi tải, giống resize_image phía server
+// options.register: false nếu chỉ cần URL, không tạo bản ghi Image
+async function directUpload(file, kind, options = {}) {
+    let body = file;
+    if (kind === "image" && options.maxSize) {
+        body = await downscaleImage(file, options.maxSize);
+    }
+
+    const sasResponse = await fetch("/uploads/sas", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ kind: kind })
+    });
+    if (!sasResponse.ok) {
+        throw new Error("Không lấy được URL SAS");
+    }
+    const sas = await sasResponse.json();
+
+    const headers = Object.assign({ "Content-Type": body.type || file.type }, sas.headers);
+    const putResponse = await fetch(sas.upload_url, { method: "PUT", headers: headers, body: body });
+    if (!putResponse.ok) {
+        throw new Error("Tải file lên Azure thất bại");
+    }
+
+    const commitResponse = await fetch("/uploads/commit", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ kind: kind, blob_name: sas.blob_name, register: options.register !== false })
+    });
+    if (!commitResponse.ok) {
+        throw new Error("Không ghi nhận được file");
+    }
+    return commitResponse.json();
+}
+
+// ✅ **Thu nhỏ ảnh trên trình duyệt và xuất JPEG**
+async function downscaleImage(file, maxSize) {
+    const bitmap = await createImageBitmap(file, { imageOrientation: "from-image" });
+    const ratio = Math.min(1, maxSize / Math.max(bitmap.width, bitmap.height));
+
+    const canvas = document.createElement("canvas");
+    canvas.width = Math.round(bitmap.width * ratio);
+    canvas.height = Math.round(bitmap.height * ratio);
+    canvas.getContext("2d").drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+
+    return new Promise(resolve => canvas.toBlob(resolve, "image/jpeg", 0.9));
+}
+
+// ✅ **Tải trực tiếp, nếu không được thì quay về endpoint /upload cũ**
+async function uploadWithFallback(file, kind, legacyUrl, options = {}) {
+    try {
+        return await directUpload(file, kind, options);
+    } catch (error) {
+        console.warn("⚠️ Tải trực tiếp thất bại, dùng lại server:", error);
+        const formData = new FormData();
+        formData.append(kind, file);
+        const response = await fetch(legacyUrl, { method: "POST", body: formData });
+        return response.json();
+    }
+}
@@ -1,13 +1,7 @@
 function uploadImage() {
     let fileInput = document.getElementById("imageUpload");
-    let formData = new FormData();
-    formData.append("image", fileInput.files[0]);
-
-    fetch("/esrgan/upload", {
-        method: "POST",
-        body: formData
-    })
-    .then(response => response.json())
+    // ✅ Tải thẳng lên Azure qua URL SAS (quay về /esrgan/upload nếu không được)
+    uploadWithFallback(fileInput.files[0], "image", "/esrgan/upload", { maxSize: 1024 })
     .then(data => {
         document.getElementById("originalImage").src = data.image_url;
         localStorage.setItem("image_id", data.image_id);
@@ -31,33 +25,40 @@ function enhanceImage() {
     })
     .then(response => response.json())
     .then(data => {
-        document.getElementById("enhancedImage").src = data.enhanced_url;
+        if (data.enhanced_url) {
+            return data; // ✅ Kết quả đã có sẵn trong cache
+        }
+        if (!data.job_id) {
+            throw data.error;
+        }
+        return waitForJob(data.job_id);
+    })
+    .then(result => {
+        document.getElementById("enhancedImage").src = result.enhanced_url;
         loadImages(); // Cập nhật danh sách ảnh đã nâng cấp
-    });
+    })
+    .catch(() => alert("Lỗi khi nâng cấp ảnh!"));
 }
 
 function loadImages() {
-    fetch("/esrgan/images")
-    .then(response => response.json())
-    .then(data => {
-        let uploadedContainer = document.getElementById("uploadedImages");
-        let enhancedContainer = document.getElementById("enhancedImages");
+    let uploadedContainer = document.getElementById("uploadedImages");
+    let enhancedContainer = document.getElementById("enhancedImages");
 
-        uploadedContainer.innerHTML = "";
-        enhancedContainer.innerHTML = "";
+    uploadedContainer.innerHTML = "";
+    enhancedContainer.innerHTML = "";
 
-        data.images.forEach(image => {
-            let imgElem = document.createElement("img");
-            imgElem.src = image.original_url;
-            imgElem.width = 150;
-            uploadedContainer.appendChild(imgElem);
+    pagedGallery("/esrgan/images", "images", enhancedContainer, image => {
+        let imgElem = document.createElement("img");
+        imgElem.src = image.original_url;
+        imgElem.width = 150;
+        const thumbnails = image.thumbnails || {};
+        uploadedContainer.appendChild(withThumbnails(imgElem, thumbnails.original, "150px"));
 
-            if (image.enhanced_url) {
-                let enhancedImg = document.createElement("img");
-                enhancedImg.src = image.enhanced_url;
-                enhancedImg.width = 150;
-                enhancedContainer.appendChild(enhancedImg);
-            }
-        });
+        if (image.enhanced_url) {
+            let enhancedImg = document.createElement("img");
+            enhancedImg.src = image.enhanced_url;
+            enhancedImg.width = 150;
+            enhancedContainer.appendChild(withThumbnails(enhancedImg, thumbnails.restored, "150px"));
+        }
     });
 }
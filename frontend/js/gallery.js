@@ -0,0 +1,87 @@
+// ✅ **Tải danh sách ảnh / video theo từng trang, trang tiếp theo được tải khi cuộn tới cuối**
+// url: API danh sách (trả về { <listKey>: [...], next_cursor })
+// anchor: phần tử cuối cùng của gallery, điểm đánh dấu cuộn được đặt ngay sau nó
+// renderItem(item): tự thêm item vào gallery
+// onEmpty(): gọi khi trang đầu tiên không có gì
+function pagedGallery(url, listKey, anchor, renderItem, onEmpty) {
+    // Gọi lại (sau khi tải ảnh mới) -> bỏ observer cũ và bắt đầu lại từ trang đầu
+    if (anchor._galleryObserver) {
+        anchor._galleryObserver.disconnect();
+    }
+
+    const sentinel = anchor._gallerySentinel || document.createElement("div");
+    anchor._gallerySentinel = sentinel;
+    anchor.after(sentinel);
+
+    let cursor = null;
+    let loading = false;
+    let firstPage = true;
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, { rootMargin: "400px" });
+    anchor._galleryObserver = observer;
+
+    async function loadNextPage() {
+        if (loading) return;
+        loading = true;
+
+        try {
+            const pageUrl = cursor ? `${url}?cursor=${encodeURIComponent(cursor)}` : url;
+            const response = await fetch(pageUrl, { method: "GET" });
+            const data = await response.json();
+            const items = data[listKey] || [];
+
+            if (firstPage && items.length === 0 && onEmpty) {
+                onEmpty();
+            }
+            firstPage = false;
+
+            items.forEach(renderItem);
+            cursor = data.next_cursor;
+        } catch (error) {
+            console.error("❌ Lỗi khi tải danh sách:", error);
+            cursor = null;
+        } finally {
+            loading = false;
+        }
+
+        if (!cursor) {
+            observer.disconnect();
+        } else {
+            // Theo dõi lại để nếu điểm đánh dấu vẫn còn trong màn hình thì tải tiếp ngay
+            observer.unobserve(sentinel);
+            observer.observe(sentinel);
+        }
+    }
+
+    observer.observe(sentinel);
+}
+
+// ✅ **Ảnh thu nhỏ cho thư viện: bọc <img> trong <picture> với bản WebP/AVIF nhỏ (srcset theo width)**
+// renditions: [{ url, width, format }] từ trường `thumbnails` của API danh sách; không có thì giữ ảnh gốc
+// sizes: độ rộng hiển thị, VD "150px" hoặc "(max-width: 600px) 100vw, 320px"
+function withThumbnails(img, renditions, sizes) {
+    img.loading = "lazy";
+    img.decoding = "async";
+
+    if (!renditions || renditions.length === 0) {
+        return img;
+    }
+
+    const picture = document.createElement("picture");
+    ["avif", "webp"].forEach(format => {
+        const matches = renditions.filter(rendition => rendition.format === format);
+        if (matches.length === 0) return;
+
+        const source = document.createElement("source");
+        source.type = `image/${format}`;
+        source.srcset = matches.map(rendition => `${rendition.url} ${rendition.width}w`).join(", ");
+        source.sizes = sizes;
+        picture.appendChild(source);
+    });
+    picture.appendChild(img);
+    return picture;
+}
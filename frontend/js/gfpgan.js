@@ -1,13 +1,7 @@
 function uploadImage() {
     let fileInput = document.getElementById("imageUpload");
-    let formData = new FormData();
-    formData.append("image", fileInput.files[0]);
-
-    fetch("/gfpgan/upload", {
-        method: "POST",
-        body: formData
-    })
-    .then(response => response.json())
+    // ✅ Tải thẳng lên Azure qua URL SAS (quay về /gfpgan/upload nếu không được)
+    uploadWithFallback(fileInput.files[0], "image", "/gfpgan/upload", { maxSize: 1024 })
     .then(data => {
         if (data.image_url) {
             document.getElementById("originalImage").src = data.image_url;
@@ -29,40 +23,83 @@ function restoreImage() {
     .then(response => response.json())
     .then(data => {
         if (data.restored_url) {
-            document.getElementById("restoredImage").src = data.restored_url;
-        } else {
-            alert("Lỗi khi khôi phục ảnh!");
+            return data; // ✅ Kết quả đã có sẵn trong cache
         }
-    });
+        if (!data.job_id) {
+            throw data.error;
+        }
+        return waitForJob(data.job_id);
+    })
+    .then(result => {
+        document.getElementById("restoredImage").src = result.restored_url;
+        loadImages();
+    })
+    .catch(() => alert("Lỗi khi khôi phục ảnh!"));
 }
 
-function loadImages() {
-    fetch("/gfpgan/list")
+// ✅ **Khôi phục nhiều ảnh trong một request (/gfpgan/batch), thay vì upload + restore từng ảnh**
+function restoreBatch() {
+    let files = document.getElementById("batchUpload").files;
+    if (files.length === 0) return;
+
+    let formData = new FormData();
+    Array.from(files).forEach(file => formData.append("images", file));
+
+    let status = document.getElementById("batchStatus");
+    status.textContent = `⏳ Đang tải lên ${files.length} ảnh...`;
+
+    fetch("/gfpgan/batch", { method: "POST", body: formData })
     .then(response => response.json())
     .then(data => {
-        let imageListDiv = document.getElementById("imageList");
-        imageListDiv.innerHTML = ""; // Xóa nội dung cũ
+        if (!data.items) {
+            throw data.error;
+        }
+        if (!data.job_id) {
+            return data; // ✅ Mọi ảnh đã có kết quả trong cache
+        }
+        status.textContent = data.message;
+        return waitForJob(data.job_id, result => {
+            const done = result.items.filter(item => item.status !== "pending").length;
+            status.textContent = `⏳ Đã xong ${done}/${result.items.length} ảnh...`;
+        });
+    })
+    .then(result => {
+        const failed = result.items.filter(item => item.status === "failed").length;
+        status.textContent = failed
+            ? `⚠️ Hoàn tất, ${failed} ảnh lỗi (đã hoàn tín dụng)`
+            : `✅ Đã khôi phục ${result.items.length} ảnh`;
+        loadImages();
+    })
+    .catch(error => {
+        status.textContent = "";
+        alert(error || "Lỗi khi khôi phục ảnh!");
+    });
+}
 
-        data.images.forEach(img => {
-            let imgContainer = document.createElement("div");
-            imgContainer.style.marginBottom = "20px";
+function loadImages() {
+    let imageListDiv = document.getElementById("imageList");
+    imageListDiv.innerHTML = ""; // Xóa nội dung cũ
 
-            let originalImg = document.createElement("img");
-            originalImg.src = img.original_url;
-            originalImg.width = 150;
+    pagedGallery("/gfpgan/list", "images", imageListDiv, img => {
+        let imgContainer = document.createElement("div");
+        imgContainer.style.marginBottom = "20px";
 
-            let restoredImg = document.createElement("img");
-            restoredImg.src = img.restored_url ? img.restored_url : "";
-            restoredImg.width = 150;
-            restoredImg.style.marginLeft = "20px";
+        let originalImg = document.createElement("img");
+        originalImg.src = img.original_url;
+        originalImg.width = 150;
 
-            let label = document.createElement("p");
-            label.textContent = img.restored_url ? "✅ Đã khôi phục" : "⏳ Đang chờ khôi phục";
+        let restoredImg = document.createElement("img");
+        restoredImg.src = img.restored_url ? img.restored_url : "";
+        restoredImg.width = 150;
+        restoredImg.style.marginLeft = "20px";
 
-            imgContainer.appendChild(originalImg);
-            imgContainer.appendChild(restoredImg);
-            imgContainer.appendChild(label);
-            imageListDiv.appendChild(imgContainer);
-        });
+        let label = document.createElement("p");
+        label.textContent = img.restored_url ? "✅ Đã khôi phục" : "⏳ Đang chờ khôi phục";
+
+        const thumbnails = img.thumbnails || {};
+        imgContainer.appendChild(withThumbnails(originalImg, thumbnails.original, "150px"));
+        imgContainer.appendChild(withThumbnails(restoredImg, thumbnails.restored, "150px"));
+        imgContainer.appendChild(label);
+        imageListDiv.appendChild(imgContainer);
     });
 }
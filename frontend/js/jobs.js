@@ -0,0 +1,24 @@
+// ✅ **Chờ tác vụ nền hoàn tất (hỏi `/jobs/<id>` mỗi 2 giây)**
+// onProgress(result): tuỳ chọn, nhận kết quả tạm (VD trạng thái từng ảnh trong lô)
+function waitForJob(jobId, onProgress) {
+    return new Promise((resolve, reject) => {
+        function check() {
+            fetch(`/jobs/${jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === "succeeded") {
+                    resolve(job.result);
+                } else if (job.status === "failed" || !job.status) {
+                    reject(job.error);
+                } else {
+                    if (onProgress && job.result) {
+                        onProgress(job.result);
+                    }
+                    setTimeout(check, 2000);
+                }
+            })
+            .catch(reject);
+        }
+        check();
+    });
+}
@@ -26,14 +26,8 @@ document.addEventListener("DOMContentLoaded", function () {
     // ✅ **Hàm tải ảnh lên server**
     function uploadImage() {
         let fileInput = document.getElementById("imageUpload");
-        let formData = new FormData();
-        formData.append("image", fileInput.files[0]);
-
-        fetch("/lama/upload", {
-            method: "POST",
-            body: formData
-        })
-        .then(response => response.json())
+        // ✅ Tải thẳng lên Azure qua URL SAS (quay về /lama/upload nếu không được)
+        uploadWithFallback(fileInput.files[0], "image", "/lama/upload", { maxSize: 1024 })
         .then(data => {
             if (data.image_id) {
                 localStorage.setItem("image_id", data.image_id); // 🔹 Lưu `image_id`
@@ -141,14 +135,11 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 
     // ✅ **Lấy danh sách ảnh đã xử lý**
-    async function loadUserImages() {
-        const response = await fetch("/lama/images", { method: "GET" });
-        const data = await response.json();
-
+    function loadUserImages() {
         const imageList = document.getElementById("imageList");
         imageList.innerHTML = "";
 
-        data.images.forEach(imgData => {
+        pagedGallery("/lama/images", "images", imageList, imgData => {
             const container = document.createElement("div");
             container.className = "image-container";
 
@@ -160,8 +151,9 @@ document.addEventListener("DOMContentLoaded", function () {
             processedImg.src = imgData.processed_url;
             processedImg.alt = "Ảnh đã xử lý";
 
-            container.appendChild(originalImg);
-            container.appendChild(processedImg);
+            const thumbnails = imgData.thumbnails || {};
+            container.appendChild(withThumbnails(originalImg, thumbnails.original, "(max-width: 640px) 100vw, 320px"));
+            container.appendChild(withThumbnails(processedImg, thumbnails.restored, "(max-width: 640px) 100vw, 320px"));
             imageList.appendChild(container);
         });
     }
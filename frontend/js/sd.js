@@ -17,6 +17,13 @@ function generateImage() {
         prompt_strength: 0.85
     };
 
+    // ✅ Có seed thì bật chế độ tất định để dùng lại ảnh đã tạo
+    let seed = document.getElementById("seed").value;
+    if (seed !== "") {
+        requestData.deterministic = true;
+        requestData.seed = parseInt(seed);
+    }
+
     fetch("/sd/generate", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
@@ -14,18 +14,27 @@ function generateImage() {
         return;
     }
 
+    let requestData = {
+        prompt: prompt,
+        width: width,
+        height: height,
+        num_outputs: 1,
+        scheduler: "K_EULER",
+        num_inference_steps: 4,
+        guidance_scale: 0
+    };
+
+    // ✅ Có seed thì bật chế độ tất định để dùng lại ảnh đã tạo
+    const seed = document.getElementById("seed").value;
+    if (seed !== "") {
+        requestData.deterministic = true;
+        requestData.seed = parseInt(seed);
+    }
+
     fetch("/sdxl/generate", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-            prompt: prompt,
-            width: width,
-            height: height,
-            num_outputs: 1,
-            scheduler: "K_EULER",
-            num_inference_steps: 4,
-            guidance_scale: 0
-        })
+        body: JSON.stringify(requestData)
     })
     .then(response => response.json())
     .then(data => {
@@ -1,19 +1,15 @@
 let uploadedVideoUrl = ""; // Lưu trữ URL video sau khi tải lên
+let uploadedVideoId = null; // Có khi video được tải trực tiếp lên Azure
 
 // ✅ **Hàm tải video lên**
 function uploadVideo() {
     let fileInput = document.getElementById("videoUpload");
-    let formData = new FormData();
-    formData.append("video", fileInput.files[0]);
-
-    fetch("/video/upload", {
-        method: "POST",
-        body: formData
-    })
-    .then(response => response.json())
+    // ✅ Tải thẳng lên Azure qua URL SAS (quay về /video/upload nếu không được)
+    uploadWithFallback(fileInput.files[0], "video", "/video/upload")
     .then(data => {
         if (data.video_url) {
             uploadedVideoUrl = data.video_url;  // Lưu URL video
+            uploadedVideoId = data.video_id || null;
             let videoElement = document.getElementById("uploadedVideo");
             videoElement.src = uploadedVideoUrl;
             videoElement.style.display = "block";  // Hiển thị video
@@ -37,7 +33,7 @@ function generateAudio() {
     fetch("/video/generate-audio", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ video_url: uploadedVideoUrl, prompt: prompt })
+        body: JSON.stringify({ video_url: uploadedVideoUrl, video_id: uploadedVideoId, prompt: prompt })
     })
     .then(response => response.json())
     .then(data => {
@@ -2,14 +2,8 @@ let uploadedImageUrl = "";
 
 function uploadImage() {
     let fileInput = document.getElementById("imageUpload");
-    let formData = new FormData();
-    formData.append("image", fileInput.files[0]);
-
-    fetch("/video01/upload", {
-        method: "POST",
-        body: formData
-    })
-    .then(response => response.json())
+    // ✅ Tải thẳng lên Azure qua URL SAS (quay về /video01/upload nếu không được)
+    uploadWithFallback(fileInput.files[0], "image", "/video01/upload", { maxSize: 1024, register: false })
     .then(data => {
         if (data.image_url) {
             uploadedImageUrl = data.image_url; // ✅ Lưu URL ảnh vào biến toàn cục
@@ -53,39 +47,31 @@ document.addEventListener("DOMContentLoaded", function () {
 });
 
 function loadUserVideos() {
-    fetch("/video01/videos", { method: "GET" })
-        .then(response => response.json())
-        .then(data => {
-            const videoList = document.getElementById("videoList");
-            videoList.innerHTML = ""; // Xóa danh sách cũ trước khi hiển thị mới
+    const videoList = document.getElementById("videoList");
+    videoList.innerHTML = ""; // Xóa danh sách cũ trước khi hiển thị mới
 
-            if (!data.videos || data.videos.length === 0) {
-                videoList.innerHTML = "<p>Chưa có video nào được tạo.</p>";
-                return;
-            }
+    pagedGallery("/video01/videos", "videos", videoList, vid => {
+        const container = document.createElement("div");
+        container.className = "video-container";
 
-            data.videos.forEach(vid => {
-                const container = document.createElement("div");
-                container.className = "video-container";
-
-                if (vid.original_url) {
-                    const originalVideo = document.createElement("video");
-                    originalVideo.src = vid.original_url;
-                    originalVideo.controls = true;
-                    originalVideo.width = 300;
-                    container.appendChild(originalVideo);
-                }
+        if (vid.original_url) {
+            const originalVideo = document.createElement("video");
+            originalVideo.src = vid.original_url;
+            originalVideo.controls = true;
+            originalVideo.width = 300;
+            container.appendChild(originalVideo);
+        }
 
-                if (vid.processed_url) {
-                    const processedVideo = document.createElement("video");
-                    processedVideo.src = vid.processed_url;
-                    processedVideo.controls = true;
-                    processedVideo.width = 300;
-                    container.appendChild(processedVideo);
-                }
+        if (vid.processed_url) {
+            const processedVideo = document.createElement("video");
+            processedVideo.src = vid.processed_url;
+            processedVideo.controls = true;
+            processedVideo.width = 300;
+            container.appendChild(processedVideo);
+        }
 
-                videoList.appendChild(container);
-            });
-        })
-        .catch(error => console.error("❌ Lỗi khi tải danh sách video:", error));
+        videoList.appendChild(container);
+    }, () => {
+        videoList.innerHTML = "<p>Chưa có video nào được tạo.</p>";
+    });
 }